@@ -0,0 +1,176 @@
+"""
+Admission control for prediction routes
+Requests are grouped into lanes (SOS lookups, interactive, bulk dashboard
+jobs). A fixed number of slots is shared by all lanes; waiting requests are
+granted slots in lane priority order, and each lane also has its own
+concurrency cap so bulk jobs can never take every slot. Requests are shed
+immediately (429 when a lane's queue is full, 503 when the expected wait
+exceeds the lane's latency budget) instead of piling up behind the model.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+
+import metrics
+
+
+class Lane:
+    """One class of requests: lower `priority` is served first"""
+
+    def __init__(self, name, priority, max_concurrent, max_queue, budget_ms):
+        self.name = name
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.budget_ms = budget_ms
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+
+class Rejected(Exception):
+    """Request shed by admission control"""
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Ticket:
+    def __init__(self, lane):
+        self.lane = lane
+        self.granted = False
+
+
+def default_lanes(capacity):
+    """SOS/tourist lookups ahead of interactive risk queries ahead of bulk dashboard jobs"""
+    return [
+        Lane('sos', priority=0, max_concurrent=capacity, max_queue=64, budget_ms=2000),
+        Lane('interactive', priority=1, max_concurrent=capacity, max_queue=32, budget_ms=1000),
+        Lane('bulk', priority=2, max_concurrent=max(1, capacity // 2), max_queue=capacity * 2, budget_ms=5000),
+    ]
+
+
+class AdmissionController:
+    """
+    Priority slot pool with per-lane limits
+    `capacity` is the number of requests doing model work at once.
+    """
+
+    def __init__(self, capacity=4, lanes=None):
+        self.capacity = capacity
+        self.lanes = {lane.name: lane for lane in (lanes or default_lanes(capacity))}
+        self.active = 0
+        self._queue = []  # heap of (priority, seq, ticket)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._service_seconds = {}  # lane -> moving average of time holding a slot
+
+    def _can_run(self, lane):
+        return self.active < self.capacity and lane.active < lane.max_concurrent
+
+    def _grant(self, ticket):
+        ticket.granted = True
+        ticket.lane.active += 1
+        self.active += 1
+
+    def _dispatch(self):
+        """Grant free slots to waiting tickets in priority order"""
+        skipped = []
+        while self._queue and self.active < self.capacity:
+            entry = heapq.heappop(self._queue)
+            ticket = entry[2]
+            if ticket.lane.active < ticket.lane.max_concurrent:
+                ticket.lane.waiting -= 1
+                self._grant(ticket)
+            else:
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        self._cond.notify_all()
+
+    def _expected_wait(self, lane):
+        """Seconds until a new request in `lane` would get a slot"""
+        ahead = sum(1 for priority, _, _ in self._queue if priority <= lane.priority)
+        service = self._service_seconds.get(lane.name) or max(self._service_seconds.values(), default=0.0)
+        return (ahead + 1) * service / max(1, min(self.capacity, lane.max_concurrent))
+
+    def _reject(self, lane, status, wait_seconds, reason):
+        lane.rejected += 1
+        metrics.inc('ml_admission_total', lane=lane.name, result=f'rejected_{status}')
+        raise Rejected(status, max(1, math.ceil(wait_seconds)), reason)
+
+    def acquire(self, lane_name):
+        """
+        Wait for a slot in `lane_name`
+        Returns the seconds spent queued; raises Rejected when the request
+        should be shed.
+        """
+        lane = self.lanes[lane_name]
+        start = time.perf_counter()
+        with self._cond:
+            ticket = _Ticket(lane)
+            if self._can_run(lane) and not any(priority <= lane.priority for priority, _, _ in self._queue):
+                self._grant(ticket)
+            else:
+                budget = lane.budget_ms / 1000
+                if lane.waiting >= lane.max_queue:
+                    self._reject(lane, 429, self._expected_wait(lane), f'{lane.name} queue is full')
+                expected = self._expected_wait(lane)
+                if expected > budget:
+                    self._reject(lane, 503, expected, f'{lane.name} queue wait exceeds {lane.budget_ms}ms budget')
+
+                lane.waiting += 1
+                entry = (lane.priority, next(self._seq), ticket)
+                heapq.heappush(self._queue, entry)
+                deadline = start + budget
+                while not ticket.granted:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        lane.waiting -= 1
+                        self._reject(lane, 503, budget, f'{lane.name} request waited past its {lane.budget_ms}ms budget')
+                    self._cond.wait(remaining)
+
+            lane.admitted += 1
+        waited = time.perf_counter() - start
+        metrics.inc('ml_admission_total', lane=lane.name, result='admitted')
+        metrics.observe('ml_admission_wait_seconds', waited, lane=lane.name)
+        return waited
+
+    def release(self, lane_name, held_seconds):
+        lane = self.lanes[lane_name]
+        with self._cond:
+            lane.active -= 1
+            self.active -= 1
+            previous = self._service_seconds.get(lane_name)
+            self._service_seconds[lane_name] = held_seconds if previous is None else 0.8 * previous + 0.2 * held_seconds
+            self._dispatch()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'capacity': self.capacity,
+                'active': self.active,
+                'lanes': {
+                    name: {
+                        'active': lane.active,
+                        'waiting': lane.waiting,
+                        'admitted': lane.admitted,
+                        'rejected': lane.rejected,
+                        'avg_service_ms': round(self._service_seconds.get(name, 0.0) * 1000, 2)
+                    }
+                    for name, lane in self.lanes.items()
+                }
+            }
+
+
+metrics.describe('ml_admission_total', 'counter', 'Admission decisions by lane (admitted, rejected_429, rejected_503)')
+metrics.describe('ml_admission_wait_seconds', 'histogram', 'Time admitted requests spent queued, by lane')
@@ -3,15 +3,22 @@ Flask API Server for LSTM Predictions
 Provides REST endpoints for tourist safety predictions
 """
 
-from flask import Flask, request, jsonify, Response, stream_with_context
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-from lstm_predictor import TouristSafetyLSTM
+from lstm_predictor import TouristSafetyLSTM, risk_level, tourist_features
+from checkpointing import TrainingLock, checkpoint_state
+from spatial_index import TouristSpatialIndex
+from singleflight import SingleFlight, canonical_key
+from admission import AdmissionController, Rejected
+from sharding import ShardRouter, read_manifest
+import metrics
+import encoding
 import os
 from datetime import datetime
 import numpy as np
 import json
 import time
-from threading import Thread
+from threading import Thread, Lock
 import queue
 import tensorflow as tf
 
@@ -20,6 +27,50 @@ CORS(app)  # Enable CORS for frontend access
 
 # Initialize predictor
 predictor = None
+# Retraining builds a new predictor and swaps it in under this lock (see install_predictor)
+predictor_lock = Lock()
+
+# Serving mode: 'teacher' (LSTM only) or 'student' (distilled model with LSTM fallback)
+SERVING_MODE = os.environ.get('ML_SERVING_MODE', 'teacher')
+STUDENT_MARGIN = float(os.environ.get('ML_STUDENT_MARGIN', '0.05'))
+
+# Model format: 'keras' (lstm_model_fused.h5, else lstm_model.h5) or 'tflite' (quantized lstm_model_int8.tflite)
+MODEL_FORMAT = os.environ.get('ML_MODEL_FORMAT', 'keras')
+
+# Live spatial index of active tourists for /api/ml/nearby (ML_SPATIAL_INDEX=0 disables)
+SPATIAL_INDEX_ENABLED = os.environ.get('ML_SPATIAL_INDEX', '1') != '0'
+spatial_index = None
+spatial_watch = None
+
+# Identical concurrent hotspot requests (dashboard pages loading together) share one computation
+hotspot_flight = SingleFlight('hotspots')
+
+# Streaming responses (Accept: application/x-ndjson) for batch and hotspot predictions
+NDJSON_MIMETYPE = 'application/x-ndjson'
+STREAM_CHUNK_SIZE = int(os.environ.get('ML_STREAM_CHUNK_SIZE', '100'))
+# Firestore caps the values of one 'in' filter
+FIRESTORE_IN_LIMIT = 30
+
+# Region-sharded models (train_shards.py), loaded on demand within ML_SHARD_CACHE_MB (ML_SHARDS=1 enables)
+SHARDS_ENABLED = os.environ.get('ML_SHARDS', '0') == '1'
+SHARD_CACHE_MB = float(os.environ.get('ML_SHARD_CACHE_MB', '256'))
+shard_router = None
+
+# Admission control: ML_ADMISSION_CAPACITY prediction requests run at once, SOS lookups first (ML_ADMISSION=0 disables)
+ADMISSION_ENABLED = os.environ.get('ML_ADMISSION', '1') != '0'
+admission = AdmissionController(capacity=int(os.environ.get('ML_ADMISSION_CAPACITY', '4')))
+ROUTE_LANES = {
+    '/api/ml/predict/tourist': 'sos',
+    '/api/ml/nearby': 'sos',
+    '/api/ml/predict/risk': 'interactive',
+    '/api/ml/predict/hotspots': 'bulk',
+    '/api/ml/predict/batch': 'bulk'
+}
+
+# Sampling profiler for slow requests (off unless ML_PROFILE_SLOW_MS is set)
+profiler = metrics.SamplingProfiler(output_dir='profiles')
+if os.environ.get('ML_PROFILE_SLOW_MS'):
+    profiler.configure(True, slow_ms=float(os.environ['ML_PROFILE_SLOW_MS']))
 
 # Training progress queue
 training_progress_queue = queue.Queue()
@@ -35,14 +86,212 @@ def initialize_predictor():
         
         # Try to load existing model
         if os.path.exists('models/lstm_model.h5'):
-            predictor.load_model()
-            print("✅ Loaded existing LSTM model")
+            load_serving_model(predictor)
         else:
             print("⚠️ No trained model found. Train the model first.")
+        
+        start_spatial_index()
+        start_shard_router()
             
     except Exception as e:
         print(f"❌ Error initializing predictor: {e}")
 
+def load_serving_model(model):
+    """
+    Load what a predictor serves from: the Keras, fused or TFLite model
+    (ML_MODEL_FORMAT), risk profiles and the student (ML_SERVING_MODE)
+    Used at startup and on retrained predictors before they are installed.
+    """
+    use_tflite = MODEL_FORMAT == 'tflite' and model.tflite_model_available()
+    if MODEL_FORMAT == 'tflite' and not use_tflite:
+        if os.path.exists('models/lstm_model_int8.tflite'):
+            print("⚠️ Quantized model is older than lstm_model.h5. Run quantize_model.py; serving LSTM model.")
+        else:
+            print("⚠️ No quantized model found. Run quantize_model.py; serving LSTM model.")
+    
+    if use_tflite:
+        model.load_model()
+        model.load_tflite()
+        print("✅ Serving quantized int8 TFLite model")
+    elif model.fused_model_available():
+        # Scaler is part of the graph; sklearn/joblib are never imported
+        model.load_fused_model()
+        print("✅ Loaded fused LSTM model")
+    else:
+        model.load_model()
+        print("✅ Loaded existing LSTM model")
+    
+    if model.load_risk_profiles():
+        print("✅ Serving known locations from precomputed risk profiles")
+    
+    if SERVING_MODE == 'student':
+        if not os.path.exists('models/student/student_meta.json'):
+            print("⚠️ No student model found. Run distill_model.py; serving from LSTM.")
+        elif model.load_student(margin=STUDENT_MARGIN):
+            print("✅ Serving from distilled student (LSTM fallback on low confidence)")
+        else:
+            print("⚠️ Run distill_model.py for the current model; serving from LSTM.")
+
+def start_shard_router():
+    """Route predictions to per-region models when shards have been trained"""
+    global shard_router
+    if not SHARDS_ENABLED or predictor is None:
+        return
+    if read_manifest() is None:
+        print("⚠️ No shard manifest found. Run train_shards.py; serving the global model.")
+        return
+    shard_router = ShardRouter(predictor, cache_mb=SHARD_CACHE_MB)
+    print(f"✅ Routing to {len(shard_router.manifest['shards'])} region shards")
+
+def install_predictor(new_predictor):
+    """Serve from a newly trained predictor; requests already running finish on the old one"""
+    global predictor
+    with predictor_lock:
+        predictor = new_predictor
+        if shard_router is not None:
+            shard_router.fallback = new_predictor
+
+def scorer():
+    """Shard router if enabled, else the global predictor"""
+    return shard_router if shard_router is not None else predictor
+
+def start_spatial_index():
+    """Index tourist positions and follow location changes via a snapshot listener"""
+    global spatial_index, spatial_watch
+    if not SPATIAL_INDEX_ENABLED or predictor is None or predictor.db is None or spatial_watch is not None:
+        return
+    spatial_index = TouristSpatialIndex()
+    spatial_watch = spatial_index.watch(predictor.db, features_fn=tourist_features)
+    print("✅ Watching tourist locations for the spatial index")
+
+def wants_ndjson():
+    """True when the client prefers a streamed NDJSON response"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def ndjson_response(chunks, **summary):
+    """
+    Stream lists of results as NDJSON, one line per result
+    Each chunk is written as soon as it is produced; the last line is
+    {"done": true, "total": n, ...summary} (or {"done": false, "error": ...}).
+    """
+    def generate():
+        # Runs after the view returns, outside the context the endpoint label was set in
+        token = metrics.set_endpoint(request.url_rule.rule)
+        total = 0
+        try:
+            for chunk in chunks:
+                total += len(chunk)
+                if chunk:
+                    yield b''.join(encoding.dumps(item) + b'\n' for item in chunk)
+            yield encoding.dumps({'done': True, 'total': total, **summary}) + b'\n'
+        except Exception as e:
+            yield encoding.dumps({'done': False, 'total': total, 'error': str(e)}) + b'\n'
+        finally:
+            metrics.reset_endpoint(token)
+    
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.endpoint_token = metrics.set_endpoint(request.url_rule.rule if request.url_rule else 'unmatched')
+    profiler.begin()
+
+@app.before_request
+def admit_request():
+    """Queue prediction requests by lane; shed with 429/503 + Retry-After when over budget"""
+    lane = ROUTE_LANES.get(request.url_rule.rule) if request.url_rule else None
+    if not ADMISSION_ENABLED or lane is None or request.method == 'OPTIONS':
+        return None
+    if request.url_rule.rule == '/api/ml/predict/hotspots' and not wants_ndjson():
+        # Coalescible: only the request that ends up computing takes a slot (see run_admitted)
+        return None
+    try:
+        admission.acquire(lane)
+    except Rejected as e:
+        return rejected_response(e)
+    g.admission = (lane, time.perf_counter())
+    return None
+
+def rejected_response(e):
+    """429/503 with Retry-After for a request shed by admission control"""
+    response = jsonify({
+        'success': False,
+        'error': f'Server busy: {e.reason}',
+        'retry_after': e.retry_after
+    })
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def run_admitted(lane, fn):
+    """
+    Run fn() holding an admission slot in `lane`
+    For work admitted inside the handler, e.g. by the single-flight leader, so
+    coalesced requests never hold a slot and every computation does.
+    """
+    if not ADMISSION_ENABLED:
+        return fn()
+    admission.acquire(lane)
+    start = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        admission.release(lane, time.perf_counter() - start)
+
+@app.teardown_request
+def release_admission(exc):
+    # Runs after streamed responses finish, so the slot covers the whole stream
+    held = g.pop('admission', None)
+    if held is not None:
+        admission.release(held[0], time.perf_counter() - held[1])
+
+@app.teardown_request
+def clear_stage_endpoint(exc):
+    token = g.pop('endpoint_token', None)
+    if token is not None:
+        metrics.reset_endpoint(token)
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    duration = time.perf_counter() - start
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('ml_request_duration_seconds', duration, endpoint=endpoint)
+    metrics.inc('ml_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    profiler.end(endpoint, duration * 1000)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/ml/profiler', methods=['GET', 'POST'])
+def profiler_settings():
+    """
+    Toggle the sampling profiler
+    POST /api/ml/profiler
+    Body: { "enabled": true, "slow_ms": 500 }
+    """
+    if request.method == 'POST':
+        data = request.json or {}
+        profiler.configure(
+            data.get('enabled', profiler.enabled),
+            slow_ms=data.get('slow_ms'),
+            interval=data.get('interval')
+        )
+    return jsonify({
+        'success': True,
+        'enabled': profiler.enabled,
+        'slow_ms': profiler.slow_ms,
+        'interval': profiler.interval,
+        'output_dir': profiler.output_dir,
+        'dumps': profiler.dumps
+    })
+
 @app.route('/', methods=['GET'])
 def index():
     """Root endpoint - API information"""
@@ -56,7 +305,10 @@ def index():
             'predict_risk': '/api/ml/predict/risk (POST)',
             'predict_hotspots': '/api/ml/predict/hotspots (POST)',
             'predict_tourist': '/api/ml/predict/tourist (POST)',
-            'predict_batch': '/api/ml/predict/batch (POST)'
+            'predict_batch': '/api/ml/predict/batch (POST)',
+            'metrics': '/metrics',
+            'profiler': '/api/ml/profiler (GET/POST)',
+            'nearby': '/api/ml/nearby (POST)'
         },
         'model_loaded': predictor is not None and predictor.model is not None,
         'timestamp': datetime.now().isoformat()
@@ -65,9 +317,22 @@ def index():
 @app.route('/api/ml/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    checkpoint = checkpoint_state()
     return jsonify({
         'status': 'healthy',
+        'training_active': training_active or TrainingLock().owner() is not None,
+        'resumable_checkpoint': {
+            'epoch': checkpoint['epoch'],
+            'epochs': checkpoint['config']['epochs'],
+            'saved': checkpoint['saved']
+        } if checkpoint else None,
         'model_loaded': predictor is not None and predictor.model is not None,
+        'serving_mode': 'student' if predictor is not None and predictor.student is not None else 'teacher',
+        'student_stats': predictor.student_stats if predictor is not None else None,
+        'spatial_index_size': len(spatial_index) if spatial_index is not None else None,
+        'hotspot_coalescing': hotspot_flight.stats(),
+        'admission': admission.stats() if ADMISSION_ENABLED else None,
+        'shards': shard_router.stats() if shard_router is not None else None,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -95,11 +360,21 @@ def train_model():
     """
     Train LSTM model on Firebase data
     POST /api/ml/train
-    Body: { "epochs": 50, "batch_size": 32 }
+    Body: { "epochs": 50, "batch_size": 32, "horizon": 1 }
+    horizon > 1 trains the multi-horizon head (24 = full hotspot curve per inference)
+    Optional "row_budget" / "dedup_deg" bound the tourist rows trained on (see sampling.py)
+    "profile_memory": true writes per-stage RSS and allocators to models/memory_profile.json
+    
+    Continue an interrupted run from its last checkpoint:
+    Body: { "resume": true }
+    
+    Incremental fine-tuning of the current model:
+    Body: { "mode": "incremental", "epochs": 10, "recent_hours": 24, "replay_ratio": 1.0 }
     """
     global training_active
     
-    if training_active:
+    # The lock file also covers training started by train_model.py or another worker
+    if training_active or TrainingLock().owner() is not None:
         return jsonify({
             'success': False,
             'error': 'Training already in progress'
@@ -107,22 +382,65 @@ def train_model():
     
     try:
         data = request.json or {}
-        epochs = data.get('epochs', 50)
+        mode = data.get('mode', 'full')
+        incremental = mode == 'incremental'
+        epochs = data.get('epochs', 10 if incremental else 50)
         batch_size = data.get('batch_size', 32)
+        horizon = int(data.get('horizon', 1))
+        resume = bool(data.get('resume', False))
+        row_budget = int(data['row_budget']) if data.get('row_budget') else None
+        dedup_deg = float(data['dedup_deg']) if data.get('dedup_deg') else None
+        profile_memory = bool(data.get('profile_memory', False))
+        
+        if resume:
+            state = checkpoint_state()
+            if state is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'No checkpoint to resume from'
+                }), 400
+            epochs = state['config']['epochs']
+            batch_size = state['config']['batch_size']
+            horizon = state['config']['horizon']
+        
+        if mode not in ('full', 'incremental'):
+            return jsonify({
+                'success': False,
+                'error': "mode must be 'full' or 'incremental'"
+            }), 400
+        if incremental and not os.path.exists('models/lstm_model.h5'):
+            return jsonify({
+                'success': False,
+                'error': 'No trained model to fine-tune. Run a full training first.'
+            }), 400
         
         if predictor is None:
             initialize_predictor()
         
         # Start training in background thread
         training_active = True
-        thread = Thread(target=train_model_background, args=(epochs, batch_size))
+        if incremental:
+            thread = Thread(target=incremental_train_background, args=(
+                epochs, batch_size,
+                float(data.get('recent_hours', 24)),
+                float(data.get('replay_ratio', 1.0))
+            ))
+        else:
+            thread = Thread(target=train_model_background, args=(epochs, batch_size, horizon, resume,
+                                                                 row_budget, dedup_deg, profile_memory))
         thread.start()
         
         return jsonify({
             'success': True,
             'message': 'Training started',
+            'mode': mode,
+            'resume': resume,
             'epochs': epochs,
-            'batch_size': batch_size
+            'batch_size': batch_size,
+            'horizon': horizon,
+            'row_budget': row_budget,
+            'dedup_deg': dedup_deg,
+            'profile_memory': profile_memory
         })
         
     except Exception as e:
@@ -132,123 +450,138 @@ def train_model():
             'error': str(e)
         }), 500
 
-def train_model_background(epochs, batch_size):
-    """Background training function with progress updates"""
-    global training_active, predictor
+class ProgressCallback(tf.keras.callbacks.Callback):
+    """Custom callback for progress updates (epochs map to 30-90%)"""
+    def __init__(self, total_epochs):
+        super().__init__()
+        self.total_epochs = total_epochs
     
-    try:
-        # Send initial status
+    def on_epoch_end(self, epoch, logs=None):
+        progress = 30 + int((epoch + 1) / self.total_epochs * 60)
         training_progress_queue.put({
-            'status': 'starting',
-            'message': 'Initializing training...',
-            'progress': 0
+            'status': 'training',
+            'message': f'Epoch {epoch + 1}/{self.total_epochs}',
+            'progress': progress,
+            'epoch': epoch + 1,
+            'total_epochs': self.total_epochs,
+            'loss': float(logs.get('loss', 0)),
+            'val_loss': float(logs.get('val_loss', 0))
         })
-        
-        # Fetch data
+
+def train_model_background(epochs, batch_size, horizon=1, resume=False, row_budget=None, dedup_deg=None,
+                           profile_memory=False):
+    """Background training function with progress updates"""
+    global training_active
+    
+    def report_stage(status, message, progress):
         training_progress_queue.put({
-            'status': 'fetching_data',
-            'message': 'Fetching data from Firebase...',
-            'progress': 5
+            'status': status,
+            'message': message,
+            'progress': progress
         })
+    
+    trainee = None
+    try:
+        # Send initial status
+        report_stage('starting', 'Initializing training...', 0)
         
-        data_dict = predictor.fetch_training_data()
+        # Trained apart from the serving predictor, which keeps answering requests until the swap
+        trainee = TouristSafetyLSTM(db=predictor.db)
         
-        training_progress_queue.put({
-            'status': 'preprocessing',
-            'message': 'Preprocessing data...',
-            'progress': 15
-        })
+        # Fetches, splits, builds and fits (or continues from the checkpoint)
+        history = trainee.train(
+            epochs=epochs,
+            batch_size=batch_size,
+            validation_split=0.2,
+            horizon=horizon,
+            resume=resume,
+            callbacks=[ProgressCallback(epochs)],
+            on_stage=report_stage,
+            verbose=0,
+            row_budget=row_budget,
+            dedup_deg=dedup_deg,
+            profile_memory=profile_memory
+        )
         
-        tourists_df, alerts_df = predictor.preprocess_data(data_dict)
+        report_stage('saving', 'Saving model...', 95)
         
-        training_progress_queue.put({
-            'status': 'creating_sequences',
-            'message': 'Creating sequences...',
-            'progress': 25
-        })
+        # Save model
+        trainee.save_model()
+        memory_profile = trainee.finish_memory_profile()
         
-        X, y = predictor.create_sequences(tourists_df)
+        report_stage('profiling', 'Precomputing location risk profiles...', 97)
         
-        from sklearn.model_selection import train_test_split
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        from risk_profiles import build_profiles
+        build_profiles(trainee)
+        
+        # Serve what a restart would (fused, TFLite, profiles, student); all of it switches together
+        load_serving_model(trainee)
+        install_predictor(trainee)
         
+        # Send completion
         training_progress_queue.put({
-            'status': 'building_model',
-            'message': 'Building model architecture...',
-            'progress': 30
+            'status': 'completed',
+            'message': 'Training completed successfully!',
+            'progress': 100,
+            'final_loss': float(history.history['loss'][-1]),
+            'final_val_loss': float(history.history['val_loss'][-1]),
+            'epochs_completed': len(history.history['loss']),
+            'memory_profile': memory_profile
         })
         
-        predictor.model = predictor.build_model(input_shape=(X.shape[1], X.shape[2]))
-        
-        # Custom callback for progress updates
-        class ProgressCallback(tf.keras.callbacks.Callback):
-            def __init__(self, total_epochs):
-                super().__init__()
-                self.total_epochs = total_epochs
-            
-            def on_epoch_end(self, epoch, logs=None):
-                progress = 30 + int((epoch + 1) / self.total_epochs * 60)
-                training_progress_queue.put({
-                    'status': 'training',
-                    'message': f'Epoch {epoch + 1}/{self.total_epochs}',
-                    'progress': progress,
-                    'epoch': epoch + 1,
-                    'total_epochs': self.total_epochs,
-                    'loss': float(logs.get('loss', 0)),
-                    'val_loss': float(logs.get('val_loss', 0))
-                })
-        
-        from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
-        # Ensure model directory exists
-        os.makedirs('models', exist_ok=True)
-        
-        early_stopping = EarlyStopping(
-            monitor='val_loss',
-            patience=10,
-            restore_best_weights=True
-        )
-        
-        checkpoint = ModelCheckpoint(
-            'models/best_model.h5',
-            monitor='val_loss',
-            save_best_only=True
-        )
-        
+    except Exception as e:
         training_progress_queue.put({
-            'status': 'training',
-            'message': 'Training model...',
-            'progress': 30
+            'status': 'error',
+            'message': str(e),
+            'progress': 0
+        })
+    finally:
+        # Stops tracing if saving failed after a profiled run
+        if trainee is not None:
+            trainee.finish_memory_profile()
+        training_active = False
+
+def incremental_train_background(epochs, batch_size, recent_hours, replay_ratio):
+    """Fine-tune the current model on recent data; promote only if it doesn't regress"""
+    global training_active
+    
+    try:
+        training_progress_queue.put({
+            'status': 'starting',
+            'message': f'Fine-tuning on the last {recent_hours:g} hours of data...',
+            'progress': 0
         })
         
-        # Train model
-        history = predictor.model.fit(
-            X_train, y_train,
+        # The serving predictor is untouched unless the fine-tuned model is promoted
+        trainee = TouristSafetyLSTM(db=predictor.db)
+        
+        report = trainee.train_incremental(
+            recent_hours=recent_hours,
+            replay_ratio=replay_ratio,
             epochs=epochs,
             batch_size=batch_size,
-            validation_split=0.2,
-            callbacks=[early_stopping, checkpoint, ProgressCallback(epochs)],
-            verbose=0
+            callbacks=[ProgressCallback(epochs)]
         )
         
-        training_progress_queue.put({
-            'status': 'saving',
-            'message': 'Saving model...',
-            'progress': 95
-        })
-        
-        # Save model
-        predictor.save_model()
+        if report['promoted']:
+            training_progress_queue.put({
+                'status': 'profiling',
+                'message': 'Precomputing location risk profiles...',
+                'progress': 97
+            })
+            
+            from risk_profiles import build_profiles
+            build_profiles(trainee)
+            load_serving_model(trainee)
+            install_predictor(trainee)
         
-        # Send completion
+        message = 'Fine-tuned model promoted' if report['promoted'] else \
+            f"Kept current model ({report.get('reason', 'validation MAE regressed')})"
         training_progress_queue.put({
             'status': 'completed',
-            'message': 'Training completed successfully!',
+            'message': message,
             'progress': 100,
-            'final_loss': float(history.history['loss'][-1]),
-            'final_val_loss': float(history.history['val_loss'][-1]),
-            'epochs_completed': len(history.history['loss'])
+            **report
         })
         
     except Exception as e:
@@ -303,22 +636,12 @@ def predict_risk():
             }), 400
         
         # Predict
-        risk_score = predictor.predict_risk(tourist_data)
-        
-        # Determine risk level
-        if risk_score < 0.3:
-            risk_level = 'low'
-        elif risk_score < 0.6:
-            risk_level = 'medium'
-        elif risk_score < 0.8:
-            risk_level = 'high'
-        else:
-            risk_level = 'critical'
+        risk_score = scorer().predict_risk(tourist_data)
         
-        return jsonify({
+        return encoding.respond({
             'success': True,
             'risk_score': float(risk_score),
-            'risk_level': risk_level,
+            'risk_level': risk_level(risk_score),
             'location': {
                 'lat': tourist_data['lat'],
                 'lng': tourist_data['lng']
@@ -362,16 +685,31 @@ def predict_hotspots():
                 'error': 'locations array is required'
             }), 400
         
-        # Predict hotspots
-        predictions = predictor.predict_hotspots(locations, time_window=time_window)
+        if wants_ndjson():
+            chunk_size = int(data.get('chunk_size', STREAM_CHUNK_SIZE))
+            return ndjson_response(
+                scorer().iter_hotspots(locations, time_window=time_window, chunk_size=chunk_size),
+                time_window_hours=time_window,
+                timestamp=datetime.now().isoformat()
+            )
+        
+        # Predict hotspots (coalesced with identical in-flight requests; the leader takes the admission slot)
+        predictions, coalesced = hotspot_flight.do(
+            canonical_key(locations, time_window),
+            lambda: run_admitted(ROUTE_LANES[request.url_rule.rule], lambda: scorer().predict_hotspots(locations, time_window=time_window))
+        )
         
-        return jsonify({
+        return encoding.respond({
             'success': True,
             'hotspots': predictions,
             'time_window_hours': time_window,
+            'coalesced': coalesced,
             'timestamp': datetime.now().isoformat()
         })
         
+    except Rejected as e:
+        # The leader was shed; requests coalesced onto it share the rejection
+        return rejected_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -402,14 +740,16 @@ def predict_tourist_risk():
             }), 400
         
         # Fetch tourist from Firebase
-        tourists_ref = predictor.db.collection('tourists')
-        query = tourists_ref.where('id', '==', tourist_id).limit(1)
-        docs = query.stream()
-        
-        tourist_doc = None
-        for doc in docs:
-            tourist_doc = doc.to_dict()
-            break
+        with metrics.stage('firestore'):
+            tourists_ref = predictor.db.collection('tourists')
+            query = tourists_ref.where('id', '==', tourist_id).limit(1)
+            docs = query.stream()
+            
+            tourist_doc = None
+            for doc in docs:
+                tourist_doc = doc.to_dict()
+                break
+        metrics.inc('ml_firestore_reads_total', collection='tourists')
         
         if not tourist_doc:
             return jsonify({
@@ -417,43 +757,19 @@ def predict_tourist_risk():
                 'error': f'Tourist {tourist_id} not found'
             }), 404
         
-        # Extract location
-        location = tourist_doc.get('location', {})
-        last_update = tourist_doc.get('lastUpdate')
-        
-        if isinstance(last_update, str):
-            last_update = datetime.fromisoformat(last_update.replace('Z', '+00:00'))
-        
         # Prepare data for prediction
-        tourist_data = {
-            'lat': location.get('lat', 0),
-            'lng': location.get('lng', 0),
-            'hour': last_update.hour if last_update else datetime.now().hour,
-            'day_of_week': last_update.weekday() if last_update else datetime.now().weekday(),
-            'day_of_month': last_update.day if last_update else datetime.now().day,
-            'month': last_update.month if last_update else datetime.now().month,
-            'risk_score': 0
-        }
+        location = tourist_doc.get('location', {})
+        tourist_data = tourist_features(tourist_doc)
         
         # Predict
-        risk_score = predictor.predict_risk(tourist_data)
-        
-        # Determine risk level
-        if risk_score < 0.3:
-            risk_level = 'low'
-        elif risk_score < 0.6:
-            risk_level = 'medium'
-        elif risk_score < 0.8:
-            risk_level = 'high'
-        else:
-            risk_level = 'critical'
+        risk_score = scorer().predict_risk(tourist_data)
         
-        return jsonify({
+        return encoding.respond({
             'success': True,
             'tourist_id': tourist_id,
             'tourist_name': tourist_doc.get('name'),
             'risk_score': float(risk_score),
-            'risk_level': risk_level,
+            'risk_level': risk_level(risk_score),
             'location': location,
             'timestamp': datetime.now().isoformat()
         })
@@ -464,6 +780,59 @@ def predict_tourist_risk():
             'error': str(e)
         }), 500
 
+def _fetch_tourists(tourist_ids):
+    """(tourist_id, document) pairs in request order, fetched with 'in' queries; unknown ids are dropped"""
+    found = {}
+    tourists_ref = predictor.db.collection('tourists')
+    for start in range(0, len(tourist_ids), FIRESTORE_IN_LIMIT):
+        with metrics.stage('firestore'):
+            docs = list(tourists_ref.where('id', 'in', tourist_ids[start:start + FIRESTORE_IN_LIMIT]).stream())
+        metrics.inc('ml_firestore_reads_total', len(docs), collection='tourists')
+        for doc in docs:
+            tourist_doc = doc.to_dict()
+            found[tourist_doc.get('id')] = tourist_doc
+    return [(tourist_id, found[tourist_id]) for tourist_id in tourist_ids if tourist_id in found]
+
+def _iter_batch_predictions(tourist_ids, chunk_size):
+    """Predictions for `chunk_size` tourists at a time: one fetch and one model batch per chunk"""
+    for start in range(0, len(tourist_ids), chunk_size):
+        chunk_ids = tourist_ids[start:start + chunk_size]
+        try:
+            tourists = _fetch_tourists(chunk_ids)
+        except Exception as e:
+            print(f"Error fetching {chunk_ids[0]}..{chunk_ids[-1]}: {e}")
+            continue
+        
+        # A malformed document drops only its own tourist, as per-tourist prediction did
+        valid = []
+        for tourist_id, tourist_doc in tourists:
+            try:
+                features = tourist_features(tourist_doc)
+                features['lat'], features['lng'] = float(features['lat']), float(features['lng'])
+            except Exception as e:
+                print(f"Error predicting for {tourist_id}: {e}")
+                continue
+            valid.append((tourist_id, tourist_doc, features))
+        if not valid:
+            continue
+        
+        try:
+            scores = scorer().predict_many([features for _, _, features in valid])
+        except Exception as e:
+            print(f"Error predicting for {chunk_ids[0]}..{chunk_ids[-1]}: {e}")
+            continue
+        
+        yield [
+            {
+                'tourist_id': tourist_id,
+                'tourist_name': tourist_doc.get('name'),
+                'risk_score': float(risk_score),
+                'risk_level': risk_level(risk_score),
+                'location': tourist_doc.get('location', {})
+            }
+            for (tourist_id, tourist_doc, _), risk_score in zip(valid, scores)
+        ]
+
 @app.route('/api/ml/predict/batch', methods=['POST'])
 def predict_batch():
     """
@@ -489,67 +858,14 @@ def predict_batch():
                 'error': 'tourist_ids array is required'
             }), 400
         
-        predictions = []
+        chunk_size = int(data.get('chunk_size', STREAM_CHUNK_SIZE))
+        chunks = _iter_batch_predictions(tourist_ids, chunk_size)
+        if wants_ndjson():
+            return ndjson_response(chunks, timestamp=datetime.now().isoformat())
         
-        for tourist_id in tourist_ids:
-            try:
-                # Fetch tourist from Firebase
-                tourists_ref = predictor.db.collection('tourists')
-                query = tourists_ref.where('id', '==', tourist_id).limit(1)
-                docs = query.stream()
-                
-                tourist_doc = None
-                for doc in docs:
-                    tourist_doc = doc.to_dict()
-                    break
-                
-                if not tourist_doc:
-                    continue
-                
-                # Extract location
-                location = tourist_doc.get('location', {})
-                last_update = tourist_doc.get('lastUpdate')
-                
-                if isinstance(last_update, str):
-                    last_update = datetime.fromisoformat(last_update.replace('Z', '+00:00'))
-                
-                # Prepare data for prediction
-                tourist_data = {
-                    'lat': location.get('lat', 0),
-                    'lng': location.get('lng', 0),
-                    'hour': last_update.hour if last_update else datetime.now().hour,
-                    'day_of_week': last_update.weekday() if last_update else datetime.now().weekday(),
-                    'day_of_month': last_update.day if last_update else datetime.now().day,
-                    'month': last_update.month if last_update else datetime.now().month,
-                    'risk_score': 0
-                }
-                
-                # Predict
-                risk_score = predictor.predict_risk(tourist_data)
-                
-                # Determine risk level
-                if risk_score < 0.3:
-                    risk_level = 'low'
-                elif risk_score < 0.6:
-                    risk_level = 'medium'
-                elif risk_score < 0.8:
-                    risk_level = 'high'
-                else:
-                    risk_level = 'critical'
-                
-                predictions.append({
-                    'tourist_id': tourist_id,
-                    'tourist_name': tourist_doc.get('name'),
-                    'risk_score': float(risk_score),
-                    'risk_level': risk_level,
-                    'location': location
-                })
-                
-            except Exception as e:
-                print(f"Error predicting for {tourist_id}: {e}")
-                continue
+        predictions = [prediction for chunk in chunks for prediction in chunk]
         
-        return jsonify({
+        return encoding.respond({
             'success': True,
             'predictions': predictions,
             'total': len(predictions),
@@ -562,6 +878,106 @@ def predict_batch():
             'error': str(e)
         }), 500
 
+def _nearby_entry(tourist_id, distance_km):
+    info = spatial_index.info(tourist_id) or {}
+    return {
+        'tourist_id': tourist_id,
+        'tourist_name': info.get('name'),
+        'distance_km': round(distance_km, 4),
+        'location': info.get('location')
+    }
+
+def _nearby_query(query):
+    lat, lng = float(query['lat']), float(query['lng'])
+    if query.get('k') is not None:
+        return spatial_index.nearest(lat, lng, k=int(query['k']), max_radius_km=query.get('radius_km'))
+    return spatial_index.within_radius(lat, lng, float(query.get('radius_km', 5)), limit=query.get('limit'))
+
+@app.route('/api/ml/nearby', methods=['POST'])
+def nearby_tourists():
+    """
+    Tourists near a point, from the live spatial index
+    POST /api/ml/nearby
+    Body: { "lat": 25.5788, "lng": 91.8933, "radius_km": 5 }   (radius query)
+          { "lat": 25.5788, "lng": 91.8933, "k": 10 }          (k nearest)
+    Bulk: { "alerts": [{"id": "A1", "lat": ..., "lng": ..., "radius_km": 2}, ...],
+            "rescore": true }
+    With "rescore": true the affected tourists are re-scored in one batch.
+    """
+    try:
+        if spatial_index is None:
+            return jsonify({
+                'success': False,
+                'error': 'Spatial index not available (needs Firebase; ML_SPATIAL_INDEX=0 disables it)'
+            }), 503
+        
+        data = request.json or {}
+        rescore = bool(data.get('rescore', False))
+        queries = data.get('alerts')
+        bulk = queries is not None
+        if not bulk:
+            queries = [data]
+        
+        if any(q.get('lat') is None or q.get('lng') is None for q in queries):
+            return jsonify({
+                'success': False,
+                'error': 'lat and lng are required'
+            }), 400
+        
+        start = time.perf_counter()
+        with metrics.stage('spatial_query'):
+            results = [[_nearby_entry(tid, dist) for tid, dist in _nearby_query(q)] for q in queries]
+        query_ms = (time.perf_counter() - start) * 1000
+        
+        rescored = 0
+        if rescore:
+            if predictor is None or predictor.model is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Model not loaded. Train the model first.'
+                }), 400
+            # Each affected tourist is scored once, however many alerts it is near
+            affected = {}
+            for entries in results:
+                for entry in entries:
+                    info = spatial_index.info(entry['tourist_id']) or {}
+                    if 'features' in info:
+                        affected.setdefault(entry['tourist_id'], info['features'])
+            if affected:
+                ids = list(affected)
+                # Profiles first, then the model, exactly as /predict/tourist scores them
+                scores = dict(zip(ids, scorer().predict_many([affected[tid] for tid in ids])))
+                for entries in results:
+                    for entry in entries:
+                        if entry['tourist_id'] in scores:
+                            score = float(scores[entry['tourist_id']])
+                            entry['risk_score'] = score
+                            entry['risk_level'] = risk_level(score)
+                rescored = len(ids)
+        
+        response = {
+            'success': True,
+            'index_size': len(spatial_index),
+            'query_ms': round(query_ms, 3),
+            'rescored': rescored,
+            'timestamp': datetime.now().isoformat()
+        }
+        if bulk:
+            response['alerts'] = [
+                {'alert': query, 'tourists': entries, 'count': len(entries)}
+                for query, entries in zip(queries, results)
+            ]
+        else:
+            response['tourists'] = results[0]
+            response['count'] = len(results[0])
+        return encoding.respond(response)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 if __name__ == '__main__':
     print("🚀 Starting LSTM Prediction API Server...")
     initialize_predictor()
@@ -0,0 +1,313 @@
+"""
+Population-wide risk scoring job
+Streams all active tourists, scores them in large vectorized batches and writes
+the results to the riskAssessments collection served by the backend, so the
+dashboard reads precomputed scores instead of requesting live predictions.
+Tourists whose inputs (and the model) are unchanged since the last run are
+skipped.
+
+Usage:
+    python batch_scorer.py                 # one run
+    python batch_scorer.py --interval 900  # every 15 minutes
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from lstm_predictor import TouristSafetyLSTM, risk_level, tourist_features
+
+COLLECTION = 'riskAssessments'
+STATE_PATH = 'models/batch_scorer_state.json'
+# Firestore limit for one batched write
+MAX_BATCH_WRITES = 500
+# Attempts per document before BulkWriter gives up (the client's default)
+BULK_WRITE_ATTEMPTS = 15
+
+
+class ChunkedBatchWriter:
+    """
+    Local stand-in for Firestore's BulkWriter
+    Groups writes into 500-operation batches and commits them from a thread
+    pool, with at most `max_in_flight` batches pending at once. Document ids
+    of batches that fail to commit are collected in `failed`.
+    """
+
+    def __init__(self, db, workers=8, max_in_flight=None):
+        self.db = db
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-writer')
+        self._slots = threading.BoundedSemaphore(max_in_flight or workers * 2)
+        self._lock = threading.Lock()
+        self._batch = None
+        self._ids = []
+        self._futures = []
+        self.errors = []
+        self.failed = set()
+
+    def set(self, ref, data):
+        self._add(ref, lambda batch: batch.set(ref, data))
+
+    def update(self, ref, data):
+        self._add(ref, lambda batch: batch.update(ref, data))
+
+    def _add(self, ref, write):
+        if self._batch is None:
+            self._batch = self.db.batch()
+        write(self._batch)
+        self._ids.append(ref.id)
+        if len(self._ids) >= MAX_BATCH_WRITES:
+            self._submit()
+
+    def _submit(self):
+        if self._batch is None:
+            return
+        batch, ids, self._batch, self._ids = self._batch, self._ids, None, []
+        self._slots.acquire()
+        future = self._pool.submit(batch.commit)
+        future.add_done_callback(lambda f: self._done(f, ids))
+        self._futures.append(future)
+
+    def _done(self, future, ids):
+        self._slots.release()
+        if future.exception() is not None:
+            with self._lock:
+                self.errors.append(future.exception())
+                self.failed.update(ids)
+
+    def flush(self):
+        self._submit()
+        for future in self._futures:
+            future.exception()  # wait
+        self._futures = []
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown()
+
+
+class BulkWriterAdapter:
+    """
+    Firestore BulkWriter that records the writes it gives up on
+    Failed writes are retried up to `max_attempts` times, like the client's
+    default, then collected in `errors` / `failed` (document ids) as with
+    ChunkedBatchWriter. A batch RPC that raises fails the whole run (`complete`).
+    """
+
+    def __init__(self, bulk_writer, max_attempts=BULK_WRITE_ATTEMPTS):
+        self._writer = bulk_writer
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self.errors = []
+        self.failed = set()
+        self.complete = True
+        bulk_writer.on_write_error(self._on_write_error)
+
+    def _on_write_error(self, failure, bulk_writer):
+        if failure.attempts < self.max_attempts:
+            return True
+        with self._lock:
+            self.errors.append(f"code {failure.code}: {failure.message}")
+            self.failed.add(failure.operation.reference.id)
+        return False
+
+    def set(self, ref, data):
+        self._writer.set(ref, data)
+
+    def update(self, ref, data):
+        self._writer.update(ref, data)
+
+    def close(self):
+        try:
+            self._writer.close()
+        except Exception as e:
+            self.errors.append(e)
+            self.complete = False
+
+
+def make_writer(db, workers=8):
+    """Firestore BulkWriter when the client has one, else ChunkedBatchWriter"""
+    if hasattr(db, 'bulk_writer'):
+        return BulkWriterAdapter(db.bulk_writer())
+    return ChunkedBatchWriter(db, workers=workers)
+
+
+def model_version(model_path='models/lstm_model.h5'):
+    """Changes whenever the model is retrained"""
+    return str(int(os.path.getmtime(model_path))) if os.path.exists(model_path) else 'unknown'
+
+
+def input_hash(features, version):
+    """Fingerprint of one tourist's prediction inputs and the model version"""
+    key = '|'.join([version, f"{float(features['lat']):.5f}", f"{float(features['lng']):.5f}"] +
+                   [str(int(features[col])) for col in ('hour', 'day_of_week', 'day_of_month', 'month')])
+    return hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def stream_active_tourists(db):
+    """Active tourist documents as (doc_id, dict), streamed without loading all of them"""
+    for doc in db.collection('tourists').where('status', '==', 'active').stream():
+        yield doc.id, doc.to_dict()
+
+
+def load_predictor(credentials_path=None, db=None):
+    """Predictor with the current model; pass `db` to reuse an initialized Firestore client"""
+    predictor = TouristSafetyLSTM(firebase_credentials_path=credentials_path, db=db)
+    if predictor.fused_model_available():
+        predictor.load_fused_model()
+    else:
+        predictor.load_model()
+    return predictor
+
+
+def _load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path, state):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def score_population(predictor, chunk_size=5000, workers=8, valid_minutes=60, force=False,
+                     collection=COLLECTION, state_path=STATE_PATH):
+    """
+    Score every active tourist and write one riskAssessments document each
+
+    Documents are keyed `ML_<tourist id>`, so every run overwrites the
+    previous score. Unchanged tourists are not re-scored, but their
+    validUntil is pushed forward so a current score never expires.
+    Returns a summary dict.
+    """
+    db = predictor.db
+    version = model_version()
+    previous = {} if force else _load_state(state_path)
+    hashes = {}
+    summary = {'scanned': 0, 'skipped': 0, 'scored': 0}
+    start = time.perf_counter()
+
+    writer = make_writer(db, workers=workers)
+    assessments = db.collection(collection)
+    tourists = stream_active_tourists(db)
+
+    while True:
+        chunk = list(itertools.islice(tourists, chunk_size))
+        if not chunk:
+            break
+        summary['scanned'] += len(chunk)
+
+        pending = []
+        valid_until = (datetime.now() + timedelta(minutes=valid_minutes)).isoformat()
+        for doc_id, doc in chunk:
+            tourist_id = doc.get('id', doc_id)
+            features = tourist_features(doc)
+            digest = input_hash(features, version)
+            hashes[tourist_id] = digest
+            if previous.get(tourist_id) == digest:
+                writer.update(assessments.document(f'ML_{tourist_id}'), {'validUntil': valid_until})
+                summary['skipped'] += 1
+                continue
+            pending.append((tourist_id, doc, features))
+
+        if not pending:
+            continue
+
+        rows = np.array([[features[col] for col in predictor.feature_columns] for _, _, features in pending],
+                        dtype=np.float64)
+        scores = predictor.predict_rows(rows, batch_size=1024)
+
+        now = datetime.now()
+        for (tourist_id, doc, features), score in zip(pending, scores):
+            location = doc.get('location') or {}
+            writer.set(assessments.document(f'ML_{tourist_id}'), {
+                'id': f'ML_{tourist_id}',
+                'touristId': tourist_id,
+                'touristName': doc.get('name'),
+                'location': {
+                    'name': location.get('placeName'),
+                    'district': location.get('district'),
+                    'lat': features['lat'],
+                    'lng': features['lng']
+                },
+                'riskLevel': risk_level(score),
+                'riskScore': int(round(float(score) * 100)),  # 0-100 like seeded assessments
+                'riskProbability': float(score),
+                'source': 'ml-batch',
+                'modelVersion': version,
+                'inputHash': hashes[tourist_id],
+                'timestamp': now.isoformat(),
+                'validUntil': (now + timedelta(minutes=valid_minutes)).isoformat(),
+                'createdAt': now.isoformat()
+            })
+        summary['scored'] += len(pending)
+        print(f"   {summary['scanned']} scanned, {summary['scored']} scored, {summary['skipped']} unchanged")
+
+    writer.close()
+    if writer.errors:
+        print(f"⚠️ {len(writer.errors)} write errors, {len(writer.failed)} assessments not written: {writer.errors[0]}")
+    # Failed tourists (including a missing document for an unchanged one) are re-scored next run
+    for doc_id in writer.failed:
+        hashes.pop(doc_id[len('ML_'):], None)
+    if getattr(writer, 'complete', True):
+        _save_state(state_path, hashes)
+
+    summary['write_errors'] = len(writer.errors)
+    summary['failed_writes'] = len(writer.failed)
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    summary['tourists_per_second'] = round(summary['scanned'] / max(summary['seconds'], 1e-9), 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score all active tourists into riskAssessments')
+    parser.add_argument('--interval', type=float, default=0, help='seconds between runs (0 = run once)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='tourists scored per model batch')
+    parser.add_argument('--workers', type=int, default=8, help='parallel batch commits (without BulkWriter)')
+    parser.add_argument('--valid-minutes', type=int, default=60, help='validUntil offset of written scores')
+    parser.add_argument('--force', action='store_true', help='re-score tourists whose inputs are unchanged')
+    parser.add_argument('--credentials', default='../backend/serviceAccountKey.json')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.credentials):
+        print(f"❌ Error: Firebase credentials not found at {args.credentials}")
+        sys.exit(1)
+    if not os.path.exists('models/lstm_model.h5'):
+        print("❌ No trained model. Run train_model.py first.")
+        sys.exit(1)
+
+    predictor = load_predictor(args.credentials)
+    loaded_version = model_version()
+    while True:
+        if model_version() != loaded_version:
+            print("🔄 Model changed; reloading")
+            # Firebase is initialized once per process; keep its client
+            predictor = load_predictor(db=predictor.db)
+            loaded_version = model_version()
+        print(f"🧮 Scoring active tourists ({datetime.now().isoformat(timespec='seconds')})...")
+        summary = score_population(predictor, chunk_size=args.chunk_size, workers=args.workers,
+                                   valid_minutes=args.valid_minutes, force=args.force)
+        print(f"✅ {summary['scored']} scored, {summary['skipped']} unchanged of {summary['scanned']} "
+              f"in {summary['seconds']}s ({summary['tourists_per_second']} tourists/s)")
+        if not args.interval:
+            break
+        args.force = False
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
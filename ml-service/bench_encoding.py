@@ -0,0 +1,93 @@
+"""
+Benchmark response encodings on a hotspot payload
+Times Flask's jsonify on the old payload shape (risk_trend as lists of Python
+floats) against encoding.dumps (orjson, NumPy arrays serialized natively),
+the stdlib json fallback and MessagePack, and records body sizes.
+
+Usage:
+    python bench_encoding.py [--locations 1000] [--time-window 24]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from flask import Flask, jsonify
+
+import encoding
+
+
+def make_payload(n_locations, time_window, seed=0):
+    """Hotspot response as predict_hotspots builds it (NumPy scalars and arrays)"""
+    rng = np.random.default_rng(seed)
+    curves = rng.random((n_locations, time_window))
+    hotspots = [
+        {
+            'location': {'lat': 25.5 + rng.random() / 10, 'lng': 91.8 + rng.random() / 10, 'name': f'Spot {i}'},
+            'avg_risk': np.mean(curve),
+            'max_risk': np.max(curve),
+            'risk_trend': curve
+        }
+        for i, curve in enumerate(curves)
+    ]
+    return {'success': True, 'hotspots': hotspots, 'time_window_hours': time_window,
+            'coalesced': False, 'timestamp': '2025-10-18T14:00:00'}
+
+
+def as_python_lists(payload):
+    """The payload as it looked before: risk_trend converted with .tolist()"""
+    return dict(payload, hotspots=[dict(h, risk_trend=h['risk_trend'].tolist()) for h in payload['hotspots']])
+
+
+def time_it(fn, repeats):
+    fn()  # warm-up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        body = fn()
+        times.append(time.perf_counter() - start)
+    return {'median_ms': round(float(np.median(times)) * 1000, 3), 'bytes': len(body)}
+
+
+def run_benchmark(n_locations=1000, time_window=24, repeats=30, output_path='models/encoding_benchmark.json'):
+    payload = make_payload(n_locations, time_window)
+    app = Flask(__name__)
+    results = {}
+
+    with app.app_context():
+        # Baseline: the .tolist() conversion was part of building every response
+        results['jsonify'] = time_it(lambda: jsonify(as_python_lists(payload)).get_data(), repeats)
+    results['json_stdlib'] = time_it(lambda: json.dumps(payload, default=encoding._default).encode(), repeats)
+    if encoding.orjson is not None:
+        results['orjson'] = time_it(lambda: encoding.dumps(payload), repeats)
+    if encoding.msgpack is not None:
+        results['msgpack_float32'] = time_it(lambda: encoding.packb(payload), repeats)
+
+    report = {'locations': n_locations, 'time_window': time_window, 'repeats': repeats, 'results': results}
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark hotspot response encodings')
+    parser.add_argument('--locations', type=int, default=1000)
+    parser.add_argument('--time-window', type=int, default=24)
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--output', default='models/encoding_benchmark.json')
+    args = parser.parse_args()
+
+    print(f"⏱️  Encoding {args.locations} locations x {args.time_window} hours...")
+    report = run_benchmark(args.locations, args.time_window, args.repeats, args.output)
+    baseline = report['results']['jsonify']['median_ms']
+    for name, result in report['results'].items():
+        print(f"   {name:16s} {result['median_ms']:8.2f} ms  {result['bytes'] / 1024:8.1f} KiB  "
+              f"({baseline / result['median_ms']:.1f}x)")
+    print(f"📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
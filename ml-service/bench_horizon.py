@@ -0,0 +1,170 @@
+"""
+Benchmark the multi-horizon forecasting head against per-hour scoring
+Trains a single-step model and a multi-horizon model on the same sequences and
+compares, on the same held-out windows, forecast accuracy per hour ahead and
+the latency of predict_hotspots (time_window model rows per location versus
+one row per location).
+
+Usage:
+    python bench_horizon.py [--horizon 24] [--epochs 20] [--locations 100]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from lstm_predictor import TouristSafetyLSTM, DEFAULT_HORIZON
+
+REPORT_PATH = 'models/horizon_benchmark.json'
+
+
+def _fit(predictor, X_train, y_train, epochs, batch_size, horizon):
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    model = predictor.build_model(input_shape=(X_train.shape[1], X_train.shape[2]), horizon=horizon)
+    model.fit(
+        X_train, y_train,
+        epochs=epochs,
+        batch_size=batch_size,
+        validation_split=0.2,
+        callbacks=[EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)],
+        verbose=0
+    )
+    return model
+
+
+def _serving_inputs(predictor, rows_scaled):
+    """Repeat scaled rows across the window with risk_score = 0, as served"""
+    rows = rows_scaled.copy()
+    rows[:, -1] = predictor.scaler.min_[-1]  # scaled value of a raw 0
+    return np.repeat(rows[:, np.newaxis, :], predictor.sequence_length, axis=1)
+
+
+def _hotspot_latency(predictor, model, locations, time_window, runs):
+    predictor.model = model
+    predictor.predict_hotspots(locations[:1], time_window=time_window)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predictor.predict_hotspots(locations, time_window=time_window)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'latency_ms_p50': float(np.percentile(timings, 50)),
+        'latency_ms_p95': float(np.percentile(timings, 95)),
+    }
+
+
+def run_benchmark(predictor, horizon=DEFAULT_HORIZON, epochs=20, batch_size=32,
+                  n_locations=100, runs=3, report_path=REPORT_PATH):
+    """
+    Returns:
+        dict: accuracy-versus-latency report for both approaches
+    """
+    from sklearn.model_selection import train_test_split
+    from risk_profiles import KNOWN_LOCATIONS, grid_cells
+
+    data_dict = predictor.fetch_training_data()
+    tourists_df, _ = predictor.preprocess_data(data_dict)
+
+    # Same windows for both models; the single-step target is the first column
+    X, y = predictor.create_sequences(tourists_df, horizon=horizon)
+    features_scaled = predictor.prepare_features(tourists_df, fit_scaler=False)
+    starts = np.arange(len(X))
+    X_train, X_test, y_train, y_test, _, test_starts = train_test_split(
+        X, y, starts, test_size=0.2, random_state=42
+    )
+    print(f"Training on {len(X_train)} windows, evaluating on {len(X_test)}")
+
+    print("Training single-step model...")
+    single = _fit(predictor, X_train, y_train[:, 0], epochs, batch_size, horizon=1)
+    print(f"Training {horizon}-step model...")
+    multi = _fit(predictor, X_train, y_train, epochs, batch_size, horizon=horizon)
+
+    # Per-hour loop: score each future row's calendar features separately
+    L = predictor.sequence_length
+    target_rows = test_starts[:, np.newaxis] + L + np.arange(horizon)
+    future = features_scaled[target_rows.ravel()]
+    loop_pred = single.predict(_serving_inputs(predictor, future), batch_size=1024, verbose=0)
+    loop_pred = loop_pred.reshape(len(X_test), horizon)
+
+    # Multi-horizon: one inference from the first target row
+    multi_pred = multi.predict(_serving_inputs(predictor, features_scaled[test_starts + L]),
+                               batch_size=1024, verbose=0)
+    history_pred = multi.predict(X_test, batch_size=1024, verbose=0)
+
+    def step_mae(pred):
+        return np.abs(pred - y_test).mean(axis=0)
+
+    loop_mae, multi_mae, history_mae = step_mae(loop_pred), step_mae(multi_pred), step_mae(history_pred)
+
+    locations = list(KNOWN_LOCATIONS)
+    if len(locations) < n_locations:
+        locations += grid_cells(0.1)
+    locations = locations[:n_locations]
+    predictor.risk_profiles = None  # measure live inference only
+
+    print(f"Timing predict_hotspots for {len(locations)} locations x {horizon} hours...")
+    report = {
+        'horizon': horizon,
+        'test_windows': int(len(X_test)),
+        'locations': len(locations),
+        'per_hour_loop': {
+            'mae': float(loop_mae.mean()),
+            'mae_by_step': loop_mae.tolist(),
+            'model_calls': len(locations) * horizon,
+            'params': int(single.count_params()),
+            **_hotspot_latency(predictor, single, locations, horizon, runs),
+        },
+        'multi_horizon': {
+            'mae': float(multi_mae.mean()),
+            'mae_by_step': multi_mae.tolist(),
+            'mae_with_history': float(history_mae.mean()),
+            'model_calls': 1,
+            'params': int(multi.count_params()),
+            **_hotspot_latency(predictor, multi, locations, horizon, runs),
+        },
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    report['speedup'] = (report['per_hour_loop']['latency_ms_p50'] /
+                         max(report['multi_horizon']['latency_ms_p50'], 1e-9))
+
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {report_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the multi-horizon head with the per-hour loop')
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON)
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--locations', type=int, default=100, help='locations per predict_hotspots call')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--credentials', default='../backend/serviceAccountKey.json')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.credentials):
+        print(f"❌ Error: Firebase credentials not found at {args.credentials}")
+        sys.exit(1)
+
+    predictor = TouristSafetyLSTM(firebase_credentials_path=args.credentials)
+    report = run_benchmark(predictor, horizon=args.horizon, epochs=args.epochs,
+                           batch_size=args.batch_size, n_locations=args.locations, runs=args.runs)
+
+    print()
+    print(f"📊 {report['locations']} locations, {report['horizon']}-hour window:")
+    for name in ('per_hour_loop', 'multi_horizon'):
+        r = report[name]
+        print(f"   {name:14s} MAE {r['mae']:.4f}  p50 {r['latency_ms_p50']:.1f} ms  "
+              f"({r['model_calls']} model call(s) per location set)")
+    print(f"   ⚡ Speedup: {report['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
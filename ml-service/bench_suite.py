@@ -0,0 +1,261 @@
+"""
+Reproducible benchmark suite
+Generates a synthetic Meghalaya database (synthetic_data.py), serves it from
+the in-memory fake Firestore (fake_firestore.py) and times the training
+pipeline stages and every prediction endpoint. Results are written as JSON
+tagged with the git commit, so two runs can be compared:
+
+    python bench_suite.py --scale 10k
+    python bench_suite.py --scale 10k --compare models/benchmarks/<earlier run>.json
+
+Training runs in a scratch directory, so models/ is left untouched.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from synthetic_data import SyntheticDataset, MEGHALAYA_LOCATIONS
+from fake_firestore import FakeFirestore
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000, '10m': 10000000}
+STAGES = ('fetch', 'preprocess', 'sequences', 'train', 'api')
+RESULTS_DIR = 'models/benchmarks'
+# Slower than the baseline by more than this fraction counts as a regression
+REGRESSION_THRESHOLD = 0.10
+# ... and by more than this many seconds, so timer noise on tiny stages is ignored
+NOISE_FLOOR_S = 0.002
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, round(time.perf_counter() - start, 4)
+
+
+def summarize(latencies):
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(ms),
+        'median_ms': round(float(np.median(ms)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'max_ms': round(float(ms.max()), 3)
+    }
+
+
+def bench_pipeline(predictor, stages, epochs, batch_size, row_budget=None, dedup_deg=None):
+    """Seconds per training pipeline stage"""
+    import tensorflow as tf
+    results = {}
+
+    data_dict, results['fetch_training_data_s'] = timed(
+        lambda: predictor.fetch_training_data(row_budget=row_budget, dedup_deg=dedup_deg))
+    results['training_rows'] = int(len(data_dict['tourists']))
+    if 'preprocess' not in stages and 'sequences' not in stages:
+        return results
+    (tourists_df, _), results['preprocess_data_s'] = timed(lambda: predictor.preprocess_data(data_dict))
+    if 'sequences' in stages:
+        (X, _), results['create_sequences_s'] = timed(lambda: predictor.create_sequences(tourists_df))
+        results['sequences'] = int(len(X))
+
+    if 'train' in stages:
+        class EpochTimer(tf.keras.callbacks.Callback):
+            def __init__(self):
+                super().__init__()
+                self.seconds = []
+
+            def on_epoch_begin(self, epoch, logs=None):
+                self._start = time.perf_counter()
+
+            def on_epoch_end(self, epoch, logs=None):
+                self.seconds.append(round(time.perf_counter() - self._start, 4))
+
+        timer = EpochTimer()
+        _, results['train_total_s'] = timed(lambda: predictor.train(epochs=epochs, batch_size=batch_size,
+                                                                    callbacks=[timer], verbose=0,
+                                                                    row_budget=row_budget, dedup_deg=dedup_deg))
+        results['epoch_s'] = timer.seconds
+        results['epoch_mean_s'] = round(float(np.mean(timer.seconds)), 4) if timer.seconds else None
+    return results
+
+
+def bench_api(predictor, dataset, requests_per_endpoint):
+    """Latency of each prediction endpoint through the Flask test client"""
+    import api_server
+    api_server.predictor = predictor
+    api_server.start_spatial_index()
+    client = api_server.app.test_client()
+
+    rng = np.random.default_rng(0)
+    n_tourists = dataset.sizes['tourists']
+    tourist_ids = [f'T{i:06d}' for i in rng.integers(1, n_tourists + 1, size=1000)]
+    locations = [
+        {'lat': lat + float(rng.uniform(-0.02, 0.02)), 'lng': lng + float(rng.uniform(-0.02, 0.02)), 'name': name}
+        for name, lat, lng, _ in MEGHALAYA_LOCATIONS
+    ] * 4
+    shillong = MEGHALAYA_LOCATIONS[0]
+
+    endpoints = {
+        'health': ('GET', '/api/ml/health', lambda i: None),
+        'predict_risk': ('POST', '/api/ml/predict/risk',
+                         lambda i: {'lat': shillong[1], 'lng': shillong[2], 'hour': i % 24, 'day_of_week': i % 7}),
+        'predict_tourist': ('POST', '/api/ml/predict/tourist', lambda i: {'tourist_id': tourist_ids[i % 1000]}),
+        'predict_batch_50': ('POST', '/api/ml/predict/batch',
+                             lambda i: {'tourist_ids': tourist_ids[(i * 50) % 950:(i * 50) % 950 + 50]}),
+        'predict_hotspots_60': ('POST', '/api/ml/predict/hotspots', lambda i: {'locations': locations, 'time_window': 24}),
+        'nearby_2km': ('POST', '/api/ml/nearby', lambda i: {'lat': shillong[1], 'lng': shillong[2], 'radius_km': 2}),
+    }
+
+    results = {}
+    for name, (method, path, body) in endpoints.items():
+        client.open(path, method=method, json=body(0))  # warm-up
+        latencies = []
+        statuses = set()
+        for i in range(requests_per_endpoint):
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body(i))
+            latencies.append(time.perf_counter() - start)
+            statuses.add(response.status_code)
+        results[name] = summarize(latencies)
+        results[name]['statuses'] = sorted(statuses)
+    return results
+
+
+def run_suite(dataset, stages=STAGES, epochs=2, batch_size=32, requests_per_endpoint=50,
+              materialize_limit=1000000, row_budget=None, dedup_deg=None):
+    from lstm_predictor import TouristSafetyLSTM
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'dataset': dict(dataset.sizes, seed=dataset.seed),
+        'sampling': {'row_budget': row_budget, 'dedup_deg': dedup_deg},
+        'results': {}
+    }
+
+    db, report['results']['load_dataset_s'] = timed(
+        lambda: FakeFirestore.from_dataset(dataset, materialize_limit=materialize_limit)
+    )
+    predictor = TouristSafetyLSTM(db=db)
+
+    pipeline_stages = [stage for stage in stages if stage != 'api']
+    if 'api' in stages and 'train' not in stages:
+        pipeline_stages.append('train')  # the endpoints need a model
+    if pipeline_stages:
+        print(f"⏱️  Pipeline stages: {', '.join(pipeline_stages)}")
+        report['results'].update(bench_pipeline(predictor, pipeline_stages, epochs, batch_size,
+                                                row_budget, dedup_deg))
+
+    if 'api' in stages:
+        print(f"⏱️  API endpoints ({requests_per_endpoint} requests each)")
+        report['results']['api'] = bench_api(predictor, dataset, requests_per_endpoint)
+
+    report['firestore'] = db.stats()
+    return report
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and (key.endswith('_s') or key.endswith('_ms')):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(report, baseline):
+    """(metric, baseline, current, change, regressed) for every timing present in both runs"""
+    current, previous = _flatten(report['results']), _flatten(baseline['results'])
+    rows = []
+    for metric in sorted(current):
+        if metric in previous and previous[metric] > 0:
+            change = current[metric] / previous[metric] - 1
+            delta_s = (current[metric] - previous[metric]) / (1000 if metric.endswith('_ms') else 1)
+            regressed = change > REGRESSION_THRESHOLD and delta_s > NOISE_FLOOR_S
+            rows.append((metric, previous[metric], current[metric], change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ML pipeline and API on synthetic data')
+    parser.add_argument('--scale', choices=list(SCALES), default='1k', help='number of tourists')
+    parser.add_argument('--tourists', type=int, help='override the tourist count of --scale')
+    parser.add_argument('--alerts', type=int, help='default: half the tourists')
+    parser.add_argument('--zones', type=int, help='default: a tenth of the tourists, at most 500')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50, help='requests per API endpoint')
+    parser.add_argument('--row-budget', type=int, help='train on a stratified sample of this many rows')
+    parser.add_argument('--dedup-deg', type=float, help='merge consecutive near-identical pings')
+    parser.add_argument('--materialize-limit', type=int, default=1000000,
+                        help='larger collections are generated lazily on every read')
+    parser.add_argument('--output', help=f'default: {RESULTS_DIR}/<timestamp>_<commit>.json')
+    parser.add_argument('--compare', help='earlier result JSON to compare against')
+    args = parser.parse_args()
+
+    tourists = args.tourists or SCALES[args.scale]
+    dataset = SyntheticDataset(
+        tourists=tourists,
+        alerts=args.alerts if args.alerts is not None else tourists // 2,
+        zones=args.zones if args.zones is not None else min(500, max(1, tourists // 10)),
+        seed=args.seed
+    )
+    output = os.path.abspath(args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}_{git_commit()}.json"))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(f"🧪 Synthetic data: {dataset.sizes}")
+    workdir = tempfile.mkdtemp(prefix='ml-bench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)  # train() writes under models/
+    try:
+        report = run_suite(dataset, stages=args.stages, epochs=args.epochs, batch_size=args.batch_size,
+                           requests_per_endpoint=args.requests, materialize_limit=args.materialize_limit,
+                           row_budget=args.row_budget, dedup_deg=args.dedup_deg)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for metric, value in _flatten(report['results']).items():
+        print(f"   {metric:40s} {value}")
+    if baseline is not None:
+        print(f"\n📊 Against {baseline.get('commit')} ({args.compare}):")
+        regressions = 0
+        for metric, before, after, change, regressed in compare(report, baseline):
+            flag = '⚠️ ' if regressed else '   '
+            regressions += regressed
+            print(f"{flag}{metric:40s} {before:>10} -> {after:<10} ({change:+.1%})")
+        print(f"{'⚠️' if regressions else '✅'} {regressions} metrics slower by more than {REGRESSION_THRESHOLD:.0%}")
+    print(f"📄 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
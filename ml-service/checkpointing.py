@@ -0,0 +1,223 @@
+"""
+Resumable training support
+Periodic full-state checkpoints (model with optimizer state, epoch counter,
+early-stopping/best-model state and the exact train/test arrays) and a lock
+file that marks a training run as active across processes.
+"""
+
+import glob
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import tensorflow as tf
+
+CHECKPOINT_DIR = 'models/checkpoints'
+LOCK_PATH = 'models/training.lock'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TrainingLock:
+    """
+    Lock file holding the pid of the process that is training
+    The file is created exclusively, so only one process can take the lock. A
+    lock whose process is gone (crash, server restart) is stale: owner()
+    ignores it and acquire() removes it.
+    """
+
+    def __init__(self, path=LOCK_PATH):
+        self.path = path
+
+    def owner(self):
+        """Lock contents if a live process holds it, else None"""
+        try:
+            with open(self.path) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not _pid_alive(int(info.get('pid', -1))):
+            return None
+        return info
+
+    def acquire(self, **info):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        content = json.dumps({'pid': os.getpid(), 'started': datetime.now().isoformat(), **info})
+        for _ in range(3):
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                holder = self.owner()
+                if holder is None:
+                    self._remove_stale()
+                    continue
+                if holder['pid'] != os.getpid():
+                    raise RuntimeError(f"Training already in progress (pid {holder['pid']})")
+                # Already ours; record the new run's info
+                with open(self.path, 'w') as f:
+                    f.write(content)
+                return
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            return
+        raise RuntimeError(f"Could not acquire {self.path}")
+
+    def _remove_stale(self):
+        """
+        Remove a lock left by a dead process
+        It is moved aside first, so a lock another process created after our
+        check is put back instead of deleted.
+        """
+        aside = f'{self.path}.stale.{os.getpid()}'
+        try:
+            os.rename(self.path, aside)
+        except FileNotFoundError:
+            return
+        moved = TrainingLock(aside).owner()
+        if moved is not None:
+            try:
+                os.link(aside, self.path)
+            except FileExistsError:
+                pass
+        os.remove(aside)
+
+    def release(self):
+        holder = self.owner()
+        if holder is None or holder['pid'] == os.getpid():
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def checkpoint_state(checkpoint_dir=CHECKPOINT_DIR):
+    """state.json of the latest checkpoint, or None if there is nothing to resume"""
+    path = os.path.join(checkpoint_dir, 'state.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    # The files written together with this state.json, never another epoch's
+    if state.get('model_file') is None:
+        return None
+    for name in (state['model_file'], state.get('best_weights_file')):
+        if name is not None and not os.path.exists(os.path.join(checkpoint_dir, name)):
+            return None
+    return state
+
+
+def save_dataset(checkpoint_dir=CHECKPOINT_DIR, **arrays):
+    """Snapshot the prepared arrays so a resumed run sees the same split"""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    tmp_path = os.path.join(checkpoint_dir, 'dataset.tmp.npz')
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, os.path.join(checkpoint_dir, 'dataset.npz'))
+
+
+def load_dataset(checkpoint_dir=CHECKPOINT_DIR):
+    with np.load(os.path.join(checkpoint_dir, 'dataset.npz')) as data:
+        return {name: data[name] for name in data.files}
+
+
+def load_checkpoint_model(checkpoint_dir=CHECKPOINT_DIR, state=None):
+    """Model with its optimizer state as of the last checkpoint"""
+    state = state or checkpoint_state(checkpoint_dir)
+    return tf.keras.models.load_model(os.path.join(checkpoint_dir, state['model_file']))
+
+
+def clear_checkpoint(checkpoint_dir=CHECKPOINT_DIR):
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+
+class ResumableCheckpoint(tf.keras.callbacks.Callback):
+    """
+    Write a full training checkpoint every `every` epochs
+
+    Each checkpoint replaces the previous one atomically: model-<epoch>.h5
+    (weights and optimizer) and best_weights-<epoch>.npz (early-stopping best
+    weights) are written under new names, then state.json, naming them along
+    with the number of completed epochs, early-stopping/best-model counters,
+    the history so far and `config`, replaces the old state.json in one rename.
+    Files of older epochs are removed afterwards, so a crash at any point
+    leaves one consistent checkpoint. Given `resume_state`, the counters are
+    restored when fit() starts, after the other callbacks have reset themselves.
+    """
+
+    def __init__(self, checkpoint_dir=CHECKPOINT_DIR, every=1, early_stopping=None,
+                 model_checkpoint=None, config=None, resume_state=None):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.every = max(1, int(every))
+        self.early_stopping = early_stopping
+        self.model_checkpoint = model_checkpoint
+        self.config = dict(config or {})
+        self.resume_state = resume_state
+        self.history = dict((resume_state or {}).get('history', {}))
+
+    def on_train_begin(self, logs=None):
+        state = self.resume_state
+        if not state:
+            return
+        es = state.get('early_stopping')
+        if self.early_stopping is not None and es:
+            self.early_stopping.wait = es['wait']
+            self.early_stopping.best = es['best']
+            self.early_stopping.best_epoch = es['best_epoch']
+            weights_file = state.get('best_weights_file')
+            weights_path = os.path.join(self.checkpoint_dir, weights_file) if weights_file else None
+            if weights_path is not None and os.path.exists(weights_path):
+                with np.load(weights_path) as data:
+                    self.early_stopping.best_weights = [data[f'w{i}'] for i in range(len(data.files))]
+        if self.model_checkpoint is not None and state.get('model_checkpoint_best') is not None:
+            self.model_checkpoint.best = state['model_checkpoint_best']
+
+    def on_epoch_end(self, epoch, logs=None):
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(float(value))
+        if (epoch + 1) % self.every == 0:
+            self.save(epoch + 1)
+
+    def save(self, epochs_completed):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        model_file = f'model-{epochs_completed:04d}.h5'
+        self.model.save(os.path.join(self.checkpoint_dir, model_file), include_optimizer=True)
+
+        state = {
+            'epoch': epochs_completed,
+            'config': self.config,
+            'history': self.history,
+            'model_file': model_file,
+            'best_weights_file': None,
+            'saved': datetime.now().isoformat(),
+        }
+        es = self.early_stopping
+        if es is not None:
+            state['early_stopping'] = {'wait': int(es.wait), 'best': float(es.best), 'best_epoch': int(es.best_epoch)}
+            if es.best_weights is not None:
+                state['best_weights_file'] = f'best_weights-{epochs_completed:04d}.npz'
+                np.savez(os.path.join(self.checkpoint_dir, state['best_weights_file']),
+                         **{f'w{i}': w for i, w in enumerate(es.best_weights)})
+        if self.model_checkpoint is not None:
+            state['model_checkpoint_best'] = float(self.model_checkpoint.best)
+
+        # Replacing state.json commits the checkpoint
+        tmp_state = os.path.join(self.checkpoint_dir, 'state.tmp.json')
+        with open(tmp_state, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_state, os.path.join(self.checkpoint_dir, 'state.json'))
+
+        keep = {model_file, state['best_weights_file']}
+        for pattern in ('model-*.h5', 'best_weights-*.npz'):
+            for path in glob.glob(os.path.join(self.checkpoint_dir, pattern)):
+                if os.path.basename(path) not in keep:
+                    os.remove(path)
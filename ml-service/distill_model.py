@@ -0,0 +1,285 @@
+"""
+Knowledge distillation of the LSTM risk model into a lightweight student
+At serving time every prediction is a single feature row repeated across the
+sequence window, so a small model on the row itself can reproduce the LSTM's
+output at a fraction of the cost.
+
+Usage:
+    python distill_model.py [mlp|gru|gbt] [epochs]
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from lstm_predictor import TouristSafetyLSTM, RISK_LEVEL_BOUNDARIES
+
+STUDENT_KINDS = ('mlp', 'gru', 'gbt')
+
+
+class DistilledRiskModel:
+    """
+    Student model trained on the LSTM teacher's outputs
+    Takes raw feature rows (n, features) and carries its own min/max scaling
+    """
+
+    def __init__(self, kind, model, feature_columns, scale_min, scale_scale, sequence_length=1,
+                 teacher_mtime=None):
+        if kind not in STUDENT_KINDS:
+            raise ValueError(f"Unknown student kind '{kind}', expected one of {STUDENT_KINDS}")
+        self.kind = kind
+        self.model = model
+        self.feature_columns = list(feature_columns)
+        self.scale_min = np.asarray(scale_min, dtype=np.float64)
+        self.scale_scale = np.asarray(scale_scale, dtype=np.float64)
+        self.sequence_length = sequence_length
+        # mtime of the lstm_model.h5 whose outputs and scaler the student copies
+        self.teacher_mtime = teacher_mtime
+
+    @classmethod
+    def build(cls, kind, feature_columns, scaler, sequence_length):
+        """Create an untrained student using the teacher's fitted scaler"""
+        n_features = len(feature_columns)
+
+        if kind == 'gbt':
+            from sklearn.ensemble import HistGradientBoostingRegressor
+            model = HistGradientBoostingRegressor(max_iter=200, max_depth=6, learning_rate=0.1)
+        else:
+            from tensorflow import keras
+            from tensorflow.keras.layers import Dense, GRU
+
+            if kind == 'gru':
+                # Short window keeps the recurrent cost low
+                sequence_length = min(sequence_length, 4)
+                inputs = [keras.Input(shape=(sequence_length, n_features)), GRU(16)]
+            else:
+                inputs = [keras.Input(shape=(n_features,)), Dense(32, activation='relu')]
+            model = keras.Sequential(inputs + [
+                Dense(16, activation='relu'),
+                Dense(1, activation='sigmoid')
+            ])
+            model.compile(optimizer=keras.optimizers.Adam(learning_rate=0.003), loss='mse', metrics=['mae'])
+
+        return cls(kind, model, feature_columns, scaler.min_, scaler.scale_, sequence_length)
+
+    def _inputs(self, rows):
+        rows_scaled = np.asarray(rows, dtype=np.float64) * self.scale_scale + self.scale_min
+        if self.kind == 'gru':
+            return np.repeat(rows_scaled[:, np.newaxis, :], self.sequence_length, axis=1)
+        return rows_scaled
+
+    def fit(self, rows, targets, epochs=30, batch_size=256):
+        inputs = self._inputs(rows)
+        if self.kind == 'gbt':
+            self.model.fit(inputs, targets)
+        else:
+            from tensorflow.keras.callbacks import EarlyStopping
+            self.model.fit(
+                inputs, targets,
+                epochs=epochs,
+                batch_size=batch_size,
+                validation_split=0.1,
+                callbacks=[EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)],
+                verbose=0
+            )
+        return self
+
+    def predict(self, rows, batch_size=1024):
+        """Risk scores (n,) for raw feature rows"""
+        inputs = self._inputs(rows)
+        if self.kind == 'gbt':
+            return np.clip(self.model.predict(inputs), 0.0, 1.0)
+        if len(inputs) <= batch_size:
+            # Direct call avoids predict()'s per-call setup for small requests
+            return np.asarray(self.model(inputs, training=False))[:, 0].astype(np.float64)
+        return self.model.predict(inputs, batch_size=batch_size, verbose=0)[:, 0].astype(np.float64)
+
+    @staticmethod
+    def is_confident(scores, margin):
+        """True where the score is at least `margin` away from every risk level boundary"""
+        scores = np.asarray(scores, dtype=np.float64)
+        distance = np.min(np.abs(scores[..., np.newaxis] - np.asarray(RISK_LEVEL_BOUNDARIES)), axis=-1)
+        return distance >= margin
+
+    def save(self, student_dir='models/student', teacher_path='models/lstm_model.h5'):
+        os.makedirs(student_dir, exist_ok=True)
+        if self.kind == 'gbt':
+            import joblib
+            joblib.dump(self.model, os.path.join(student_dir, 'student.pkl'))
+        else:
+            self.model.save(os.path.join(student_dir, 'student.h5'))
+        with open(os.path.join(student_dir, 'student_meta.json'), 'w') as f:
+            json.dump({
+                'kind': self.kind,
+                'feature_columns': self.feature_columns,
+                'scale_min': self.scale_min.tolist(),
+                'scale_scale': self.scale_scale.tolist(),
+                'sequence_length': self.sequence_length,
+                'teacher_mtime': os.path.getmtime(teacher_path) if os.path.exists(teacher_path) else None
+            }, f, indent=2)
+        print(f"Student saved to {student_dir}")
+
+    @classmethod
+    def load(cls, student_dir='models/student'):
+        with open(os.path.join(student_dir, 'student_meta.json')) as f:
+            meta = json.load(f)
+        if meta['kind'] == 'gbt':
+            import joblib
+            model = joblib.load(os.path.join(student_dir, 'student.pkl'))
+        else:
+            from tensorflow.keras.models import load_model
+            model = load_model(os.path.join(student_dir, 'student.h5'), compile=False)
+        return cls(meta['kind'], model, meta['feature_columns'], meta['scale_min'],
+                   meta['scale_scale'], meta.get('sequence_length', 1), meta.get('teacher_mtime'))
+
+
+def _latency(predict_fn, rows, runs=30):
+    """Single-row latency percentiles (ms) and batch throughput (rows/s)"""
+    single = rows[:1]
+    predict_fn(single)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict_fn(single)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    predict_fn(rows)
+    throughput = len(rows) / max(time.perf_counter() - start, 1e-9)
+
+    return {
+        'latency_ms_p50': float(np.percentile(timings, 50)),
+        'latency_ms_p95': float(np.percentile(timings, 95)),
+        'throughput_rows_per_s': float(throughput)
+    }
+
+
+def _accuracy(scores, targets):
+    errors = np.abs(scores - targets)
+    return {
+        'mae': float(errors.mean()),
+        'accuracy': float((errors <= 0.1).mean()),  # within 0.1 risk score
+    }
+
+
+def distill(predictor, kind='mlp', epochs=30, margin=0.05, test_size=0.2,
+            student_dir='models/student', report_path='models/distill_report.json'):
+    """
+    Train a student on the teacher's outputs and compare both on held-out rows
+
+    Args:
+        predictor: TouristSafetyLSTM with the teacher model and scaler loaded
+        kind: 'mlp', 'gru' or 'gbt'
+        margin: confidence margin used for the fallback-rate estimate
+
+    Returns:
+        dict: accuracy-versus-latency report
+    """
+    data_dict = predictor.fetch_training_data()
+    tourists_df, _ = predictor.preprocess_data(data_dict)
+    if 'timestamp' in tourists_df.columns:
+        tourists_df = tourists_df.sort_values('timestamp')
+    for col in predictor.feature_columns:
+        if col not in tourists_df.columns:
+            tourists_df[col] = 0
+    rows = tourists_df[predictor.feature_columns].values.astype(np.float64)
+
+    # Ground truth is the next row's scaled risk, as in create_sequences
+    targets = rows[1:, -1] * predictor.scaler.scale_[-1] + predictor.scaler.min_[-1]
+    rows = rows[:-1]
+    if len(rows) < 10:
+        raise ValueError(f"Not enough rows to distill ({len(rows)})")
+
+    rng = np.random.default_rng(42)
+    order = rng.permutation(len(rows))
+    n_test = max(1, int(len(rows) * test_size))
+    test_idx, train_idx = order[:n_test], order[n_test:]
+
+    # Transfer set: training rows as stored and as served (risk_score input is 0)
+    serving_rows = rows[train_idx].copy()
+    serving_rows[:, -1] = 0
+    transfer_rows = np.vstack([rows[train_idx], serving_rows])
+    print(f"Labelling {len(transfer_rows)} transfer rows with the teacher...")
+    soft_targets = predictor.predict_rows(transfer_rows, use_student=False)
+
+    print(f"Training {kind} student...")
+    student = DistilledRiskModel.build(kind, predictor.feature_columns, predictor.scaler, predictor.sequence_length)
+    student.fit(transfer_rows, soft_targets, epochs=epochs)
+    student.save(student_dir)
+
+    # Same held-out rows for both models
+    test_rows, test_targets = rows[test_idx], targets[test_idx]
+    teacher_scores = predictor.predict_rows(test_rows, use_student=False)
+    student_scores = student.predict(test_rows)
+    confident = student.is_confident(student_scores, margin)
+    served = np.where(confident, student_scores, teacher_scores)
+
+    def level(scores):
+        return np.searchsorted(RISK_LEVEL_BOUNDARIES, scores, side='right')
+
+    report = {
+        'student_kind': kind,
+        'held_out_rows': int(len(test_rows)),
+        'teacher': {
+            **_accuracy(teacher_scores, test_targets),
+            **_latency(lambda r: predictor.predict_rows(r, use_student=False), test_rows),
+            'params': int(predictor.model.count_params()),
+        },
+        'student': {
+            **_accuracy(student_scores, test_targets),
+            **_latency(student.predict, test_rows),
+            'fidelity_mae': float(np.abs(student_scores - teacher_scores).mean()),
+            'level_agreement': float((level(student_scores) == level(teacher_scores)).mean()),
+        },
+        'student_with_fallback': {
+            **_accuracy(served, test_targets),
+            'margin': margin,
+            'fallback_rate': float(1 - confident.mean()),
+        },
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if kind != 'gbt':
+        report['student']['params'] = int(student.model.count_params())
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {report_path}")
+    return report
+
+
+def main():
+    kind = sys.argv[1] if len(sys.argv) > 1 else 'mlp'
+    epochs = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    if kind not in STUDENT_KINDS:
+        print(f"❌ Unknown student kind '{kind}'. Choose from: {', '.join(STUDENT_KINDS)}")
+        sys.exit(1)
+
+    credentials_path = '../backend/serviceAccountKey.json'
+    if not os.path.exists(credentials_path):
+        print(f"❌ Error: Firebase credentials not found at {credentials_path}")
+        sys.exit(1)
+    if not os.path.exists('models/lstm_model.h5'):
+        print("❌ No trained teacher model. Run train_model.py first.")
+        sys.exit(1)
+
+    predictor = TouristSafetyLSTM(firebase_credentials_path=credentials_path)
+    predictor.load_model()
+
+    report = distill(predictor, kind=kind, epochs=epochs)
+
+    print()
+    print("📊 Accuracy vs latency (held-out rows):")
+    for name in ('teacher', 'student'):
+        r = report[name]
+        print(f"   {name:8s} MAE {r['mae']:.4f}  acc {r['accuracy']:.3f}  "
+              f"p50 {r['latency_ms_p50']:.2f} ms  {r['throughput_rows_per_s']:.0f} rows/s")
+    fb = report['student_with_fallback']
+    print(f"   student+fallback MAE {fb['mae']:.4f}  fallback rate {fb['fallback_rate']:.1%}")
+    print(f"   student/teacher fidelity MAE {report['student']['fidelity_mae']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Response encoding for the ML API
+JSON through orjson when it is installed (NumPy arrays and scalars are
+serialized natively, no .tolist() pass), falling back to the standard json
+module. Clients that send `Accept: application/msgpack` get MessagePack with
+floats packed as float32, about half the size of the JSON body.
+"""
+
+import json
+
+import numpy as np
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Also accepted in Accept headers
+MSGPACK_ALIASES = ('application/x-msgpack', 'application/vnd.msgpack')
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    """NumPy (and other non-JSON) values for the stdlib json / msgpack fallbacks"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def dumps(obj):
+    """JSON bytes"""
+    if orjson is not None:
+        # Non-contiguous arrays and unsupported dtypes fall through to _default
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default).encode()
+
+
+def packb(obj):
+    """MessagePack bytes, floats as float32"""
+    return msgpack.packb(obj, default=_default, use_single_float=True)
+
+
+def wants_msgpack():
+    if msgpack is None:
+        return False
+    offered = [JSON_MIMETYPE, MSGPACK_MIMETYPE, *MSGPACK_ALIASES]
+    return request.accept_mimetypes.best_match(offered, default=JSON_MIMETYPE) != JSON_MIMETYPE
+
+
+def respond(payload, status=200):
+    """Encode `payload` in the format the client asked for (JSON unless it accepts MessagePack)"""
+    if wants_msgpack():
+        return Response(packb(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    return Response(dumps(payload), status=status, mimetype=JSON_MIMETYPE)
@@ -0,0 +1,342 @@
+"""
+In-memory stand-in for the Firestore client
+Implements the subset of google.cloud.firestore used by this service
+(collection/document refs, where/limit/order_by queries, stream/get, batched
+writes and on_snapshot listeners), so the predictor, API server and batch jobs
+can run and be benchmarked without a Firebase project:
+
+    db = FakeFirestore.from_dataset(SyntheticDataset(tourists=100000))
+    predictor = TouristSafetyLSTM(db=db)
+
+Collections larger than `materialize_limit` stay lazy: documents are generated
+chunk by chunk on every stream, and writes go to an in-memory overlay.
+"""
+
+import copy
+import itertools
+import threading
+import uuid
+from datetime import datetime
+
+_MISSING = object()
+
+
+def _get_field(data, path):
+    value = data
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _matches(data, field, op, value):
+    actual = _get_field(data, field)
+    if actual is _MISSING:
+        return False
+    try:
+        if op == '==':
+            return actual == value
+        if op == '!=':
+            return actual != value
+        if op == '<':
+            return actual < value
+        if op == '<=':
+            return actual <= value
+        if op == '>':
+            return actual > value
+        if op == '>=':
+            return actual >= value
+        if op == 'in':
+            return actual in value
+        if op == 'not-in':
+            return actual not in value
+        if op == 'array-contains':
+            return isinstance(actual, list) and value in actual
+        if op == 'array-contains-any':
+            return isinstance(actual, list) and any(v in actual for v in value)
+    except TypeError:
+        return False
+    raise ValueError(f'Unsupported operator {op!r}')
+
+
+class _ChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+ADDED, MODIFIED, REMOVED = _ChangeType('ADDED'), _ChangeType('MODIFIED'), _ChangeType('REMOVED')
+
+
+class DocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        value = _get_field(self._data or {}, field)
+        return None if value is _MISSING else value
+
+
+class DocumentReference:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self):
+        self._collection.reads += 1
+        return DocumentSnapshot(self, self._collection._lookup(self.id))
+
+    def set(self, data, merge=False):
+        if merge:
+            current = self._collection._lookup(self.id) or {}
+            data = {**current, **data}
+        self._collection._write(self.id, copy.deepcopy(data))
+
+    def update(self, data):
+        current = self._collection._lookup(self.id)
+        if current is None:
+            raise KeyError(f'No document to update: {self._collection.name}/{self.id}')
+        updated = copy.deepcopy(current)
+        for path, value in data.items():
+            target = updated
+            parts = path.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+        self._collection._write(self.id, updated)
+
+    def delete(self):
+        self._collection._write(self.id, None)
+
+
+class Query:
+    def __init__(self, collection, filters=(), order=None, limit=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit
+
+    def where(self, field, op, value):
+        return Query(self._collection, self._filters + ((field, op, value),), self._order, self._limit)
+
+    def order_by(self, field, direction='ASCENDING'):
+        return Query(self._collection, self._filters, (field, str(direction).upper().startswith('DESC')), self._limit)
+
+    def limit(self, count):
+        return Query(self._collection, self._filters, self._order, count)
+
+    def _candidates(self):
+        # Lookups by the document's own id field avoid a scan, as Firestore's index would
+        for field, op, value in self._filters:
+            if field == 'id' and op in ('==', 'in') and self._collection.ids_are_keys:
+                ids = [value] if op == '==' else list(value)
+                return ((doc_id, self._collection._lookup(doc_id)) for doc_id in ids)
+        return self._collection._iter_documents()
+
+    def stream(self):
+        matched = (
+            (doc_id, data) for doc_id, data in self._candidates()
+            if data is not None and all(_matches(data, *f) for f in self._filters)
+        )
+        if self._order is not None:
+            field, descending = self._order
+            matched = sorted(
+                (item for item in matched if _get_field(item[1], field) is not _MISSING),
+                key=lambda item: _get_field(item[1], field), reverse=descending
+            )
+        if self._limit is not None:
+            matched = itertools.islice(matched, self._limit)
+        for doc_id, data in matched:
+            self._collection.reads += 1
+            yield DocumentSnapshot(DocumentReference(self._collection, doc_id), copy.deepcopy(data))
+
+    def get(self):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._collection._listen(self, callback)
+
+
+class _Watch:
+    def __init__(self, collection, entry):
+        self._collection = collection
+        self._entry = entry
+
+    def unsubscribe(self):
+        with self._collection._lock:
+            if self._entry in self._collection._listeners:
+                self._collection._listeners.remove(self._entry)
+
+
+class CollectionReference(Query):
+    """
+    One collection: a dict of documents, optionally backed by a lazy source
+    `ids_are_keys` means every document's 'id' field equals its document id
+    (true for seeded data), which lets id lookups skip the scan.
+    """
+
+    def __init__(self, name, source=None, source_lookup=None):
+        super().__init__(self)
+        self.name = name
+        self._docs = {}
+        self._source = source              # callable -> iterator of (doc_id, dict)
+        self._source_lookup = source_lookup  # callable(doc_id) -> dict or None
+        self._lock = threading.RLock()
+        self._listeners = []
+        self.ids_are_keys = True
+        self.reads = 0
+        self.writes = 0
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = uuid.uuid4().hex[:20]
+        return DocumentReference(self, doc_id)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(), ref
+
+    def _lookup(self, doc_id):
+        with self._lock:
+            if doc_id in self._docs:
+                return self._docs[doc_id]
+        if self._source_lookup is not None:
+            return self._source_lookup(doc_id)
+        return None
+
+    def _iter_documents(self):
+        with self._lock:
+            overlay = dict(self._docs)
+        if self._source is not None:
+            for doc_id, data in self._source():
+                if doc_id in overlay:
+                    continue
+                yield doc_id, data
+        for doc_id, data in overlay.items():
+            if data is not None:
+                yield doc_id, data
+
+    def _write(self, doc_id, data):
+        with self._lock:
+            existed = self._lookup(doc_id) is not None
+            if data is None and self._source is None:
+                self._docs.pop(doc_id, None)
+            else:
+                self._docs[doc_id] = data  # None marks a deleted lazy document
+            if data is not None and data.get('id', doc_id) != doc_id:
+                self.ids_are_keys = False
+            self.writes += 1
+            listeners = list(self._listeners)
+
+        if data is None:
+            change_type = REMOVED if existed else None
+        else:
+            change_type = MODIFIED if existed else ADDED
+        if change_type is None:
+            return
+        for query, callback in listeners:
+            snapshot = DocumentSnapshot(DocumentReference(self, doc_id), copy.deepcopy(data))
+            if change_type is not REMOVED and not all(_matches(data, *f) for f in query._filters):
+                continue
+            callback(None, [DocumentChange(change_type, snapshot)], datetime.now())
+
+    def _listen(self, query, callback):
+        """Initial snapshot as ADDED changes, then one callback per write"""
+        entry = (query, callback)
+        with self._lock:
+            self._listeners.append(entry)
+        callback(None, [DocumentChange(ADDED, snapshot) for snapshot in query.stream()], datetime.now())
+        return _Watch(self, entry)
+
+    def load(self, documents):
+        """Bulk insert (doc_id, dict) pairs without notifying listeners"""
+        with self._lock:
+            for doc_id, data in documents:
+                self._docs[doc_id] = data
+                if data.get('id', doc_id) != doc_id:
+                    self.ids_are_keys = False
+
+
+class WriteBatch:
+    MAX_WRITES = 500
+
+    def __init__(self):
+        self._ops = []
+
+    def _add(self, op):
+        if len(self._ops) >= self.MAX_WRITES:
+            raise ValueError('A batch can contain at most 500 writes')
+        self._ops.append(op)
+
+    def set(self, ref, data, merge=False):
+        self._add(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self._add(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self._add(ref.delete)
+
+    def commit(self):
+        ops, self._ops = self._ops, []
+        for op in ops:
+            op()
+        return []
+
+
+class FakeFirestore:
+    """Client exposing collection() and batch(), like firestore.client()"""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = CollectionReference(name)
+            return self._collections[name]
+
+    def batch(self):
+        return WriteBatch()
+
+    def collections(self):
+        return list(self._collections.values())
+
+    def stats(self):
+        return {name: {'reads': c.reads, 'writes': c.writes} for name, c in self._collections.items()}
+
+    @classmethod
+    def from_dataset(cls, dataset, materialize_limit=1000000):
+        """
+        Client serving a synthetic_data.SyntheticDataset
+        Collections up to `materialize_limit` documents are generated once and
+        held in memory; larger ones are regenerated on every stream.
+        """
+        db = cls()
+        for name, size in dataset.sizes.items():
+            if size <= materialize_limit:
+                db.collection(name).load(dataset.iter_documents(name))
+            else:
+                db._collections[name] = CollectionReference(
+                    name,
+                    source=lambda name=name: dataset.iter_documents(name),
+                    source_lookup=lambda doc_id, name=name: dataset.get_document(name, doc_id)
+                )
+        return db
@@ -0,0 +1,475 @@
+"""
+Load generator for the ML API
+Sends a weighted mix of prediction requests (a profile) either open-loop
+(Poisson arrivals at a fixed rate, latency measured from the scheduled send
+time so a slow server cannot hide its queueing) or closed-loop (N clients,
+each waiting for its response plus a think time). Latencies go into HDR-style
+log-linear histograms and are reported as p50/p90/p95/p99/p99.9 per endpoint;
+shed, failed and dropped arrivals are timed too and count in the percentiles.
+
+Scenarios:
+    mixed         one workload (--profile, --mode)
+    sos-overload  SOS lookups alone, then alongside a dashboard hotspot flood;
+                  with admission control the SOS percentiles should hold steady
+
+--offline starts a local server on synthetic data (fake Firestore and a small
+freshly trained model), so no Firebase project is needed.
+
+Usage:
+    python loadtest.py --offline --mode open --rate 20 --profile dashboard
+    python loadtest.py --offline --scenario sos-overload
+    python loadtest.py --url http://localhost:5001 --mode closed --clients 16
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+REPORT_PATH = 'models/loadtest_report.json'
+# Meghalaya tourist spots used for hotspot and location requests
+CENTRES = [(25.5788, 91.8933), (25.2676, 91.7320), (25.5138, 90.2036), (25.4670, 91.3662), (25.4522, 92.1950)]
+
+# Request mixes (weights). `dashboard` follows the frontend: the health poll,
+# hotspot and batch refreshes of the map pages, and operator lookups.
+PROFILES = {
+    'dashboard': {'health': 1, 'hotspots': 3, 'batch': 3, 'risk': 2, 'tourist': 1},
+    'sos': {'tourist': 1},
+    'risk': {'risk': 1},
+    'tourist': {'tourist': 1},
+    'hotspots': {'hotspots': 1},
+    'batch': {'batch': 1},
+}
+
+
+class LatencyHistogram:
+    """
+    Log-linear latency histogram (HdrHistogram layout)
+    Microsecond values keep 11 significant bits, i.e. better than 0.1%
+    relative precision, in a sparse Counter.
+    """
+
+    SUB_BUCKET_BITS = 11
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self.min_us = None
+
+    def record(self, seconds):
+        value = max(1, int(seconds * 1e6))
+        shift = max(0, value.bit_length() - self.SUB_BUCKET_BITS)
+        self.counts[(value >> shift) << shift] += 1
+        self.count += 1
+        self.total_us += value
+        self.max_us = max(self.max_us, value)
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def percentile(self, q):
+        """Value (ms) at or below which q percent of recorded latencies fall"""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for lower in sorted(self.counts):
+            seen += self.counts[lower]
+            if seen >= target:
+                shift = max(0, lower.bit_length() - self.SUB_BUCKET_BITS)
+                return min(lower + (1 << shift) - 1, self.max_us) / 1000
+        return self.max_us / 1000
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        result = {'count': self.count, 'mean_ms': round(self.total_us / self.count / 1000, 3)}
+        for label, q in (('p50', 50), ('p90', 90), ('p95', 95), ('p99', 99), ('p999', 99.9)):
+            result[f'{label}_ms'] = round(self.percentile(q), 3)
+        result['max_ms'] = round(self.max_us / 1000, 3)
+        return result
+
+
+class Recorder:
+    """
+    Per-endpoint histograms and status counts of one workload
+    Every arrival is timed, by outcome: 'ok' (200), 'failed' (shed, error or no
+    connection) and, in open loop, 'dropped' when max_outstanding requests were
+    already in flight. The overall percentiles cover all three, so slow or shed
+    requests cannot fall out of the tail (coordinated omission).
+    """
+
+    OUTCOMES = ('ok', 'failed', 'dropped')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (endpoint, outcome) -> LatencyHistogram
+        self.statuses = Counter()
+        self.dropped = 0
+
+    def _record(self, endpoint, outcome, seconds):
+        self.histograms.setdefault((endpoint, outcome), LatencyHistogram()).record(seconds)
+
+    def add(self, endpoint, status, seconds):
+        with self._lock:
+            self.statuses[status] += 1
+            self._record(endpoint, 'ok' if status == 200 else 'failed', seconds)
+
+    def drop(self, endpoint, seconds):
+        """An arrival that was never sent, waiting `seconds` from its scheduled time"""
+        with self._lock:
+            self.dropped += 1
+            self._record(endpoint, 'dropped', seconds)
+
+    def _merged(self, endpoint=None, outcome=None):
+        merged = LatencyHistogram()
+        for (name, kind), histogram in self.histograms.items():
+            if endpoint in (None, name) and outcome in (None, kind):
+                merged.merge(histogram)
+        return merged
+
+    def summary(self, duration):
+        requests = sum(self.statuses.values())
+        endpoints = sorted({name for name, _ in self.histograms})
+        outcomes = [kind for kind in self.OUTCOMES if any(k == kind for _, k in self.histograms)]
+        return {
+            'requests': requests,
+            'throughput_rps': round(requests / duration, 2),
+            'statuses': {str(k): v for k, v in sorted(self.statuses.items())},
+            'dropped': self.dropped,
+            'latency': self._merged().summary(),
+            'latency_by_outcome': {kind: self._merged(outcome=kind).summary() for kind in outcomes},
+            'endpoints': {name: self._merged(endpoint=name).summary() for name in endpoints}
+        }
+
+
+def send(url, method='POST', body=None, timeout=30):
+    """One request; returns (status, seconds, Retry-After seconds or None). Status 0 = connection error"""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'} if data else {})
+    start = time.perf_counter()
+    retry_after = None
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+        retry_after = e.headers.get('Retry-After')
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return status, time.perf_counter() - start, float(retry_after) if retry_after else None
+
+
+def make_locations(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {'lat': round(lat + rng.uniform(-0.05, 0.05), 5), 'lng': round(lng + rng.uniform(-0.05, 0.05), 5),
+         'name': f'Spot {i}'}
+        for i, (lat, lng) in enumerate(rng.choice(CENTRES) for _ in range(n))
+    ]
+
+
+class RequestFactory:
+    """Builds (endpoint, method, path, body) requests for a profile"""
+
+    def __init__(self, profile, tourist_ids, locations=50, batch_size=50, seed=0):
+        self.names = list(PROFILES[profile])
+        self.weights = [PROFILES[profile][name] for name in self.names]
+        self.tourist_ids = tourist_ids
+        self.locations = locations
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        # A handful of dashboard views; identical views are coalesced by the server
+        self.views = [make_locations(locations, seed=view) for view in range(8)]
+
+    def next(self):
+        name = self.rng.choices(self.names, self.weights)[0]
+        if name == 'health':
+            return name, 'GET', '/api/ml/health', None
+        if name == 'risk':
+            lat, lng = self.rng.choice(CENTRES)
+            return name, 'POST', '/api/ml/predict/risk', {
+                'lat': lat + self.rng.uniform(-0.05, 0.05), 'lng': lng + self.rng.uniform(-0.05, 0.05),
+                'hour': self.rng.randrange(24), 'day_of_week': self.rng.randrange(7)}
+        if name == 'tourist':
+            return name, 'POST', '/api/ml/predict/tourist', {'tourist_id': self.rng.choice(self.tourist_ids)}
+        if name == 'batch':
+            k = min(self.batch_size, len(self.tourist_ids))
+            return name, 'POST', '/api/ml/predict/batch', {'tourist_ids': self.rng.sample(self.tourist_ids, k)}
+        return name, 'POST', '/api/ml/predict/hotspots', {'locations': self.rng.choice(self.views), 'time_window': 24}
+
+
+class Workload:
+    """
+    One stream of traffic
+    mode 'open': Poisson arrivals at `rate` per second, at most `max_outstanding` in flight
+    mode 'closed': `clients` loops, each sleeping `think_time` between requests and
+    honouring Retry-After when shed
+    """
+
+    def __init__(self, name, profile, mode='open', rate=10.0, clients=8, think_time=0.0,
+                 tourist_ids=None, locations=50, max_outstanding=256, seed=0):
+        self.name = name
+        self.profile = profile
+        self.mode = mode
+        self.rate = rate
+        self.clients = clients
+        self.think_time = think_time
+        self.tourist_ids = tourist_ids or [f'T{i:06d}' for i in range(1, 101)]
+        self.locations = locations
+        self.max_outstanding = max_outstanding
+        self.seed = seed
+        self.recorder = Recorder()
+
+    def describe(self):
+        load = f'{self.rate}/s open-loop' if self.mode == 'open' else f'{self.clients} closed-loop clients'
+        return f'{self.name}: {self.profile} profile, {load}'
+
+    def _fire(self, url, request, scheduled):
+        endpoint, method, path, body = request
+        status, _, _ = send(url + path, method, body)
+        # From the scheduled time: includes any wait for a free sender
+        self.recorder.add(endpoint, status, time.perf_counter() - scheduled)
+
+    def _open_loop(self, url, stop):
+        factory = RequestFactory(self.profile, self.tourist_ids, self.locations, seed=self.seed)
+        rng = random.Random(self.seed + 1)
+        outstanding = threading.BoundedSemaphore(self.max_outstanding)
+        # Arrivals dropped while every sender was busy, as (endpoint, scheduled time)
+        overflow = deque()
+
+        def finished(_):
+            outstanding.release()
+            # The oldest dropped arrival could have been sent no earlier than now
+            try:
+                endpoint, scheduled = overflow.popleft()
+            except IndexError:
+                return
+            self.recorder.drop(endpoint, time.perf_counter() - scheduled)
+
+        with ThreadPoolExecutor(max_workers=self.max_outstanding, thread_name_prefix=f'{self.name}-open') as pool:
+            next_at = time.perf_counter()
+            while not stop.is_set():
+                next_at += rng.expovariate(self.rate)
+                delay = next_at - time.perf_counter()
+                if delay > 0 and stop.wait(delay):
+                    break
+                request = factory.next()
+                if not outstanding.acquire(blocking=False):
+                    overflow.append((request[0], next_at))
+                    continue
+                pool.submit(self._fire, url, request, next_at).add_done_callback(finished)
+        # Still waiting when the run ended
+        while overflow:
+            endpoint, scheduled = overflow.popleft()
+            self.recorder.drop(endpoint, time.perf_counter() - scheduled)
+
+    def _closed_client(self, url, stop, index):
+        factory = RequestFactory(self.profile, self.tourist_ids, self.locations, seed=self.seed * 1000 + index)
+        while not stop.is_set():
+            endpoint, method, path, body = factory.next()
+            status, seconds, retry_after = send(url + path, method, body)
+            self.recorder.add(endpoint, status, seconds)
+            pause = retry_after if retry_after else self.think_time
+            if pause:
+                stop.wait(pause)
+
+    def threads(self, url, stop):
+        if self.mode == 'open':
+            return [threading.Thread(target=self._open_loop, args=(url, stop), daemon=True)]
+        return [threading.Thread(target=self._closed_client, args=(url, stop, i), daemon=True)
+                for i in range(self.clients)]
+
+
+def run_workloads(url, workloads, duration):
+    """Run workloads side by side for `duration` seconds; returns {name: summary}"""
+    stop = threading.Event()
+    threads = [thread for workload in workloads for thread in workload.threads(url, stop)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    return {workload.name: dict(workload.recorder.summary(duration), description=workload.describe())
+            for workload in workloads}
+
+
+def warm_up(url, tourist_ids):
+    """One request per endpoint, so model tracing is not measured"""
+    factory = RequestFactory('dashboard', tourist_ids)
+    seen = set()
+    for _ in range(200):
+        request = factory.next()
+        if request[0] not in seen:
+            seen.add(request[0])
+            send(url + request[2], request[1], request[3])
+
+
+def print_summary(name, summary):
+    latency = summary['latency']
+    print(f"   {name}: {summary['requests']} requests ({summary['throughput_rps']}/s), "
+          f"statuses {summary['statuses']}, dropped {summary['dropped']}")
+    if latency.get('count'):
+        print(f"      all        p50 {latency['p50_ms']}ms  p95 {latency['p95_ms']}ms  "
+              f"p99 {latency['p99_ms']}ms  p99.9 {latency['p999_ms']}ms  max {latency['max_ms']}ms")
+    if len(summary['latency_by_outcome']) > 1:
+        for outcome, stats in summary['latency_by_outcome'].items():
+            print(f"      {outcome:10s} p50 {stats['p50_ms']}ms  p99 {stats['p99_ms']}ms  (n={stats['count']})")
+    for endpoint, stats in summary['endpoints'].items():
+        print(f"      {endpoint:10s} p50 {stats['p50_ms']}ms  p95 {stats['p95_ms']}ms  "
+              f"p99 {stats['p99_ms']}ms  p99.9 {stats['p999_ms']}ms  (n={stats['count']})")
+
+
+def run_sos_overload(url, duration=20, tourist_ids=None, sos_rate=5.0, dashboard_clients=32, locations=200):
+    """SOS latency alone versus under a dashboard hotspot flood"""
+    report = {'scenario': 'sos-overload'}
+
+    print(f"🚑 Baseline: SOS lookups only ({duration}s)...")
+    sos = Workload('sos', 'sos', mode='open', rate=sos_rate, tourist_ids=tourist_ids)
+    report['baseline'] = run_workloads(url, [sos], duration)
+    print_summary('sos', report['baseline']['sos'])
+
+    print(f"📊 Overload: SOS lookups + {dashboard_clients} dashboard clients ({duration}s)...")
+    sos = Workload('sos', 'sos', mode='open', rate=sos_rate, tourist_ids=tourist_ids)
+    # Each dashboard client has its own view, so requests cannot be coalesced
+    dashboard = Workload('dashboard', 'hotspots', mode='closed', clients=dashboard_clients,
+                         tourist_ids=tourist_ids, locations=locations, seed=7)
+    report['overload'] = run_workloads(url, [sos, dashboard], duration)
+    print_summary('sos', report['overload']['sos'])
+    print_summary('dashboard', report['overload']['dashboard'])
+
+    base = report['baseline']['sos']['latency']
+    over = report['overload']['sos']['latency']
+    if base.get('count') and over.get('count'):
+        print(f"✅ SOS p99 {base['p99_ms']}ms alone -> {over['p99_ms']}ms under overload (all arrivals)")
+    return report
+
+
+def serve_offline(port, tourists=1000, seed=0):
+    """
+    Run the API on synthetic data with a small freshly trained model
+    Prints 'ready <port>' once it accepts requests.
+    """
+    import logging
+    from werkzeug.serving import make_server
+    from synthetic_data import SyntheticDataset
+    from fake_firestore import FakeFirestore
+    from lstm_predictor import TouristSafetyLSTM
+    import api_server
+
+    os.chdir(tempfile.mkdtemp(prefix='ml-loadtest-'))  # keep models/ and profiles/ out of the repo
+    db = FakeFirestore.from_dataset(SyntheticDataset(tourists=tourists, alerts=tourists // 2,
+                                                     zones=min(500, tourists // 10 or 1), seed=seed))
+    predictor = TouristSafetyLSTM(db=db)
+    predictor.sequence_length = 8
+    tourists_df, _ = predictor.preprocess_data(predictor.fetch_training_data())
+    X, y = predictor.create_sequences(tourists_df)
+    predictor.model = predictor.build_model(input_shape=(X.shape[1], X.shape[2]), lstm_units=(16, 8, 4),
+                                            dropout=(0.1, 0.1, 0.1), dense_units=8)
+    predictor.model.fit(X, y, epochs=1, batch_size=64, verbose=0)
+
+    api_server.predictor = predictor
+    api_server.start_spatial_index()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no access log per request
+    server = make_server('127.0.0.1', port, api_server.app, threaded=True)
+    print(f'ready {server.server_port}', flush=True)
+    server.serve_forever()
+
+
+def start_offline_server(tourists=1000, seed=0, env=None):
+    """Start serve_offline in a child process; returns (process, url)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', '--port', '0',
+         '--offline-tourists', str(tourists), '--seed', str(seed)],
+        stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=dict(os.environ, **(env or {}))
+    )
+    for line in process.stdout:
+        if line.startswith('ready '):
+            return process, f'http://127.0.0.1:{line.split()[1]}'
+    process.wait()
+    raise RuntimeError(f'Offline server exited with code {process.returncode}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the ML API')
+    parser.add_argument('--url', default='http://localhost:5001')
+    parser.add_argument('--scenario', choices=['mixed', 'sos-overload'], default='mixed')
+    parser.add_argument('--profile', choices=list(PROFILES), default='dashboard')
+    parser.add_argument('--mode', choices=['open', 'closed'], default='open')
+    parser.add_argument('--rate', type=float, default=20.0, help='open loop: requests per second')
+    parser.add_argument('--clients', type=int, default=8, help='closed loop: concurrent clients')
+    parser.add_argument('--think-time', type=float, default=0.0, help='closed loop: seconds between requests')
+    parser.add_argument('--duration', type=float, default=20, help='seconds (per phase for sos-overload)')
+    parser.add_argument('--locations', type=int, default=50, help='locations per hotspot request')
+    parser.add_argument('--sos-rate', type=float, default=5.0, help='sos-overload: SOS lookups per second')
+    parser.add_argument('--dashboard-clients', type=int, default=32, help='sos-overload: flooding clients')
+    parser.add_argument('--tourist-ids', nargs='*', help='ids for tourist/batch requests (default T000001..)')
+    parser.add_argument('--offline', action='store_true', help='start a local server on synthetic data')
+    parser.add_argument('--offline-tourists', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--output', default=REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_offline(args.port, tourists=args.offline_tourists, seed=args.seed)
+        return
+
+    url, process = args.url, None
+    n_ids = args.offline_tourists if args.offline else 100
+    tourist_ids = args.tourist_ids or [f'T{i:06d}' for i in range(1, n_ids + 1)]
+    if args.offline:
+        print(f"🧪 Starting offline server ({args.offline_tourists} synthetic tourists, small test model)...")
+        process, url = start_offline_server(args.offline_tourists, args.seed)
+        print(f"   Serving on {url}")
+
+    try:
+        warm_up(url, tourist_ids)
+        if args.scenario == 'sos-overload':
+            report = run_sos_overload(url, duration=args.duration, tourist_ids=tourist_ids, sos_rate=args.sos_rate,
+                                      dashboard_clients=args.dashboard_clients, locations=args.locations)
+        else:
+            workload = Workload('mixed', args.profile, mode=args.mode, rate=args.rate, clients=args.clients,
+                                think_time=args.think_time, tourist_ids=tourist_ids, locations=args.locations,
+                                seed=args.seed)
+            print(f"🚀 {workload.describe()} for {args.duration}s against {url}...")
+            report = {'scenario': 'mixed', 'results': run_workloads(url, [workload], args.duration)}
+            print_summary('mixed', report['results']['mixed'])
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report.update(url=url, offline=args.offline, duration_s=args.duration)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
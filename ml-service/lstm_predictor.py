@@ -8,31 +8,100 @@ import pandas as pd
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout, Bidirectional
+from tensorflow.keras.layers import LSTM, Dense, Dropout, Bidirectional, Rescaling, RepeatVector
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
-from sklearn.preprocessing import MinMaxScaler, LabelEncoder
-from sklearn.model_selection import train_test_split
 import firebase_admin
 from firebase_admin import credentials, firestore
 import json
 import os
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-import joblib
+import metrics
+
+# sklearn and joblib are only imported for training and for the unfused model
+# files, so a server running the fused model never loads them
+
+# Serving artifact with the fitted scaler folded into the graph (see export_fused_model)
+FUSED_MODEL_PATH = 'models/lstm_model_fused.h5'
+MODEL_META_PATH = 'models/model_meta.json'
+
+# Risk score boundaries between low / medium / high / critical
+RISK_LEVEL_BOUNDARIES = (0.3, 0.6, 0.8)
+
+# Per-stage memory report of train(profile_memory=True), next to the model files
+MEMORY_PROFILE_PATH = 'models/memory_profile.json'
+
+# Steps predicted by the multi-horizon head (one per hour of the hotspot window)
+DEFAULT_HORIZON = 24
+
+RISK_LEVEL_NAMES = ('low', 'medium', 'high', 'critical')
+
+
+def risk_level(risk_score):
+    """Risk level name for a 0-1 risk score"""
+    return RISK_LEVEL_NAMES[int(np.searchsorted(RISK_LEVEL_BOUNDARIES, risk_score, side='right'))]
+
+
+def tourist_features(tourist_doc):
+    """Prediction input for a Firestore tourist document (its location at lastUpdate)"""
+    location = tourist_doc.get('location') or {}
+    last_update = tourist_doc.get('lastUpdate')
+    
+    if isinstance(last_update, str):
+        last_update = datetime.fromisoformat(last_update.replace('Z', '+00:00'))
+    when = last_update or datetime.now()
+    
+    return {
+        'lat': location.get('lat', 0),
+        'lng': location.get('lng', 0),
+        'hour': when.hour,
+        'day_of_week': when.weekday(),
+        'day_of_month': when.day,
+        'month': when.month,
+        'risk_score': 0
+    }
+
 
 class TouristSafetyLSTM:
     """
     LSTM Model for predicting tourist safety metrics
     """
     
-    def __init__(self, firebase_credentials_path):
-        """Initialize Firebase and model parameters"""
-        self.db = self._initialize_firebase(firebase_credentials_path)
+    def __init__(self, firebase_credentials_path=None, db=None):
+        """
+        Initialize Firebase and model parameters (no Firebase when path is None)
+        `db` injects a Firestore-compatible client instead, e.g. fake_firestore.FakeFirestore
+        """
+        if db is not None:
+            self.db = db
+        else:
+            self.db = self._initialize_firebase(firebase_credentials_path) if firebase_credentials_path else None
         self.model = None
-        self.scaler = MinMaxScaler()
-        self.label_encoder = LabelEncoder()
+        self.scaler = None  # MinMaxScaler, fitted by prepare_features
+        self.label_encoder = None
         self.sequence_length = 24  # 24 hours of data
         self.feature_columns = []
         
+        # True when self.model takes raw feature rows (scaler folded in)
+        self.fused = False
+        
+        # Optional distilled student (see distill_model.py)
+        self.student = None
+        self.student_margin = 0.05
+        self.student_stats = {'served': 0, 'fallback': 0}
+        
+        # Held-out (X, y) from the last train() call
+        self.test_data = None
+        
+        # Row counts from the last sampled fetch (see sampling.py)
+        self.sampling_report = None
+        
+        # Active metrics.MemoryProfiler while a profiled training run is in progress
+        self.memory_profiler = None
+        
+        # Precomputed per-location risk profiles (see risk_profiles.py)
+        self.risk_profiles = None
+        
     def _initialize_firebase(self, credentials_path):
         """Initialize Firebase Admin SDK"""
         try:
@@ -43,36 +112,59 @@ class TouristSafetyLSTM:
             print(f"Firebase initialization error: {e}")
             return None
     
-    def fetch_training_data(self):
+    def fetch_training_data(self, row_budget=None, dedup_deg=None):
         """
         Fetch data from Firebase Firestore for training
         Returns: DataFrame with combined tourist, alert, and location data
+        
+        row_budget / dedup_deg stream tourist rows through sampling.py while
+        fetching (stratified sample of at most row_budget rows, consecutive
+        pings closer than dedup_deg degrees merged); kept rows get a
+        sample_weight column and self.sampling_report summarizes the pass
         """
         print("Fetching data from Firebase...")
         
         # Fetch tourists
         tourists_ref = self.db.collection('tourists')
+        sampler = None
+        if row_budget or dedup_deg:
+            from sampling import TrainingSampler
+            sampler = TrainingSampler(row_budget=row_budget, dedup_deg=dedup_deg)
         tourists = []
-        for doc in tourists_ref.stream():
-            data = doc.to_dict()
-            data['doc_id'] = doc.id
-            tourists.append(data)
+        with metrics.stage('firestore'):
+            for doc in tourists_ref.stream():
+                data = doc.to_dict()
+                data['doc_id'] = doc.id
+                if sampler is not None:
+                    sampler.add(data)
+                else:
+                    tourists.append(data)
+        if sampler is not None:
+            tourists = sampler.rows()
+            self.sampling_report = sampler.report()
+            print(f"Sampled {len(tourists)} of {sampler.seen} tourist rows")
+        metrics.inc('ml_firestore_reads_total', sampler.seen if sampler is not None else len(tourists),
+                    collection='tourists')
         
         # Fetch alerts
         alerts_ref = self.db.collection('alerts')
         alerts = []
-        for doc in alerts_ref.stream():
-            data = doc.to_dict()
-            data['doc_id'] = doc.id
-            alerts.append(data)
+        with metrics.stage('firestore'):
+            for doc in alerts_ref.stream():
+                data = doc.to_dict()
+                data['doc_id'] = doc.id
+                alerts.append(data)
+        metrics.inc('ml_firestore_reads_total', len(alerts), collection='alerts')
         
         # Fetch zones
         zones_ref = self.db.collection('zones')
         zones = []
-        for doc in zones_ref.stream():
-            data = doc.to_dict()
-            data['doc_id'] = doc.id
-            zones.append(data)
+        with metrics.stage('firestore'):
+            for doc in zones_ref.stream():
+                data = doc.to_dict()
+                data['doc_id'] = doc.id
+                zones.append(data)
+        metrics.inc('ml_firestore_reads_total', len(zones), collection='zones')
         
         print(f"Fetched {len(tourists)} tourists, {len(alerts)} alerts, {len(zones)} zones")
         
@@ -140,6 +232,8 @@ class TouristSafetyLSTM:
             # Encode alert types if available
             if 'type' in alerts_df.columns:
                 try:
+                    from sklearn.preprocessing import LabelEncoder
+                    self.label_encoder = LabelEncoder()
                     alerts_df['type_encoded'] = self.label_encoder.fit_transform(alerts_df['type'])
                 except:
                     alerts_df['type_encoded'] = 0
@@ -161,7 +255,8 @@ class TouristSafetyLSTM:
         tourists_df['month'] = tourists_df['timestamp'].dt.month
         
         # Aggregate alerts by location and time
-        location_risk = self._calculate_location_risk(tourists_df, alerts_df)
+        with self._profile('location_risk'):
+            location_risk = self._calculate_location_risk(tourists_df, alerts_df)
         
         # Merge risk scores with tourist data
         tourists_df = tourists_df.merge(location_risk, on=['lat', 'lng'], how='left')
@@ -232,10 +327,11 @@ class TouristSafetyLSTM:
         
         return pd.DataFrame(location_groups).drop_duplicates()
     
-    def create_sequences(self, df, target_column='risk_score'):
+    def prepare_features(self, df, fit_scaler=True):
         """
-        Create time-series sequences for LSTM
-        Returns: X (sequences), y (targets)
+        Select, time-sort and normalize feature columns
+        Returns the scaled feature matrix (rows x features); with fit_scaler=False
+        the already-fitted scaler is reused, e.g. to evaluate a loaded model
         """
         # Select feature columns
         self.feature_columns = ['lat', 'lng', 'hour', 'day_of_week', 'day_of_month', 'month', 'risk_score']
@@ -246,12 +342,7 @@ class TouristSafetyLSTM:
                 df[col] = 0
         
         # Sort by time using timestamp field
-        if 'timestamp' in df.columns:
-            df = df.sort_values('timestamp')
-        elif 'checkInDate' in df.columns:
-            df = df.sort_values('checkInDate')
-        else:
-            print("Warning: No time column found for sorting, using original order")
+        df = self._sort_by_time(df, warn=True)
         
         # Extract features
         features = df[self.feature_columns].values
@@ -263,99 +354,498 @@ class TouristSafetyLSTM:
             self.sequence_length = max(1, len(features) // 2)
         
         # Normalize features
-        features_scaled = self.scaler.fit_transform(features)
+        if not fit_scaler:
+            return self.scaler.transform(features)
+        from sklearn.preprocessing import MinMaxScaler
+        self.scaler = MinMaxScaler()
+        return self.scaler.fit_transform(features)
+    
+    @staticmethod
+    def _sort_by_time(df, warn=False):
+        """Rows in the time order prepare_features trains on"""
+        if 'timestamp' in df.columns:
+            return df.sort_values('timestamp')
+        if 'checkInDate' in df.columns:
+            return df.sort_values('checkInDate')
+        if warn:
+            print("Warning: No time column found for sorting, using original order")
+        return df
+    
+    def sequence_weights(self, df, horizon=1, weight_column='sample_weight'):
+        """
+        Per-sequence training weights matching create_sequences(df, horizon=horizon)
+        Each sequence takes the weight of its first target row, normalized to a
+        mean of 1; None when df has no weight column (no sampling)
+        """
+        if weight_column not in df.columns:
+            return None
+        weights = self._sort_by_time(df)[weight_column].fillna(1.0).to_numpy(dtype=np.float64)
+        n_sequences = len(weights) - self.sequence_length - horizon + 1
+        weights = weights[self.sequence_length:self.sequence_length + n_sequences]
+        return weights / weights.mean() if len(weights) and weights.mean() > 0 else None
+    
+    def create_sequences(self, df, target_column='risk_score', fit_scaler=True, horizon=1):
+        """
+        Create time-series sequences for LSTM
+        Returns: X (sequences), y (targets)
+        
+        With horizon > 1, y holds the next `horizon` risk scores per sequence,
+        shape (n, horizon); otherwise the next risk score, shape (n,)
+        """
+        features_scaled = self.prepare_features(df, fit_scaler=fit_scaler)
         
         # Create sequences
         X, y = [], []
-        for i in range(len(features_scaled) - self.sequence_length):
+        for i in range(len(features_scaled) - self.sequence_length - horizon + 1):
             X.append(features_scaled[i:i + self.sequence_length])
-            y.append(features_scaled[i + self.sequence_length, -1])  # Predict risk_score
+            if horizon > 1:
+                y.append(features_scaled[i + self.sequence_length:i + self.sequence_length + horizon, -1])
+            else:
+                y.append(features_scaled[i + self.sequence_length, -1])  # Predict risk_score
         
         if len(X) == 0:
-            raise ValueError(f"Could not create any sequences. Need at least {self.sequence_length + 1} data points, got {len(features)}")
+            raise ValueError(f"Could not create any sequences. Need at least {self.sequence_length + horizon} data points, got {len(features_scaled)}")
         
         return np.array(X), np.array(y)
     
-    def build_model(self, input_shape):
+    def build_model(self, input_shape, lstm_units=(128, 64, 32), dropout=(0.3, 0.3, 0.2),
+                    dense_units=16, learning_rate=0.001, horizon=1):
         """
         Build Bidirectional LSTM model for risk prediction
+        
+        Args:
+            input_shape: (sequence_length, n_features)
+            lstm_units: units per recurrent layer; all but the last are bidirectional
+            dropout: dropout rate after each recurrent layer (one per entry in lstm_units)
+            dense_units: width of the hidden dense layer
+            learning_rate: Adam learning rate
+            horizon: risk scores emitted per sequence (e.g. DEFAULT_HORIZON hourly
+                steps for a 24-hour curve); 1 predicts the next step only
         """
-        model = Sequential([
-            Bidirectional(LSTM(128, return_sequences=True), input_shape=input_shape),
-            Dropout(0.3),
-            Bidirectional(LSTM(64, return_sequences=True)),
-            Dropout(0.3),
-            LSTM(32),
-            Dropout(0.2),
-            Dense(16, activation='relu'),
-            Dense(1, activation='sigmoid')  # Risk score between 0 and 1
+        layers = []
+        for i, units in enumerate(lstm_units):
+            last = i == len(lstm_units) - 1
+            if last:
+                layer = LSTM(units)
+            else:
+                layer = Bidirectional(LSTM(units, return_sequences=True))
+            if i == 0:
+                layers.append(keras.Input(shape=input_shape))
+            layers.append(layer)
+            layers.append(Dropout(dropout[i]))
+        
+        model = Sequential(layers + [
+            Dense(dense_units, activation='relu'),
+            Dense(horizon, activation='sigmoid')  # Risk score(s) between 0 and 1
         ])
         
         model.compile(
-            optimizer=keras.optimizers.Adam(learning_rate=0.001),
+            optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
             loss='mse',
             metrics=['mae', 'mse']
         )
         
         return model
     
-    def train(self, epochs=50, batch_size=32, validation_split=0.2):
+    def train(self, epochs=50, batch_size=32, validation_split=0.2, horizon=1, resume=False,
+              checkpoint_every=1, callbacks=None, on_stage=None, verbose=1, row_budget=None, dedup_deg=None,
+              profile_memory=False):
         """
         Train the LSTM model on Firebase data
+        horizon > 1 trains the multi-horizon head (see build_model)
+        row_budget / dedup_deg bound the tourist rows trained on (see
+        fetch_training_data); each sequence is weighted by its sampled row's
+        sample_weight in fit and evaluate, and the sampling summary goes to
+        models/sampling_report.json
+        profile_memory=True records RSS and tracemalloc allocators per stage in
+        MEMORY_PROFILE_PATH; call finish_memory_profile() after save_model()
+        
+        A full checkpoint is written every `checkpoint_every` epochs (see
+        checkpointing.py); resume=True continues the interrupted run from it
+        with its data, split and settings instead of fetching new data.
+        on_stage(status, message, progress) reports pipeline stages.
         """
-        print("Starting training process...")
+        from checkpointing import (TrainingLock, ResumableCheckpoint, checkpoint_state, save_dataset,
+                                   load_dataset, load_checkpoint_model, clear_checkpoint, CHECKPOINT_DIR)
+        import joblib
         
-        # Fetch and preprocess data
-        data_dict = self.fetch_training_data()
-        tourists_df, alerts_df = self.preprocess_data(data_dict)
+        def stage(status, message, progress):
+            print(message)
+            if on_stage is not None:
+                on_stage(status, message, progress)
         
-        # Create sequences
-        X, y = self.create_sequences(tourists_df)
+        state = checkpoint_state() if resume else None
+        if resume and state is None:
+            raise ValueError("No checkpoint to resume from. Start a new training run.")
         
-        print(f"Created {len(X)} sequences with shape {X.shape}")
+        lock = TrainingLock()
+        lock.acquire(resume=bool(resume))
+        if profile_memory:
+            self.memory_profiler = metrics.MemoryProfiler(MEMORY_PROFILE_PATH)
+            self.memory_profiler.start()
+        try:
+            if state is not None:
+                stage('resuming', f"Resuming from checkpoint after epoch {state['epoch']}/{state['config']['epochs']}...", 25)
+                config = state['config']
+                epochs, batch_size = config['epochs'], config['batch_size']
+                validation_split = config['validation_split']
+                self.sequence_length = config['sequence_length']
+                self.feature_columns = config['feature_columns']
+                with self._profile('load_checkpoint'):
+                    self.scaler = joblib.load(os.path.join(CHECKPOINT_DIR, 'scaler.pkl'))
+                    data = load_dataset()
+                    X_train, X_test, y_train, y_test = data['X_train'], data['X_test'], data['y_train'], data['y_test']
+                    w_train, w_test = data.get('w_train'), data.get('w_test')
+                    self.model = load_checkpoint_model(state=state)
+                initial_epoch = state['epoch']
+            else:
+                print("Starting training process...")
+                clear_checkpoint()
+                
+                # Fetch and preprocess data
+                stage('fetching_data', 'Fetching data from Firebase...', 5)
+                with self._profile('fetch'):
+                    data_dict = self.fetch_training_data(row_budget=row_budget, dedup_deg=dedup_deg)
+                stage('preprocessing', 'Preprocessing data...', 15)
+                with self._profile('preprocess'):
+                    tourists_df, alerts_df = self.preprocess_data(data_dict)
+                
+                # Create sequences
+                stage('creating_sequences', 'Creating sequences...', 25)
+                with self._profile('sequences'):
+                    X, y = self.create_sequences(tourists_df, horizon=horizon)
+                    # Sampled rows stand for sample_weight raw rows each
+                    weights = self.sequence_weights(tourists_df, horizon=horizon)
+                
+                print(f"Created {len(X)} sequences with shape {X.shape}")
+                if row_budget or dedup_deg:
+                    if weights is not None:
+                        self.sampling_report['sequence_weights'] = {
+                            'min': float(weights.min()), 'max': float(weights.max()), 'sequences': int(len(weights))
+                        }
+                    os.makedirs('models', exist_ok=True)
+                    with open('models/sampling_report.json', 'w') as f:
+                        json.dump(self.sampling_report, f, indent=2)
+                
+                # Split data
+                from sklearn.model_selection import train_test_split
+                with self._profile('split'):
+                    if weights is not None:
+                        X_train, X_test, y_train, y_test, w_train, w_test = train_test_split(
+                            X, y, weights, test_size=0.2, random_state=42
+                        )
+                    else:
+                        X_train, X_test, y_train, y_test = train_test_split(
+                            X, y, test_size=0.2, random_state=42
+                        )
+                        w_train = w_test = None
+                
+                # Snapshot the prepared data so a resumed run uses the same split
+                with self._profile('checkpoint_data'):
+                    arrays = {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test}
+                    if weights is not None:
+                        arrays.update(w_train=w_train, w_test=w_test)
+                    save_dataset(**arrays)
+                    joblib.dump(self.scaler, os.path.join(CHECKPOINT_DIR, 'scaler.pkl'))
+                config = {
+                    'epochs': epochs,
+                    'batch_size': batch_size,
+                    'validation_split': validation_split,
+                    'horizon': horizon,
+                    'sequence_length': self.sequence_length,
+                    'feature_columns': self.feature_columns,
+                    'row_budget': row_budget,
+                    'dedup_deg': dedup_deg
+                }
+                
+                # Build model
+                stage('building_model', 'Building model architecture...', 30)
+                self.model = self.build_model(input_shape=(X.shape[1], X.shape[2]), horizon=horizon)
+                initial_epoch = 0
+                
+                print("Model architecture:")
+                self.model.summary()
+            
+            # Callbacks
+            os.makedirs('models', exist_ok=True)
+            early_stopping = EarlyStopping(
+                monitor='val_loss',
+                patience=10,
+                restore_best_weights=True
+            )
+            
+            checkpoint = ModelCheckpoint(
+                'models/best_model.h5',
+                monitor='val_loss',
+                save_best_only=True
+            )
+            
+            resumable = ResumableCheckpoint(
+                every=checkpoint_every,
+                early_stopping=early_stopping,
+                model_checkpoint=checkpoint,
+                config=config,
+                resume_state=state
+            )
+            
+            # Train model
+            stage('training', 'Training model...', 30)
+            with self._profile('fit'):
+                history = self.model.fit(
+                    X_train, y_train,
+                    sample_weight=w_train,
+                    epochs=epochs,
+                    initial_epoch=initial_epoch,
+                    batch_size=batch_size,
+                    validation_split=validation_split,
+                    callbacks=[early_stopping, checkpoint, resumable] + list(callbacks or []),
+                    verbose=verbose
+                )
+            # Include the epochs run before the interruption
+            history.history = resumable.history
+            
+            # Evaluate on test set
+            with self._profile('evaluate'):
+                test_loss, test_mae, test_mse = self.model.evaluate(X_test, y_test, sample_weight=w_test,
+                                                                    verbose=verbose)
+            print(f"\nTest Results:")
+            print(f"Loss: {test_loss:.4f}")
+            print(f"MAE: {test_mae:.4f}")
+            print(f"MSE: {test_mse:.4f}")
+            
+            # Held-out split, reused by post-training optimization
+            self.test_data = (X_test, y_test)
+            self.fused = False
+            
+            # Run finished; nothing left to resume
+            clear_checkpoint()
+        except BaseException:
+            # Keep the report of a failed run, ending at the stage that failed
+            self.finish_memory_profile()
+            raise
+        finally:
+            lock.release()
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        return history
+    
+    def _profile(self, stage):
+        """Memory profiling stage while a profiled train() is running, else a no-op"""
+        return self.memory_profiler.stage(stage) if self.memory_profiler is not None else nullcontext()
+    
+    def finish_memory_profile(self):
+        """Write the memory report of the last profiled run and stop tracing; returns its path"""
+        if self.memory_profiler is None:
+            return None
+        path = self.memory_profiler.write()
+        self.memory_profiler.stop()
+        self.memory_profiler = None
+        return path
+    
+    def train_incremental(self, recent_hours=24, replay_ratio=1.0, epochs=10, batch_size=32,
+                          learning_rate=1e-4, tolerance=0.0, callbacks=None,
+                          report_path='models/incremental_report.json'):
+        """
+        Fine-tune the saved model on recent data instead of training from scratch
         
-        # Build model
-        self.model = self.build_model(input_shape=(X.shape[1], X.shape[2]))
+        Sequences whose target lies within the last `recent_hours` are mixed with
+        a replay sample of older sequences (`replay_ratio` per recent one) so
+        the model does not forget older patterns. Both the current and the
+        fine-tuned model are scored on the same validation set (recent and
+        older sequences); the result is saved only if its MAE is no more than
+        `tolerance` above the current model's.
         
-        print("Model architecture:")
-        self.model.summary()
+        The scaler is kept as fitted by the last full train(), so data far
+        outside its range still calls for a full retrain.
         
-        # Callbacks
-        early_stopping = EarlyStopping(
-            monitor='val_loss',
-            patience=10,
-            restore_best_weights=True
-        )
+        A copy of the saved model is fine-tuned; this predictor keeps serving
+        its current model (fused, TFLite or student) throughout, and loads the
+        saved Keras model only once the fine-tuned one is promoted.
         
-        checkpoint = ModelCheckpoint(
-            'models/best_model.h5',
-            monitor='val_loss',
-            save_best_only=True
-        )
+        Returns:
+            dict: report with both validation MAEs and whether the model was promoted
+        """
+        from checkpointing import TrainingLock
         
-        # Train model
-        history = self.model.fit(
-            X_train, y_train,
-            epochs=epochs,
-            batch_size=batch_size,
-            validation_split=validation_split,
-            callbacks=[early_stopping, checkpoint],
-            verbose=1
+        lock = TrainingLock()
+        lock.acquire(incremental=True)
+        try:
+            from sklearn.model_selection import train_test_split
+            
+            # Saved model and scaler, separate from whatever this predictor serves
+            base = TouristSafetyLSTM(db=self.db)
+            base.load_model()
+            horizon = int(base.model.output_shape[-1] or 1)
+            
+            data_dict = base.fetch_training_data()
+            tourists_df, alerts_df = base.preprocess_data(data_dict)
+            X, y = base.create_sequences(tourists_df, fit_scaler=False, horizon=horizon)
+            
+            # Target timestamps in the order used by prepare_features
+            timestamps = pd.to_datetime(tourists_df.sort_values('timestamp')['timestamp'])
+            now = pd.Timestamp.now()
+            if timestamps.dt.tz is not None:
+                # Firestore timestamps are UTC
+                timestamps = timestamps.dt.tz_convert(None)
+                now = pd.Timestamp.utcnow().tz_localize(None)
+            target_times = timestamps.values[base.sequence_length:base.sequence_length + len(X)]
+            cutoff = (now - pd.Timedelta(hours=recent_hours)).to_datetime64()
+            recent = np.flatnonzero(target_times >= cutoff)
+            older = np.flatnonzero(target_times < cutoff)
+            
+            report = {
+                'recent_hours': recent_hours,
+                'recent_sequences': int(len(recent)),
+                'older_sequences': int(len(older)),
+                'promoted': False,
+                'timestamp': datetime.now().isoformat()
+            }
+            if len(recent) < 2:
+                report['reason'] = 'not enough recent data'
+                print(f"Only {len(recent)} sequences in the last {recent_hours}h; keeping the current model")
+                return report
+            
+            rng = np.random.default_rng(42)
+            recent_train, recent_val = train_test_split(recent, test_size=0.2, random_state=42)
+            n_replay = min(len(older), int(np.ceil(len(recent_train) * replay_ratio)))
+            replay = rng.choice(older, size=n_replay, replace=False) if n_replay else np.array([], dtype=int)
+            # Older validation sequences catch forgetting; never replayed
+            older_val = rng.choice(np.setdiff1d(older, replay), size=min(len(recent_val), len(older) - n_replay), replace=False)
+            
+            train_idx = np.concatenate([recent_train, replay])
+            val_idx = np.concatenate([recent_val, older_val]).astype(int)
+            X_val, y_val = X[val_idx], y[val_idx]
+            print(f"Fine-tuning on {len(recent_train)} recent + {len(replay)} replayed sequences, "
+                  f"validating on {len(val_idx)}")
+            
+            baseline_mae = float(np.mean(np.abs(base.model.predict(X_val, verbose=0).reshape(y_val.shape) - y_val)))
+            
+            # Fine-tune a clone; the saved model stays as it is unless promoted
+            tuned = keras.models.clone_model(base.model)
+            tuned.set_weights(base.model.get_weights())
+            tuned.compile(
+                optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+                loss='mse',
+                metrics=['mae', 'mse']
+            )
+            history = tuned.fit(
+                X[train_idx], y[train_idx],
+                epochs=epochs,
+                batch_size=batch_size,
+                validation_data=(X_val, y_val),
+                callbacks=[EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)] + list(callbacks or []),
+                verbose=1
+            )
+            tuned_mae = float(np.mean(np.abs(tuned.predict(X_val, verbose=0).reshape(y_val.shape) - y_val)))
+            
+            promoted = tuned_mae <= baseline_mae + tolerance
+            report.update({
+                'replayed_sequences': int(len(replay)),
+                'validation_sequences': int(len(val_idx)),
+                'epochs_completed': len(history.history['loss']),
+                'baseline_val_mae': baseline_mae,
+                'tuned_val_mae': tuned_mae,
+                'promoted': promoted
+            })
+            
+            if promoted:
+                print(f"Validation MAE {baseline_mae:.4f} -> {tuned_mae:.4f}; promoting fine-tuned model")
+                base.model = tuned
+                base.save_model()
+                self.load_model()
+            else:
+                print(f"Validation MAE regressed ({baseline_mae:.4f} -> {tuned_mae:.4f}); keeping the current model")
+            
+            self.test_data = (X_val, y_val)
+            os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            return report
+        finally:
+            lock.release()
+    
+    def _feature_rows(self, records):
+        """Build a (n, features) array from dicts keyed by feature column"""
+        return np.array(
+            [[record.get(col, 0) for col in self.feature_columns] for record in records],
+            dtype=np.float64
         )
+    
+    def _rows_to_sequences(self, rows):
+        """Scale feature rows and repeat each one across the sequence window"""
+        rows_scaled = rows * self.scaler.scale_ + self.scaler.min_
+        return np.repeat(rows_scaled[:, np.newaxis, :], self.sequence_length, axis=1)
+    
+    def _model_inputs(self, rows):
+        """Model input for raw feature rows: the rows themselves for a fused model"""
+        if self.fused:
+            return rows.astype(np.float32)
+        with metrics.stage('scaler'):
+            return self._rows_to_sequences(rows)
+    
+    def predict_rows(self, rows, batch_size=256, use_student=True):
+        """
+        Vectorized risk prediction for many raw feature rows
         
-        # Evaluate on test set
-        test_loss, test_mae, test_mse = self.model.evaluate(X_test, y_test)
-        print(f"\nTest Results:")
-        print(f"Loss: {test_loss:.4f}")
-        print(f"MAE: {test_mae:.4f}")
-        print(f"MSE: {test_mse:.4f}")
+        Args:
+            rows: array (n, features) in feature_columns order
+            batch_size: model batch size
+            use_student: serve from the distilled student when one is loaded,
+                falling back to the LSTM for low-confidence rows
         
-        return history
+        Returns:
+            np.ndarray: risk scores (n,); the first step for multi-horizon models
+        """
+        if self.model is None:
+            raise ValueError("Model not trained. Call train() first.")
+        
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.feature_columns))
+        scores = np.empty(len(rows), dtype=np.float64)
+        pending = np.ones(len(rows), dtype=bool)
+        
+        if use_student and self.student is not None and len(rows):
+            with metrics.stage('student'):
+                student_scores = self.student.predict(rows)
+            metrics.inc('ml_model_calls_total', model='student')
+            metrics.inc('ml_model_rows_total', len(rows), model='student')
+            confident = self.student.is_confident(student_scores, self.student_margin)
+            scores[confident] = student_scores[confident]
+            pending = ~confident
+            self.student_stats['served'] += int(confident.sum())
+            self.student_stats['fallback'] += int(pending.sum())
+        
+        if pending.any():
+            inputs = self._model_inputs(rows[pending])
+            with metrics.stage('model'):
+                scores[pending] = self.model.predict(inputs, batch_size=batch_size, verbose=0)[:, 0]
+            metrics.inc('ml_model_calls_total', model='lstm')
+            metrics.inc('ml_model_rows_total', len(inputs), model='lstm')
+        
+        return scores
+    
+    @property
+    def horizon(self):
+        """Risk scores the loaded model emits per sequence"""
+        if self.model is None:
+            return 1
+        return int(self.model.output_shape[-1] or 1)
+    
+    def predict_curves(self, rows, batch_size=256):
+        """
+        Multi-horizon risk curves for raw feature rows
+        
+        Returns:
+            np.ndarray: (n, horizon) risk scores, column k being k hours ahead
+        """
+        if self.model is None:
+            raise ValueError("Model not trained. Call train() first.")
+        
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.feature_columns))
+        inputs = self._model_inputs(rows)
+        with metrics.stage('model'):
+            curves = self.model.predict(inputs, batch_size=batch_size, verbose=0)
+        metrics.inc('ml_model_calls_total', model='lstm')
+        metrics.inc('ml_model_rows_total', len(inputs), model='lstm')
+        return np.asarray(curves, dtype=np.float64).reshape(len(rows), -1)
     
     def predict_risk(self, tourist_data):
         """
@@ -367,23 +857,40 @@ class TouristSafetyLSTM:
         Returns:
             float: Predicted risk score (0-1)
         """
+        return float(self.predict_many([tourist_data])[0])
+    
+    def predict_many(self, records):
+        """
+        Risk scores for many tourist/location dicts
+        Precomputed profile hits are looked up; the rest go to the model in one batch.
+        
+        Returns:
+            np.ndarray: risk scores (n,)
+        """
         if self.model is None:
             raise ValueError("Model not trained. Call train() first.")
         
-        # Prepare input sequence
-        features = []
-        for col in self.feature_columns:
-            features.append(tourist_data.get(col, 0))
-        
-        # Create sequence (repeat for sequence_length)
-        sequence = np.array([features] * self.sequence_length)
-        sequence_scaled = self.scaler.transform(sequence)
-        sequence_scaled = sequence_scaled.reshape(1, self.sequence_length, len(self.feature_columns))
-        
-        # Predict
-        prediction = self.model.predict(sequence_scaled, verbose=0)
+        scores = np.full(len(records), np.nan)
+        if self.risk_profiles is not None:
+            for i, record in enumerate(records):
+                # Precomputed profiles assume no prior risk input
+                if record.get('risk_score'):
+                    continue
+                risk = self.risk_profiles.lookup(
+                    record.get('lat'), record.get('lng'),
+                    record.get('hour'), record.get('day_of_week'),
+                    record.get('day_of_month'), record.get('month')
+                )
+                metrics.inc('ml_profile_lookups_total', result='hit' if risk is not None else 'miss')
+                if risk is not None:
+                    scores[i] = risk
         
-        return float(prediction[0][0])
+        missing = np.flatnonzero(np.isnan(scores))
+        if len(missing):
+            with metrics.stage('features'):
+                rows = self._feature_rows([records[i] for i in missing])
+            scores[missing] = self.predict_rows(rows)
+        return scores
     
     def predict_hotspots(self, locations, time_window=24):
         """
@@ -396,29 +903,63 @@ class TouristSafetyLSTM:
         Returns:
             list of dicts with location and predicted risk
         """
-        predictions = []
+        predictions = self._hotspot_chunk(locations, datetime.now(), time_window)
+        
+        # Sort by average risk
+        predictions.sort(key=lambda x: x['avg_risk'], reverse=True)
+        
+        return predictions
+    
+    def iter_hotspots(self, locations, time_window=24, chunk_size=100):
+        """
+        Hotspot predictions in chunks of `chunk_size` locations, in request order
+        Each chunk is yielded as soon as its inference batch finishes, so callers
+        can stream results without holding the whole list.
+        """
         current_time = datetime.now()
+        for start in range(0, len(locations), chunk_size):
+            yield self._hotspot_chunk(locations[start:start + chunk_size], current_time, time_window)
+    
+    def _hotspot_chunk(self, locations, current_time, time_window):
+        """
+        Unsorted hotspot predictions for one group of locations
+        Model-predicted `risk_trend`s are NumPy arrays; the API encoder serializes them directly.
+        """
+        predictions = []
         
-        for loc in locations:
-            risk_scores = []
-            
-            # Predict for each hour in time window
-            for hour_offset in range(time_window):
-                future_time = current_time + timedelta(hours=hour_offset)
-                
-                tourist_data = {
-                    'lat': loc['lat'],
-                    'lng': loc['lng'],
-                    'hour': future_time.hour,
-                    'day_of_week': future_time.weekday(),
-                    'day_of_month': future_time.day,
-                    'month': future_time.month,
-                    'risk_score': 0  # Will be predicted
-                }
-                
-                risk = self.predict_risk(tourist_data)
-                risk_scores.append(risk)
-            
+        trends = [None] * len(locations)
+        # Profiles hold first-step scores per hour; a multi-horizon model serves every location its curve instead
+        multi_horizon = self.horizon >= time_window > 1
+        if self.risk_profiles is not None and not multi_horizon:
+            for i, loc in enumerate(locations):
+                with metrics.stage('profile_lookup'):
+                    trends[i] = self.risk_profiles.lookup_trend(loc['lat'], loc['lng'], current_time, time_window)
+                metrics.inc('ml_profile_lookups_total', result='hit' if trends[i] is not None else 'miss')
+        
+        missing = [i for i, trend in enumerate(trends) if trend is None]
+        if missing and multi_horizon:
+            # Multi-horizon head: the whole curve from one inference per location
+            with metrics.stage('features'):
+                rows = self._feature_rows([
+                    {
+                        'lat': locations[i]['lat'],
+                        'lng': locations[i]['lng'],
+                        'hour': current_time.hour,
+                        'day_of_week': current_time.weekday(),
+                        'day_of_month': current_time.day,
+                        'month': current_time.month,
+                        'risk_score': 0
+                    }
+                    for i in missing
+                ])
+            curves = self.predict_curves(rows)
+            for i, curve in zip(missing, curves):
+                trends[i] = curve[:time_window]
+        elif missing:
+            for i, trend in zip(missing, self._predict_trends([locations[i] for i in missing], current_time, time_window)):
+                trends[i] = trend
+        
+        for loc, risk_scores in zip(locations, trends):
             predictions.append({
                 'location': loc,
                 'avg_risk': np.mean(risk_scores),
@@ -426,25 +967,143 @@ class TouristSafetyLSTM:
                 'risk_trend': risk_scores
             })
         
-        # Sort by average risk
-        predictions.sort(key=lambda x: x['avg_risk'], reverse=True)
-        
         return predictions
     
+    def _predict_trends(self, locations, current_time, time_window):
+        """Hourly risk scores for several locations, every (location, hour) row in one batch"""
+        hours = [current_time + timedelta(hours=hour_offset) for hour_offset in range(time_window)]
+        records = [
+            {
+                'lat': loc['lat'],
+                'lng': loc['lng'],
+                'hour': future_time.hour,
+                'day_of_week': future_time.weekday(),
+                'day_of_month': future_time.day,
+                'month': future_time.month,
+                'risk_score': 0  # Will be predicted
+            }
+            for loc in locations
+            for future_time in hours
+        ]
+        return list(self.predict_many(records).reshape(len(locations), time_window))
+    
     def save_model(self, model_path='models/lstm_model.h5', scaler_path='models/scaler.pkl'):
-        """Save trained model and scaler"""
+        """Save trained model and scaler, plus the fused serving model"""
+        import joblib
         os.makedirs('models', exist_ok=True)
-        self.model.save(model_path)
-        joblib.dump(self.scaler, scaler_path)
-        joblib.dump(self.feature_columns, 'models/feature_columns.pkl')
-        print(f"Model saved to {model_path}")
+        with self._profile('save'):
+            self.model.save(model_path)
+            joblib.dump(self.scaler, scaler_path)
+            joblib.dump(self.feature_columns, 'models/feature_columns.pkl')
+            print(f"Model saved to {model_path}")
+            self.export_fused_model()
     
     def load_model(self, model_path='models/lstm_model.h5', scaler_path='models/scaler.pkl'):
         """Load trained model and scaler"""
+        import joblib
         self.model = load_model(model_path)
         self.scaler = joblib.load(scaler_path)
         self.feature_columns = joblib.load('models/feature_columns.pkl')
+        self.fused = False
+        # Sequence length may have been reduced for small datasets at train time
+        self.sequence_length = self.model.input_shape[1] or self.sequence_length
         print(f"Model loaded from {model_path}")
+    
+    def build_fused_model(self):
+        """
+        Wrap the trained model so it takes raw feature rows (n, features)
+        The fitted min/max scaling becomes a Rescaling layer and the row is
+        repeated across the sequence window by a RepeatVector layer
+        """
+        n_features = len(self.feature_columns)
+        return Sequential([
+            keras.Input(shape=(n_features,), name='raw_features'),
+            Rescaling(scale=self.scaler.scale_.tolist(), offset=self.scaler.min_.tolist(), name='minmax_scaler'),
+            RepeatVector(self.sequence_length, name='sequence_window'),
+        ] + self.model.layers)
+    
+    def export_fused_model(self, path=FUSED_MODEL_PATH, meta_path=MODEL_META_PATH):
+        """
+        Save the fused model and the metadata needed to serve it without joblib
+        Both are written under temporary names and renamed into place, so a
+        server loading them meanwhile never reads a half-written file
+        """
+        fused = self.build_fused_model()
+        tmp_path = path + '.tmp.h5'
+        fused.save(tmp_path)
+        os.replace(tmp_path, path)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({
+                'feature_columns': self.feature_columns,
+                'sequence_length': self.sequence_length,
+                'horizon': int(self.model.output_shape[-1] or 1),
+                'created': datetime.now().isoformat()
+            }, f, indent=2)
+        os.replace(meta_path + '.tmp', meta_path)
+        print(f"Fused model saved to {path}")
+    
+    def load_fused_model(self, path=FUSED_MODEL_PATH, meta_path=MODEL_META_PATH):
+        """Load the fused serving model (no scaler or sklearn needed)"""
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.model = load_model(path, compile=False)
+        self.feature_columns = meta['feature_columns']
+        self.sequence_length = meta['sequence_length']
+        self.scaler = None
+        self.fused = True
+        print(f"Fused model loaded from {path}")
+    
+    @staticmethod
+    def fused_model_available(path=FUSED_MODEL_PATH, meta_path=MODEL_META_PATH,
+                              model_path='models/lstm_model.h5'):
+        """True if the fused model exists and is not older than lstm_model.h5"""
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return False
+        return not os.path.exists(model_path) or os.path.getmtime(path) >= os.path.getmtime(model_path)
+    
+    @staticmethod
+    def tflite_model_available(tflite_path='models/lstm_model_int8.tflite', model_path='models/lstm_model.h5'):
+        """True if the quantized model exists and is not older than lstm_model.h5"""
+        if not os.path.exists(tflite_path):
+            return False
+        return not os.path.exists(model_path) or os.path.getmtime(tflite_path) >= os.path.getmtime(model_path)
+    
+    def load_student(self, student_dir='models/student', margin=0.05, model_path='models/lstm_model.h5'):
+        """
+        Serve predictions from a distilled student model; returns True if loaded
+        Rows whose student score lies within `margin` of a risk level boundary
+        are re-scored by the LSTM. A student distilled from an older
+        lstm_model.h5 carries that model's scaler and outputs, so it is refused.
+        """
+        from distill_model import DistilledRiskModel
+        student = DistilledRiskModel.load(student_dir)
+        model_mtime = os.path.getmtime(model_path) if os.path.exists(model_path) else None
+        if model_mtime and (student.teacher_mtime is None or model_mtime > student.teacher_mtime):
+            print("⚠️ Student model was distilled from an older model; ignoring it")
+            self.student = None
+            return False
+        self.student = student
+        self.student_margin = margin
+        print(f"Student model ({self.student.kind}) loaded from {student_dir}")
+        return True
+    
+    def load_risk_profiles(self, path='models/risk_profiles.npy', index_path='models/risk_profiles.json'):
+        """Serve known locations from precomputed profiles; returns True if loaded"""
+        from risk_profiles import RiskProfileTable
+        self.risk_profiles = RiskProfileTable.load(path, index_path)
+        if self.risk_profiles is not None:
+            print(f"Risk profiles loaded for {len(self.risk_profiles.locations)} locations")
+        return self.risk_profiles is not None
+    
+    def load_tflite(self, tflite_path='models/lstm_model_int8.tflite'):
+        """
+        Serve from a quantized TFLite artifact (see quantize_model.py)
+        Call load_model() first so the scaler and feature columns are available
+        """
+        from quantize_model import TFLiteRiskModel
+        self.model = TFLiteRiskModel(tflite_path)
+        self.fused = False
+        print(f"Quantized model loaded from {tflite_path}")
 
 
 # Example usage
@@ -0,0 +1,402 @@
+"""
+Lightweight request instrumentation for the ML API
+Counters and latency histograms rendered in Prometheus text format, plus an
+opt-in sampling profiler that dumps folded stacks (flame-graph input) for slow
+requests and a per-stage memory profiler for training. Standard library only,
+so it can be imported anywhere.
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+# Seconds; covers profile lookups (~µs) up to full batch scoring
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_help = {}
+# Route of the request being handled, set by the API for stage labels
+_endpoint = contextvars.ContextVar('ml_endpoint', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def describe(name, metric_type, help_text):
+    """Register HELP/TYPE lines for a metric family"""
+    _help[name] = (metric_type, help_text)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter"""
+    with _lock:
+        _counters[(name, _label_key(labels))] += value
+
+
+def observe(name, value, **labels):
+    """Record a histogram observation"""
+    key = (name, _label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(value)
+
+
+@contextmanager
+def timed(name, **labels):
+    """Observe the duration of the block in seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def set_endpoint(endpoint):
+    """Label stages timed in this context with `endpoint`; returns a token for reset_endpoint"""
+    return _endpoint.set(endpoint)
+
+
+def reset_endpoint(token):
+    _endpoint.reset(token)
+
+
+def stage(name):
+    """Time one stage of request handling (firestore, features, scaler, model...)"""
+    return timed('ml_stage_duration_seconds', endpoint=_endpoint.get() or 'none', stage=name)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_key, extra=None):
+    items = list(label_key) + list(extra or [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in items) + '}'
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {
+            key: (hist.buckets, list(hist.counts), hist.sum, hist.count)
+            for key, hist in _histograms.items()
+        }
+
+    lines = []
+    emitted = set()
+
+    def header(name, default_type):
+        if name in emitted:
+            return
+        emitted.add(name)
+        metric_type, help_text = _help.get(name, (default_type, name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {value:g}')
+
+    for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {count}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {total:.6f}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Clear all recorded values (HELP descriptions are kept)"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+class SamplingProfiler:
+    """
+    Opt-in stack sampler for slow requests
+    While enabled, one background thread samples the stacks of threads that are
+    serving a request; requests slower than `slow_ms` are written as folded
+    stacks (one `frame;frame;frame count` line per stack) to `output_dir`, ready
+    for flamegraph.pl or speedscope. When disabled, begin/end are no-ops.
+    """
+
+    def __init__(self, output_dir='profiles', interval=0.005, slow_ms=500):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.slow_ms = slow_ms
+        self.enabled = False
+        self._active = {}  # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self.dumps = 0
+
+    def configure(self, enabled, slow_ms=None, interval=None):
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        if interval is not None:
+            self.interval = interval
+        self.enabled = bool(enabled)
+        if self.enabled and (self._thread is None or not self._thread.is_alive()):
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def begin(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self, label, duration_ms):
+        """Stop sampling the current thread; dump if the request was slow"""
+        if not self._active:
+            return None
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or duration_ms < self.slow_ms:
+            return None
+        return self._dump(label, duration_ms, samples)
+
+    def _run(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._fold(frame)] += 1
+
+    @staticmethod
+    def _fold(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _dump(self, label, duration_ms, samples):
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_') or 'request'
+        path = os.path.join(
+            self.output_dir,
+            f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}_{safe_label}_{int(duration_ms)}ms.folded"
+        )
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f'{stack} {count}\n')
+        self.dumps += 1
+        return path
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    """High-water mark of the process RSS so far"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _short_path(filename):
+    """Parent directory and file name, enough to tell library modules apart"""
+    return os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+
+
+def _mb(value):
+    return round(value / 1024 / 1024, 2) if value is not None else None
+
+
+class MemoryProfiler:
+    """
+    Opt-in per-stage memory profile (training pipeline)
+    For every stage: RSS at start and end, the peak RSS sampled every
+    `interval` seconds, the tracemalloc peak of Python and NumPy allocations,
+    and the `top` allocation sites that grew the most. Memory held by
+    TensorFlow's allocator only shows up in RSS. The report is rewritten at
+    every stage boundary, so after an OOM kill it still names the stage that
+    was running. Stages may nest (an inner stage counts towards the outer one).
+    """
+
+    def __init__(self, output_path, interval=0.01, top=10):
+        self.output_path = output_path
+        self.interval = interval
+        self.top = top
+        self.stages = []
+        self._stack = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.started = datetime.now().isoformat()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._running = True
+        self._thread = threading.Thread(target=self._sample_rss, name='memory-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _sample_rss(self):
+        last_write = time.perf_counter()
+        while self._running:
+            rss = current_rss_bytes()
+            if rss is not None:
+                with self._lock:
+                    for entry in self._stack:
+                        entry['_rss_peak'] = max(entry['_rss_peak'], rss)
+                    active = bool(self._stack)
+                # Refresh the running stage's peak on disk about once a second
+                if active and time.perf_counter() - last_write > 1:
+                    self.write()
+                    last_write = time.perf_counter()
+            time.sleep(self.interval)
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    @contextmanager
+    def stage(self, name):
+        # The enclosing stage keeps the peak reached so far; the counter restarts for this one
+        _, traced_peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            if self._stack:
+                self._stack[-1]['_traced_peak'] = max(self._stack[-1]['_traced_peak'], traced_peak)
+        tracemalloc.reset_peak()
+        rss = current_rss_bytes()
+        traced, _ = tracemalloc.get_traced_memory()
+        entry = {'stage': name, 'status': 'running', '_rss_peak': rss or 0, '_traced_peak': traced,
+                 '_rss_start': rss, '_traced_start': traced, '_before': self._snapshot(),
+                 '_start': time.perf_counter()}
+        with self._lock:
+            self._stack.append(entry)
+            self.stages.append(entry)
+        self.write()
+        status = 'done'
+        try:
+            yield
+        except BaseException:
+            status = 'failed'
+            raise
+        finally:
+            self._finish(entry, status)
+
+    def _finish(self, entry, status):
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        rss = current_rss_bytes()
+        growth = self._snapshot().compare_to(entry.pop('_before'), 'lineno')
+        with self._lock:
+            self._stack.remove(entry)
+            entry['_traced_peak'] = max(entry['_traced_peak'], traced_peak)
+            entry['_rss_peak'] = max(entry['_rss_peak'], rss or 0)
+            if self._stack:
+                outer = self._stack[-1]
+                outer['_traced_peak'] = max(outer['_traced_peak'], entry['_traced_peak'])
+            entry.update(
+                status=status,
+                seconds=round(time.perf_counter() - entry['_start'], 3),
+                rss_start_mb=_mb(entry['_rss_start']),
+                rss_end_mb=_mb(rss),
+                rss_peak_mb=_mb(entry['_rss_peak']) if rss is not None else None,
+                traced_peak_mb=_mb(entry['_traced_peak'] - entry['_traced_start']),
+                traced_retained_mb=_mb(traced - entry['_traced_start']),
+                top_allocations=[
+                    {
+                        'site': f'{_short_path(stat.traceback[0].filename)}:{stat.traceback[0].lineno}',
+                        'size_diff_mb': _mb(stat.size_diff),
+                        'count_diff': stat.count_diff
+                    }
+                    for stat in sorted(growth, key=lambda stat: stat.size_diff, reverse=True)[:self.top]
+                    if stat.size_diff >= 1024
+                ]
+            )
+        self.write()
+
+    def report(self):
+        with self._lock:
+            stages = [
+                {k: v for k, v in entry.items() if not k.startswith('_')}
+                if entry['status'] != 'running' else
+                {'stage': entry['stage'], 'status': 'running', 'rss_peak_mb': _mb(entry['_rss_peak'])}
+                for entry in self.stages
+            ]
+        return {
+            'started': self.started,
+            'updated': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'peak_rss_mb': _mb(peak_rss_bytes()),
+            'stages': stages
+        }
+
+    def write(self):
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        with self._write_lock:
+            with open(self.output_path + '.tmp', 'w') as f:
+                json.dump(self.report(), f, indent=2)
+            os.replace(self.output_path + '.tmp', self.output_path)
+        return self.output_path
+
+
+describe('ml_requests_total', 'counter', 'HTTP requests by endpoint, method and status')
+describe('ml_request_duration_seconds', 'histogram', 'HTTP request latency by endpoint')
+describe('ml_stage_duration_seconds', 'histogram',
+         'Latency of request stages (firestore, features, scaler, model, ...) by endpoint')
+describe('ml_firestore_reads_total', 'counter', 'Firestore documents read by collection')
+describe('ml_model_calls_total', 'counter', 'Model invocations by model')
+describe('ml_model_rows_total', 'counter', 'Rows scored by model')
+describe('ml_profile_lookups_total', 'counter', 'Precomputed risk profile lookups by result')
@@ -0,0 +1,243 @@
+"""
+Post-training optimization of the LSTM risk model
+Applies optional magnitude pruning and int8 dynamic-range quantization, checks
+the optimized model's MAE against the float baseline and reports artifact size
+and CPU throughput for both.
+
+Usage:
+    python quantize_model.py [--prune 0.5] [--tolerance 0.01]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import tensorflow as tf
+
+TFLITE_PATH = 'models/lstm_model_int8.tflite'
+REPORT_PATH = 'models/quantization_report.json'
+# Batch size the TFLite graph is compiled for (see convert_to_tflite)
+TFLITE_BATCH_SIZE = 32
+
+
+class TFLiteRiskModel:
+    """
+    TFLite interpreter with the subset of the Keras model API used for serving
+    (predict), so it can stand in for TouristSafetyLSTM.model
+
+    The fused LSTM kernels are compiled for a fixed batch size, so inputs are
+    processed in chunks of that size with the last chunk zero-padded.
+    """
+
+    def __init__(self, tflite_path=TFLITE_PATH, model_content=None, num_threads=None):
+        self.path = tflite_path
+        if model_content is not None:
+            self.interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=num_threads)
+        else:
+            self.interpreter = tf.lite.Interpreter(model_path=tflite_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in self._input['shape'][1:])
+        self.output_shape = (None,) + tuple(int(d) for d in self._output['shape'][1:])
+        self.batch_size = int(self._input['shape'][0])
+        # Interpreters are not thread-safe; Flask serves requests on threads
+        self._lock = threading.Lock()
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        n = len(x)
+        chunk = self.batch_size
+        padded = np.zeros((-(-n // chunk) * chunk,) + x.shape[1:], dtype=np.float32)
+        padded[:n] = x
+
+        outputs = []
+        with self._lock:
+            for start in range(0, len(padded), chunk):
+                self.interpreter.set_tensor(self._input['index'], padded[start:start + chunk])
+                self.interpreter.invoke()
+                outputs.append(self.interpreter.get_tensor(self._output['index']).copy())
+        if not outputs:
+            return np.zeros((0,) + self.output_shape[1:], dtype=np.float32)
+        return np.concatenate(outputs)[:n]
+
+
+def magnitude_prune(model, sparsity):
+    """
+    Zero the smallest-magnitude weights of every kernel matrix
+    Biases are left untouched. Returns a pruned copy of the model.
+    """
+    pruned = tf.keras.models.clone_model(model)
+    pruned.set_weights(model.get_weights())
+
+    for layer in pruned.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        new_weights = []
+        for w in weights:
+            if w.ndim >= 2:
+                threshold = np.percentile(np.abs(w), sparsity * 100)
+                w = np.where(np.abs(w) < threshold, 0, w).astype(w.dtype)
+            new_weights.append(w)
+        layer.set_weights(new_weights)
+
+    return pruned
+
+
+def convert_to_tflite(model, quantize=True, batch_size=TFLITE_BATCH_SIZE):
+    """
+    Convert a Keras model to TFLite, with int8 dynamic-range quantization
+    Tracing at a fixed batch size lets the (bidirectional) LSTM layers lower to
+    fused builtin kernels instead of Flex ops
+    """
+    def serve(x):
+        return model(x, training=False)
+
+    concrete = tf.function(serve).get_concrete_function(
+        tf.TensorSpec([batch_size] + list(model.input_shape[1:]), tf.float32)
+    )
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], model)
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    return converter.convert()
+
+
+def _gzipped_size(data):
+    return len(gzip.compress(data, compresslevel=9))
+
+
+def _throughput(predict_fn, X, runs=20):
+    """Single-request latency (ms) and batch throughput (sequences/s)"""
+    single = X[:1]
+    predict_fn(single)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predict_fn(single)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    predict_fn(X)  # warm-up at batch shape
+    start = time.perf_counter()
+    predict_fn(X)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'latency_ms_p50': float(np.percentile(timings, 50)),
+        'latency_ms_p95': float(np.percentile(timings, 95)),
+        'throughput_seq_per_s': float(len(X) / max(elapsed, 1e-9)),
+    }
+
+
+def _mae(predict_fn, X, y):
+    return float(np.mean(np.abs(predict_fn(X).reshape(-1) - np.asarray(y).reshape(-1))))
+
+
+def optimize(model, X_eval, y_eval, sparsity=0.0, tolerance=0.01,
+             tflite_path=TFLITE_PATH, report_path=REPORT_PATH):
+    """
+    Prune (optional) and quantize `model`, keeping the artifact only if its MAE
+    on (X_eval, y_eval) is at most `tolerance` above the float baseline
+
+    Returns:
+        dict: optimization report
+    """
+    X_eval = np.asarray(X_eval, dtype=np.float32)
+
+    def keras_predict(x):
+        return model.predict(x, batch_size=256, verbose=0)
+
+    baseline_mae = _mae(keras_predict, X_eval, y_eval)
+    float_tflite = convert_to_tflite(model, quantize=False)
+
+    candidate = model
+    if sparsity > 0:
+        print(f"Pruning {sparsity:.0%} of kernel weights by magnitude...")
+        candidate = magnitude_prune(model, sparsity)
+
+    print("Converting to TFLite with int8 dynamic-range quantization...")
+    quantized = convert_to_tflite(candidate, quantize=True)
+
+    quantized_model = TFLiteRiskModel(model_content=quantized)
+
+    quantized_mae = _mae(quantized_model.predict, X_eval, y_eval)
+    # One-sided: a quantized model that beats the baseline is always kept
+    accepted = quantized_mae - baseline_mae <= tolerance
+
+    report = {
+        'accepted': accepted,
+        'tolerance': tolerance,
+        'sparsity': sparsity,
+        'eval_sequences': int(len(X_eval)),
+        'float': {
+            'mae': baseline_mae,
+            'size_bytes': len(float_tflite),
+            'size_gzip_bytes': _gzipped_size(float_tflite),
+            **_throughput(keras_predict, X_eval),
+        },
+        'quantized': {
+            'mae': quantized_mae,
+            'mae_delta': quantized_mae - baseline_mae,
+            'size_bytes': len(quantized),
+            'size_gzip_bytes': _gzipped_size(quantized),
+            **_throughput(quantized_model.predict, X_eval),
+        },
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    if accepted:
+        os.makedirs(os.path.dirname(tflite_path) or '.', exist_ok=True)
+        with open(tflite_path, 'wb') as f:
+            f.write(quantized)
+        print(f"✅ Quantized model saved to {tflite_path} "
+              f"(MAE {quantized_mae:.4f} vs float {baseline_mae:.4f})")
+    else:
+        print(f"⚠️ Quantized MAE {quantized_mae:.4f} exceeds float {baseline_mae:.4f} "
+              f"+ {tolerance}; artifact discarded")
+
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report saved to {report_path}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quantize and prune the trained LSTM model')
+    parser.add_argument('--prune', type=float, default=0.0, help='fraction of kernel weights to zero (0-1)')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='max allowed MAE increase')
+    parser.add_argument('--credentials', default='../backend/serviceAccountKey.json')
+    args = parser.parse_args()
+
+    from sklearn.model_selection import train_test_split
+    from lstm_predictor import TouristSafetyLSTM
+
+    if not os.path.exists('models/lstm_model.h5'):
+        print("❌ No trained model. Run train_model.py first.")
+        sys.exit(1)
+    if not os.path.exists(args.credentials):
+        print(f"❌ Error: Firebase credentials not found at {args.credentials}")
+        sys.exit(1)
+
+    predictor = TouristSafetyLSTM(firebase_credentials_path=args.credentials)
+    predictor.load_model()
+
+    # Rebuild the held-out split with the saved scaler
+    tourists_df, _ = predictor.preprocess_data(predictor.fetch_training_data())
+    X, y = predictor.create_sequences(tourists_df, fit_scaler=False)
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    report = optimize(predictor.model, X_test, y_test, sparsity=args.prune, tolerance=args.tolerance)
+    print()
+    print(f"📦 Size: {report['float']['size_bytes'] / 1024:.0f} KB -> {report['quantized']['size_bytes'] / 1024:.0f} KB")
+    print(f"⚡ Throughput: {report['float']['throughput_seq_per_s']:.0f} -> "
+          f"{report['quantized']['throughput_seq_per_s']:.0f} sequences/s")
+    sys.exit(0 if report['accepted'] else 2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Precomputed time-of-day risk profiles
+For a fixed location the model output depends only on the calendar features
+(hour, day_of_week, day_of_month, month), so the whole calendar can be scored
+once per location after training and served as array lookups. Known locations
+are matched exactly and grid cells only within GRID_TOLERANCE of their center;
+any other point goes to the model, which sees exact coordinates.
+
+Usage:
+    python risk_profiles.py [--grid-step 0.25] [--grid-tolerance 0.001]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+PROFILES_PATH = 'models/risk_profiles.npy'
+INDEX_PATH = 'models/risk_profiles.json'
+
+# hours x weekdays x days of month x months
+PROFILE_SHAPE = (24, 7, 31, 12)
+
+# Locations used by the dashboard and seed data (backend/seedDatabase.js)
+KNOWN_LOCATIONS = [
+    {'name': 'Shillong', 'lat': 25.5788, 'lng': 91.8933, 'district': 'East Khasi Hills'},
+    {'name': 'Cherrapunji', 'lat': 25.2676, 'lng': 91.7320, 'district': 'East Khasi Hills'},
+    {'name': 'Mawsynram', 'lat': 25.2958, 'lng': 91.5831, 'district': 'East Khasi Hills'},
+    {'name': 'Tura', 'lat': 25.5138, 'lng': 90.2036, 'district': 'West Garo Hills'},
+    {'name': 'Jowai', 'lat': 25.4522, 'lng': 92.1950, 'district': 'West Jaintia Hills'},
+    {'name': 'Nongpoh', 'lat': 25.9022, 'lng': 91.8789, 'district': 'Ri-Bhoi'},
+    {'name': 'Baghmara', 'lat': 25.2500, 'lng': 90.6333, 'district': 'South Garo Hills'},
+    {'name': 'Williamnagar', 'lat': 25.4833, 'lng': 90.1333, 'district': 'East Garo Hills'},
+    {'name': 'Nongstoin', 'lat': 25.5167, 'lng': 91.2667, 'district': 'West Khasi Hills'},
+    {'name': 'Dawki', 'lat': 25.1167, 'lng': 92.0167, 'district': 'West Jaintia Hills'},
+    {'name': 'Umiam', 'lat': 25.6833, 'lng': 91.9167, 'district': 'Ri-Bhoi'},
+    {'name': 'Elephant Falls', 'lat': 25.5300, 'lng': 91.8800, 'district': 'East Khasi Hills'},
+    {'name': 'Laitlum Canyon', 'lat': 25.4500, 'lng': 91.8000, 'district': 'East Khasi Hills'},
+    {'name': 'Living Root Bridge', 'lat': 25.2500, 'lng': 91.7000, 'district': 'East Khasi Hills'},
+]
+
+# Meghalaya bounding box (lat_min, lat_max, lng_min, lng_max)
+MEGHALAYA_BOUNDS = (25.0, 26.2, 89.8, 92.8)
+
+# Max distance (degrees, per axis) from a cell center served its profile; well
+# below the 0.01 degree resolution of the location risk feature
+GRID_TOLERANCE = 0.001
+
+
+def _key(lat, lng):
+    return (round(float(lat), 4), round(float(lng), 4))
+
+
+def grid_cells(step, bounds=MEGHALAYA_BOUNDS):
+    """Cell centers of a regular lat/lng grid over `bounds`"""
+    lat_min, lat_max, lng_min, lng_max = bounds
+    lats = np.arange(lat_min + step / 2, lat_max, step)
+    lngs = np.arange(lng_min + step / 2, lng_max, step)
+    return [
+        {'name': f'cell_{lat:.4f}_{lng:.4f}', 'lat': round(float(lat), 4), 'lng': round(float(lng), 4)}
+        for lat in lats for lng in lngs
+    ]
+
+
+def calendar_grid():
+    """All (hour, day_of_week, day_of_month, month) combinations in PROFILE_SHAPE order"""
+    hours, dows, doms, months = np.meshgrid(
+        np.arange(24), np.arange(7), np.arange(1, 32), np.arange(1, 13), indexing='ij'
+    )
+    return hours.ravel(), dows.ravel(), doms.ravel(), months.ravel()
+
+
+def build_profiles(predictor, locations=None, grid_step=0.25, grid_tolerance=GRID_TOLERANCE, batch_size=4096,
+                   path=PROFILES_PATH, index_path=INDEX_PATH, model_path='models/lstm_model.h5'):
+    """
+    Score the full calendar for every location and grid cell in one batched pass
+
+    Writes a (locations + cells, 24, 7, 31, 12) float32 array with
+    np.lib.format so it can be memory-mapped at serving time, plus a JSON
+    index of the locations and the grid layout. Impossible dates (e.g. 31
+    February) are scored too; they keep indexing trivial and are never looked up.
+    """
+    locations = list(locations if locations is not None else KNOWN_LOCATIONS)
+
+    # De-duplicate by rounded coordinates, keeping the first entry
+    seen = {}
+    for loc in locations:
+        seen.setdefault(_key(loc['lat'], loc['lng']), loc)
+    locations = list(seen.values())
+
+    # Grid cells follow the named locations, row by row, so a cell's index is computed from the point
+    grid = None
+    cells = grid_cells(grid_step) if grid_step else []
+    if cells:
+        lat_min, lat_max, lng_min, lng_max = MEGHALAYA_BOUNDS
+        grid = {
+            'step': grid_step,
+            'bounds': list(MEGHALAYA_BOUNDS),
+            'rows': len(np.arange(lat_min + grid_step / 2, lat_max, grid_step)),
+            'cols': len(np.arange(lng_min + grid_step / 2, lng_max, grid_step)),
+            'tolerance': grid_tolerance,
+            'offset': len(locations)
+        }
+    scored = locations + cells
+
+    hours, dows, doms, months = calendar_grid()
+    n_calendar = len(hours)
+    columns = {
+        'hour': hours, 'day_of_week': dows, 'day_of_month': doms, 'month': months,
+    }
+    rows = np.zeros((n_calendar, len(predictor.feature_columns)), dtype=np.float64)
+    for i, col in enumerate(predictor.feature_columns):
+        if col in columns:
+            rows[:, i] = columns[col]
+    lat_idx = predictor.feature_columns.index('lat')
+    lng_idx = predictor.feature_columns.index('lng')
+
+    print(f"Precomputing risk profiles: {len(locations)} locations + {len(cells)} grid cells "
+          f"x {n_calendar} calendar slots...")
+    start = time.perf_counter()
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp.npy'
+    profiles = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=np.float32, shape=(len(scored),) + PROFILE_SHAPE
+    )
+    for i, loc in enumerate(scored):
+        rows[:, lat_idx] = loc['lat']
+        rows[:, lng_idx] = loc['lng']
+        scores = predictor.predict_rows(rows, batch_size=batch_size, use_student=False)
+        profiles[i] = scores.reshape(PROFILE_SHAPE)
+    profiles.flush()
+    del profiles
+    os.replace(tmp_path, path)
+
+    index = {
+        'shape': list(PROFILE_SHAPE),
+        'locations': [
+            {'name': loc.get('name'), 'lat': _key(loc['lat'], loc['lng'])[0], 'lng': _key(loc['lat'], loc['lng'])[1]}
+            for loc in locations
+        ],
+        'grid': grid,
+        'model_mtime': os.path.getmtime(model_path) if os.path.exists(model_path) else None,
+        'created': datetime.now().isoformat(),
+    }
+    with open(index_path, 'w') as f:
+        json.dump(index, f, indent=2)
+
+    print(f"Risk profiles saved to {path} in {time.perf_counter() - start:.1f}s")
+    return index
+
+
+class RiskProfileTable:
+    """Memory-mapped risk profiles: exact known locations, else a grid cell whose center is within tolerance"""
+
+    def __init__(self, profiles, locations, grid=None):
+        self.profiles = profiles
+        self.locations = locations
+        self.grid = grid
+        self._index = {_key(loc['lat'], loc['lng']): i for i, loc in enumerate(locations)}
+        self.hits = 0
+        self.misses = 0
+
+    def _row(self, lat, lng):
+        """Profile index for a point, or None unless it is a known location or next to a cell center"""
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return None
+        if not (np.isfinite(lat) and np.isfinite(lng)):
+            return None
+        i = self._index.get(_key(lat, lng))
+        if i is not None or self.grid is None:
+            return i
+        lat_min, _, lng_min, _ = self.grid['bounds']
+        step = self.grid['step']
+        row = int(np.floor((lat - lat_min) / step))
+        col = int(np.floor((lng - lng_min) / step))
+        if not (0 <= row < self.grid['rows'] and 0 <= col < self.grid['cols']):
+            return None
+        # A cell profile is scored at the center; farther points need the model
+        tolerance = self.grid.get('tolerance', GRID_TOLERANCE)
+        if (abs(lat - (lat_min + (row + 0.5) * step)) > tolerance or
+                abs(lng - (lng_min + (col + 0.5) * step)) > tolerance):
+            return None
+        return self.grid['offset'] + row * self.grid['cols'] + col
+
+    @classmethod
+    def load(cls, path=PROFILES_PATH, index_path=INDEX_PATH, model_path='models/lstm_model.h5'):
+        """Load profiles, or return None if missing or older than the model"""
+        if not (os.path.exists(path) and os.path.exists(index_path)):
+            return None
+        with open(index_path) as f:
+            index = json.load(f)
+        model_mtime = os.path.getmtime(model_path) if os.path.exists(model_path) else None
+        if model_mtime and index.get('model_mtime') and model_mtime > index['model_mtime']:
+            print("⚠️ Risk profiles are older than the model; ignoring them")
+            return None
+        return cls(np.load(path, mmap_mode='r'), index['locations'], index.get('grid'))
+
+    def __contains__(self, latlng):
+        return self._row(*latlng) is not None
+
+    def lookup(self, lat, lng, hour, day_of_week, day_of_month, month):
+        """Risk score for a known location or grid cell center, or None to fall back to the model"""
+        i = self._row(lat, lng)
+        if i is None:
+            self.misses += 1
+            return None
+        try:
+            h, dow, dom, m = int(hour), int(day_of_week), int(day_of_month), int(month)
+        except (TypeError, ValueError):
+            self.misses += 1
+            return None
+        if not (0 <= h < 24 and 0 <= dow < 7 and 1 <= dom <= 31 and 1 <= m <= 12):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return float(self.profiles[i, h, dow, dom - 1, m - 1])
+
+    def lookup_trend(self, lat, lng, start_time, hours):
+        """Hourly risk scores from start_time for a known location or grid cell center, or None"""
+        i = self._row(lat, lng)
+        if i is None:
+            self.misses += 1
+            return None
+        times = [start_time + timedelta(hours=offset) for offset in range(hours)]
+        h = np.array([t.hour for t in times])
+        dow = np.array([t.weekday() for t in times])
+        dom = np.array([t.day - 1 for t in times])
+        m = np.array([t.month - 1 for t in times])
+        self.hits += 1
+        return np.asarray(self.profiles[i][h, dow, dom, m], dtype=np.float64).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute per-location risk profiles')
+    parser.add_argument('--grid-step', type=float, default=0.25, help='grid cell size in degrees (0 disables the grid)')
+    parser.add_argument('--grid-tolerance', type=float, default=GRID_TOLERANCE,
+                        help='max distance in degrees from a cell center served its profile')
+    parser.add_argument('--batch-size', type=int, default=4096)
+    args = parser.parse_args()
+
+    from lstm_predictor import TouristSafetyLSTM
+
+    if not os.path.exists('models/lstm_model.h5'):
+        print("❌ No trained model. Run train_model.py first.")
+        sys.exit(1)
+
+    predictor = TouristSafetyLSTM()
+    predictor.load_model()
+    build_profiles(predictor, grid_step=args.grid_step, grid_tolerance=args.grid_tolerance,
+                   batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Bounded-memory sampling of training rows
+Tourist rows stream through two single-pass stages before they reach pandas:
+
+1. Ping deduplication: a row whose position is within `dedup_deg` of the same
+   tourist's previous kept row, in the same time bucket, is dropped and
+   counted towards that row's weight (a stationary tourist pinging every
+   minute contributes one row per hour instead of sixty).
+2. Stratified reservoir: rows are grouped by region (a `region_deg` grid cell)
+   and time-of-day bucket, and a uniform sample of each group is kept so that
+   the total never exceeds `row_budget`. Small groups are kept whole; the
+   budget left over is shared equally by the large ones.
+
+Every kept row carries `sample_weight`, the number of raw rows it stands for.
+"""
+
+import heapq
+import itertools
+import math
+import random
+from collections import OrderedDict
+from datetime import datetime
+
+# Same precedence as preprocess_data
+TIMESTAMP_FIELDS = ('lastUpdate', 'lastSeen', 'checkInDate', 'timestamp')
+
+
+def parse_timestamp(value):
+    """datetime from a Firestore timestamp, datetime or ISO string; None if unparseable"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return None
+
+
+def row_position(record):
+    """(tourist id, lat, lng, timestamp) of a tourist document"""
+    location = record.get('location')
+    lat = location.get('lat', 0) if isinstance(location, dict) else 0
+    lng = location.get('lng', 0) if isinstance(location, dict) else 0
+    timestamp = None
+    for field in TIMESTAMP_FIELDS:
+        if field in record:
+            timestamp = parse_timestamp(record[field])
+            break
+    return record.get('id', record.get('doc_id')), lat, lng, timestamp
+
+
+class PingDeduplicator:
+    """
+    Drops consecutive near-identical rows per tourist
+    Only the last kept row of the `max_tracked` most recently seen tourists is
+    remembered, so memory stays bounded.
+    """
+
+    def __init__(self, dedup_deg=0.0005, bucket_hours=1, max_tracked=100000):
+        self.dedup_deg = dedup_deg
+        self.bucket_seconds = bucket_hours * 3600
+        self.max_tracked = max_tracked
+        self._last = OrderedDict()  # tourist id -> (lat, lng, bucket, record)
+        self.seen = 0
+        self.dropped = 0
+
+    def _bucket(self, timestamp):
+        return int(timestamp.timestamp() // self.bucket_seconds) if timestamp is not None else None
+
+    def keep(self, record, tourist_id, lat, lng, timestamp):
+        """False if the row repeats the tourist's last kept row (whose weight then grows)"""
+        self.seen += 1
+        bucket = self._bucket(timestamp)
+        last = self._last.get(tourist_id)
+        if last is not None:
+            last_lat, last_lng, last_bucket, last_record = last
+            if (last_bucket == bucket and abs(lat - last_lat) < self.dedup_deg
+                    and abs(lng - last_lng) < self.dedup_deg):
+                last_record['sample_weight'] += 1
+                self.dropped += 1
+                return False
+        if tourist_id is not None:
+            self._last[tourist_id] = (lat, lng, bucket, record)
+            self._last.move_to_end(tourist_id)
+            if len(self._last) > self.max_tracked:
+                self._last.popitem(last=False)
+        return True
+
+
+class StratifiedReservoir:
+    """
+    At most `row_budget` rows, sampled uniformly within each stratum
+    Each row gets a random key and every stratum keeps its lowest keys (a
+    uniform sample without replacement). When the budget is exceeded the
+    largest stratum gives up its highest key.
+    """
+
+    def __init__(self, row_budget, region_deg=0.1, bucket_hours=6, seed=0):
+        if row_budget < 1:
+            raise ValueError('row_budget must be at least 1')
+        self.row_budget = row_budget
+        self.region_deg = region_deg
+        self.bucket_hours = bucket_hours
+        self._rng = random.Random(seed)
+        self._order = itertools.count()
+        self._strata = {}  # stratum -> [max-heap of (-key, order, record), rows seen]
+        self._sizes = []   # lazy max-heap of (-size, stratum); stale entries are skipped
+        self.held = 0
+        self.seen = 0
+        self._rows = None
+
+    def stratum(self, lat, lng, timestamp):
+        bucket = timestamp.hour // self.bucket_hours if timestamp is not None else -1
+        return math.floor(lat / self.region_deg), math.floor(lng / self.region_deg), bucket
+
+    def offer(self, record, lat, lng, timestamp):
+        self.seen += 1
+        stratum = self.stratum(lat, lng, timestamp)
+        entry = self._strata.get(stratum)
+        if entry is None:
+            entry = self._strata[stratum] = [[], 0]
+        entry[1] += 1
+        heapq.heappush(entry[0], (-self._rng.random(), next(self._order), record))
+        self.held += 1
+        heapq.heappush(self._sizes, (-len(entry[0]), stratum))
+        if self.held > self.row_budget:
+            self._evict()
+        if len(self._sizes) > 2 * len(self._strata) + 64:
+            self._sizes = [(-len(heap), s) for s, (heap, _) in self._strata.items() if heap]
+            heapq.heapify(self._sizes)
+
+    def _evict(self):
+        while True:
+            size, stratum = heapq.heappop(self._sizes)
+            heap = self._strata[stratum][0]
+            if -size == len(heap):
+                break
+        heapq.heappop(heap)
+        self.held -= 1
+        if heap:
+            heapq.heappush(self._sizes, (-len(heap), stratum))
+
+    def rows(self):
+        """Kept records in arrival order, weights scaled by seen / kept per stratum"""
+        if self._rows is not None:
+            return self._rows
+        kept = []
+        for heap, seen in self._strata.values():
+            scale = seen / len(heap) if heap else 0
+            for _, order, record in heap:
+                record['sample_weight'] *= scale
+                kept.append((order, record))
+        kept.sort(key=lambda item: item[0])
+        self._rows = [record for _, record in kept]
+        return self._rows
+
+    def stats(self):
+        return {'strata': len(self._strata), 'seen': self.seen, 'kept': self.held}
+
+
+class TrainingSampler:
+    """
+    Dedup and/or reservoir stage for a stream of tourist documents
+    Either limit may be None to skip that stage.
+    """
+
+    def __init__(self, row_budget=None, dedup_deg=None, region_deg=0.1, bucket_hours=6, seed=0):
+        self.dedup = PingDeduplicator(dedup_deg) if dedup_deg else None
+        self.reservoir = StratifiedReservoir(row_budget, region_deg, bucket_hours, seed) if row_budget else None
+        self._kept = []
+        self.seen = 0
+
+    def add(self, record):
+        self.seen += 1
+        record['sample_weight'] = 1.0
+        tourist_id, lat, lng, timestamp = row_position(record)
+        if self.dedup is not None and not self.dedup.keep(record, tourist_id, lat, lng, timestamp):
+            return
+        if self.reservoir is not None:
+            self.reservoir.offer(record, lat, lng, timestamp)
+        else:
+            self._kept.append(record)
+
+    def rows(self):
+        return self.reservoir.rows() if self.reservoir is not None else self._kept
+
+    def report(self):
+        report = {'rows_seen': self.seen}
+        if self.dedup is not None:
+            report['deduplicated'] = self.dedup.dropped
+            report['dedup_deg'] = self.dedup.dedup_deg
+        if self.reservoir is not None:
+            report['row_budget'] = self.reservoir.row_budget
+            report.update(self.reservoir.stats())
+        report['rows_kept'] = self.reservoir.held if self.reservoir is not None else len(self._kept)
+        return report
@@ -0,0 +1,266 @@
+"""
+Offline bulk scoring of CSV / Parquet exports
+Reads the input in chunks, scores every row with a pool of model worker
+processes and streams the rows back out with risk_score and risk_level
+columns appended, in input order. Rows are scored exactly as
+/api/ml/predict/risk would score them (profiles first, then the model), with
+no HTTP or Firestore involved. At most 2 x workers chunks are held at once.
+
+Input columns:
+    lat, lng            also accepted: latitude/longitude, location.lat/location.lng
+    hour, day_of_week, day_of_month, month
+                        optional; otherwise taken from --time-column (e.g.
+                        lastUpdate), or the current time if that is missing too
+
+Usage:
+    python score_file.py exports/tourists.csv
+    python score_file.py exports/history.parquet --output scored.parquet --workers 4
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet support is optional
+    pa = None
+    pq = None
+
+from lstm_predictor import RISK_LEVEL_BOUNDARIES, RISK_LEVEL_NAMES
+
+LAT_COLUMNS = ('lat', 'latitude', 'location.lat')
+LNG_COLUMNS = ('lng', 'longitude', 'location.lng', 'lon')
+CALENDAR_COLUMNS = ('hour', 'day_of_week', 'day_of_month', 'month')
+TIME_COLUMNS = ('lastUpdate', 'timestamp', 'lastSeen')
+
+# Set once per worker process by _init_worker
+_worker_state = {}
+
+
+def _find_column(columns, candidates, override=None):
+    if override:
+        if override not in columns:
+            raise ValueError(f"Column {override!r} not in input")
+        return override
+    return next((c for c in candidates if c in columns), None)
+
+
+def parse_times(values):
+    """Wall-clock datetimes (NaT when unparseable), keeping each value's own UTC offset like tourist_features"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        when = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    if when.dtype == object:
+        # Mixed UTC offsets come back as Timestamp objects
+        when = pd.to_datetime(when.map(lambda t: t.replace(tzinfo=None) if pd.notna(t) else pd.NaT))
+    elif getattr(when.dt, 'tz', None) is not None:
+        when = when.dt.tz_localize(None)
+    return when
+
+
+def feature_records(chunk, lat_column, lng_column, time_column=None, now=None):
+    """predict_risk inputs for a chunk of rows, as dicts keyed by feature column"""
+    now = now or datetime.now()
+    features = pd.DataFrame({
+        'lat': pd.to_numeric(chunk[lat_column], errors='coerce').fillna(0).to_numpy(),
+        'lng': pd.to_numeric(chunk[lng_column], errors='coerce').fillna(0).to_numpy()
+    })
+    if all(c in chunk.columns for c in CALENDAR_COLUMNS):
+        for c in CALENDAR_COLUMNS:
+            features[c] = pd.to_numeric(chunk[c], errors='coerce').to_numpy()
+    else:
+        when = pd.Series(pd.NaT, index=chunk.index)
+        if time_column is not None:
+            when = parse_times(chunk[time_column])
+        features['hour'] = when.dt.hour.to_numpy()
+        features['day_of_week'] = when.dt.dayofweek.to_numpy()
+        features['day_of_month'] = when.dt.day.to_numpy()
+        features['month'] = when.dt.month.to_numpy()
+    # Missing calendar values default to now, as in predict_risk
+    defaults = {'hour': now.hour, 'day_of_week': now.weekday(), 'day_of_month': now.day, 'month': now.month}
+    features = features.fillna(defaults).astype({c: int for c in CALENDAR_COLUMNS})
+    features['risk_score'] = 0
+    return features.to_dict('records')
+
+
+def load_predictor(use_profiles=True):
+    from lstm_predictor import TouristSafetyLSTM
+
+    predictor = TouristSafetyLSTM(db=None)
+    if predictor.fused_model_available():
+        predictor.load_fused_model()
+    else:
+        predictor.load_model()
+    if use_profiles:
+        predictor.load_risk_profiles()
+    return predictor
+
+
+def _init_worker(threads_per_worker, use_profiles):
+    """Pin TensorFlow to its share of cores and load the model once per process"""
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _worker_state['predictor'] = load_predictor(use_profiles)
+
+
+def score_chunk(chunk, lat_column, lng_column, time_column):
+    """Risk scores (float32) for one chunk, inside a worker process"""
+    records = feature_records(chunk, lat_column, lng_column, time_column)
+    return _worker_state['predictor'].predict_many(records).astype(np.float32)
+
+
+def read_chunks(path, chunk_size):
+    """DataFrames of up to chunk_size rows"""
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError("Reading Parquet needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def input_columns(path):
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError("Reading Parquet needs pyarrow (pip install pyarrow)")
+        return pq.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+class ChunkWriter:
+    """Appends scored chunks to a CSV or Parquet file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        if self.parquet and pq is None:
+            raise RuntimeError("Writing Parquet needs pyarrow (pip install pyarrow)")
+        self._writer = None
+        self.rows = 0
+
+    def write(self, chunk):
+        if self.parquet:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def with_scores(chunk, scores):
+    levels = np.asarray(RISK_LEVEL_NAMES)[np.searchsorted(RISK_LEVEL_BOUNDARIES, scores, side='right')]
+    return chunk.assign(risk_score=scores, risk_level=levels)
+
+
+def score_file(input_path, output_path, chunk_size=50000, workers=None, threads_per_worker=1,
+               lat_column=None, lng_column=None, time_column=None, use_profiles=True):
+    """Score every row of input_path into output_path; returns a summary dict"""
+    columns = input_columns(input_path)
+    lat_column = _find_column(columns, LAT_COLUMNS, lat_column)
+    lng_column = _find_column(columns, LNG_COLUMNS, lng_column)
+    if lat_column is None or lng_column is None:
+        raise ValueError(f"No latitude/longitude columns found in {columns}")
+    time_column = _find_column(columns, TIME_COLUMNS, time_column)
+
+    cores = os.cpu_count() or 1
+    if workers is None:
+        workers = max(1, cores // threads_per_worker)
+    needed = [c for c in (lat_column, lng_column, time_column) + CALENDAR_COLUMNS if c in columns]
+    start = time.perf_counter()
+    writer = ChunkWriter(output_path)
+
+    if workers == 0:
+        # In-process, for small files and debugging
+        _worker_state['predictor'] = load_predictor(use_profiles)
+        for chunk in read_chunks(input_path, chunk_size):
+            writer.write(with_scores(chunk, score_chunk(chunk[needed], lat_column, lng_column, time_column)))
+    else:
+        # Spawn so each worker configures TensorFlow threading from a clean state
+        ctx = mp.get_context('spawn')
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(threads_per_worker, use_profiles)) as pool:
+            for chunk in read_chunks(input_path, chunk_size):
+                # Workers only receive the columns they need; the full rows stay here for writing
+                future = pool.submit(score_chunk, chunk[needed], lat_column, lng_column, time_column)
+                pending.append((chunk, future))
+                # Bounded memory: write the oldest chunk before reading further ahead
+                while len(pending) >= 2 * workers:
+                    done_chunk, future = pending.popleft()
+                    writer.write(with_scores(done_chunk, future.result()))
+            while pending:
+                done_chunk, future = pending.popleft()
+                writer.write(with_scores(done_chunk, future.result()))
+    writer.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': writer.rows,
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(writer.rows / seconds, 1) if seconds else None,
+        'workers': workers,
+        'output': output_path
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV or Parquet export of tourist rows')
+    parser.add_argument('input', help='.csv or .parquet file')
+    parser.add_argument('--output', help='default: <input>_scored.<ext>')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='rows per chunk sent to a worker')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: cores / threads, 0 = in-process)')
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--lat-column')
+    parser.add_argument('--lng-column')
+    parser.add_argument('--time-column', help='timestamp for the calendar features (default: lastUpdate, ...)')
+    parser.add_argument('--no-profiles', action='store_true', help='always run the model, skip risk profiles')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"❌ Input not found: {args.input}")
+        sys.exit(1)
+    if not os.path.exists('models/lstm_model.h5'):
+        print("❌ No trained model. Run train_model.py first.")
+        sys.exit(1)
+    stem, ext = os.path.splitext(args.input)
+    output = args.output or f'{stem}_scored{ext}'
+
+    print(f"🧮 Scoring {args.input} -> {output}")
+    try:
+        summary = score_file(
+            args.input, output, chunk_size=args.chunk_size, workers=args.workers,
+            threads_per_worker=args.threads_per_worker, lat_column=args.lat_column,
+            lng_column=args.lng_column, time_column=args.time_column, use_profiles=not args.no_profiles
+        )
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ {summary['rows']} rows in {summary['seconds']}s ({summary['rows_per_second']} rows/s, "
+          f"{summary['workers']} workers)")
+
+
+if __name__ == "__main__":
+    main()
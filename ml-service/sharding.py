@@ -0,0 +1,187 @@
+"""
+Region-sharded models
+Tourists are partitioned by the geohash prefix of their location and each
+partition with enough data gets its own model (see train_shards.py), stored as
+a fused model under models/shards/<prefix>/. ShardRouter serves a request from
+its region's shard, loading shards on first use and evicting the least
+recently used ones once their size exceeds a memory cap. Regions without a
+shard are served by the global model.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from singleflight import SingleFlight
+from spatial_index import geohash_encode
+
+SHARDS_DIR = 'models/shards'
+MANIFEST_NAME = 'manifest.json'
+# Geohash characters per shard key: 4 ~ 39 x 20 km, a district or smaller
+DEFAULT_PRECISION = 4
+
+
+def shard_paths(shards_dir, key):
+    """(fused model, meta) paths of one shard"""
+    shard_dir = os.path.join(shards_dir, key)
+    return os.path.join(shard_dir, 'lstm_model_fused.h5'), os.path.join(shard_dir, 'model_meta.json')
+
+
+def read_manifest(shards_dir=SHARDS_DIR):
+    path = os.path.join(shards_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, shards_dir=SHARDS_DIR):
+    """Replace the manifest atomically, so a serving router never reads half of it"""
+    os.makedirs(shards_dir, exist_ok=True)
+    path = os.path.join(shards_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def shard_size_bytes(shards_dir, key):
+    return sum(os.path.getsize(path) for path in shard_paths(shards_dir, key) if os.path.exists(path))
+
+
+class ShardRouter:
+    """
+    Routes predictions to per-region models, falling back to `fallback`
+    Exposes the prediction methods of TouristSafetyLSTM used by the API.
+    """
+
+    def __init__(self, fallback, shards_dir=SHARDS_DIR, cache_mb=256):
+        self.fallback = fallback
+        self.shards_dir = shards_dir
+        self.cache_bytes = int(cache_mb * 1024 * 1024)
+        self._loaded = OrderedDict()  # key -> (predictor, size in bytes), least recently used first
+        self._lock = threading.Lock()
+        self._loads = SingleFlight('shards')
+        self._manifest_mtime = None
+        self.manifest = {'precision': DEFAULT_PRECISION, 'shards': {}}
+        self.loads = 0
+        self.evictions = 0
+        self.refresh()
+
+    @property
+    def model(self):
+        return self.fallback.model
+
+    def refresh(self):
+        """Re-read the manifest if it changed; retrained shards are dropped from the cache"""
+        path = os.path.join(self.shards_dir, MANIFEST_NAME)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        manifest = read_manifest(self.shards_dir)
+        with self._lock:
+            old = self.manifest['shards']
+            for key in list(self._loaded):
+                entry = manifest['shards'].get(key)
+                if entry is None or entry.get('trained_at') != old.get(key, {}).get('trained_at'):
+                    del self._loaded[key]
+            self.manifest = manifest
+            self._manifest_mtime = mtime
+
+    def shard_key(self, lat, lng):
+        """Key of the shard covering a point, or None if its region has no shard"""
+        if lat is None or lng is None:
+            return None
+        key = geohash_encode(lat, lng, self.manifest.get('precision', DEFAULT_PRECISION))
+        return key if key in self.manifest['shards'] else None
+
+    def _load(self, key):
+        from lstm_predictor import TouristSafetyLSTM
+        model_path, meta_path = shard_paths(self.shards_dir, key)
+        shard = TouristSafetyLSTM(db=self.fallback.db)
+        shard.load_fused_model(model_path, meta_path)
+        self.loads += 1
+        return shard, shard_size_bytes(self.shards_dir, key)
+
+    def predictor_for(self, key):
+        """Loaded shard predictor for a key (None = fallback model)"""
+        if key is None:
+            return self.fallback
+        with self._lock:
+            entry = self._loaded.get(key)
+            if entry is not None:
+                self._loaded.move_to_end(key)
+                metrics.inc('ml_shard_requests_total', result='hit')
+                return entry[0]
+
+        # Concurrent first requests for a region load it once
+        (shard, size), _ = self._loads.do(key, lambda: self._load(key))
+        metrics.inc('ml_shard_requests_total', result='load')
+        with self._lock:
+            if key not in self._loaded:
+                self._loaded[key] = (shard, size)
+                self._evict(keep=key)
+        return shard
+
+    def _evict(self, keep):
+        total = sum(size for _, size in self._loaded.values())
+        for key in list(self._loaded):
+            if total <= self.cache_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._loaded.pop(key)[1]
+            self.evictions += 1
+            metrics.inc('ml_shard_evictions_total')
+
+    def _group(self, points):
+        """{shard key: [indices]} for (lat, lng) pairs"""
+        self.refresh()
+        groups = {}
+        for i, (lat, lng) in enumerate(points):
+            groups.setdefault(self.shard_key(lat, lng), []).append(i)
+        return groups
+
+    def predict_many(self, records):
+        scores = np.empty(len(records))
+        for key, indices in self._group([(r.get('lat'), r.get('lng')) for r in records]).items():
+            scores[indices] = self.predictor_for(key).predict_many([records[i] for i in indices])
+        return scores
+
+    def predict_risk(self, tourist_data):
+        return float(self.predict_many([tourist_data])[0])
+
+    def predict_hotspots(self, locations, time_window=24):
+        predictions = []
+        for key, indices in self._group([(loc['lat'], loc['lng']) for loc in locations]).items():
+            predictions.extend(self.predictor_for(key).predict_hotspots([locations[i] for i in indices], time_window))
+        predictions.sort(key=lambda x: x['avg_risk'], reverse=True)
+        return predictions
+
+    def iter_hotspots(self, locations, time_window=24, chunk_size=100):
+        """Chunks per shard; order follows the shards rather than the request"""
+        for key, indices in self._group([(loc['lat'], loc['lng']) for loc in locations]).items():
+            yield from self.predictor_for(key).iter_hotspots([locations[i] for i in indices], time_window, chunk_size)
+
+    def stats(self):
+        with self._lock:
+            loaded = {key: size for key, (_, size) in self._loaded.items()}
+        return {
+            'shards': len(self.manifest['shards']),
+            'precision': self.manifest.get('precision', DEFAULT_PRECISION),
+            'loaded': sorted(loaded),
+            'loaded_mb': round(sum(loaded.values()) / 1024 / 1024, 2),
+            'cache_mb': round(self.cache_bytes / 1024 / 1024, 2),
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
+
+
+metrics.describe('ml_shard_requests_total', 'counter', 'Shard lookups by result (hit, load)')
+metrics.describe('ml_shard_evictions_total', 'counter', 'Shards evicted from the router cache')
@@ -0,0 +1,84 @@
+"""
+Single-flight request coalescing
+Concurrent callers asking for the same key share one in-progress computation:
+the first caller (the leader) runs it, the others wait and receive the same
+result (or exception). Nothing is cached once the computation finishes.
+"""
+
+import json
+import threading
+
+import metrics
+
+
+def canonical_key(*parts):
+    """Stable key for JSON-like request payloads (dict key order does not matter)"""
+    return json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Group of in-flight calls, keyed by canonicalized request"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """
+        Run fn() once per key among concurrent callers
+        Returns (result, shared) where shared is True for callers that reused
+        another request's computation.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self.coalesced += 1
+
+        metrics.inc('ml_singleflight_requests_total', group=self.name, role='leader' if leader else 'coalesced')
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self, key):
+        """True while a computation for `key` is running (a new caller would be coalesced)"""
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._calls)
+        return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': in_flight}
+
+
+metrics.describe('ml_singleflight_requests_total', 'counter',
+                 'Requests that ran a computation (leader) or shared an identical in-flight one (coalesced)')
@@ -0,0 +1,196 @@
+"""
+In-memory spatial index of current tourist positions
+A uniform lat/lng grid (cells of `cell_deg` degrees) answers radius and
+k-nearest-neighbour queries by scanning only the cells around the query point,
+then computing exact great-circle distances for those candidates with numpy.
+Kept current from Firestore with a snapshot listener.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distance (km) from one point to arrays of points"""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(lat, lng, precision=4):
+    """Geohash of a point; each extra character narrows the cell (4 ~ 39 x 20 km)"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_bounds(geohash):
+    """(lat_min, lat_max, lng_min, lng_max) of a geohash cell"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+class TouristSpatialIndex:
+    """Grid index of tourist id -> (lat, lng) plus the data needed to re-score them"""
+
+    def __init__(self, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self._cells = {}      # (row, col) -> set of tourist ids
+        self._points = {}     # tourist id -> (lat, lng, cell)
+        self._info = {}       # tourist id -> dict (name, location, features...)
+        self._lock = threading.RLock()
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def upsert(self, tourist_id, lat, lng, info=None):
+        """Insert or move a tourist"""
+        lat, lng = float(lat), float(lng)
+        cell = self._cell(lat, lng)
+        with self._lock:
+            old = self._points.get(tourist_id)
+            if old is not None and old[2] != cell:
+                self._discard(tourist_id, old[2])
+            self._points[tourist_id] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(tourist_id)
+            if info is not None:
+                self._info[tourist_id] = info
+            self.updates += 1
+
+    def remove(self, tourist_id):
+        with self._lock:
+            old = self._points.pop(tourist_id, None)
+            self._info.pop(tourist_id, None)
+            if old is not None:
+                self._discard(tourist_id, old[2])
+                self.updates += 1
+
+    def _discard(self, tourist_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(tourist_id)
+            if not members:
+                del self._cells[cell]
+
+    def info(self, tourist_id):
+        return self._info.get(tourist_id)
+
+    def _cells_in_box(self, lat, lng, radius_km):
+        """Occupied cells overlapping the bounding box of a circle"""
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlng = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        r0, c0 = self._cell(lat - dlat, lng - dlng)
+        r1, c1 = self._cell(lat + dlat, lng + dlng)
+        if (r1 - r0 + 1) * (c1 - c0 + 1) > len(self._cells):
+            # Large radius: cheaper to filter the occupied cells
+            return [cell for cell in self._cells if r0 <= cell[0] <= r1 and c0 <= cell[1] <= c1]
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1) if (r, c) in self._cells]
+
+    def _distances(self, lat, lng, cells):
+        ids = [tourist_id for cell in cells for tourist_id in self._cells[cell]]
+        if not ids:
+            return [], np.zeros(0)
+        coords = np.array([self._points[tourist_id][:2] for tourist_id in ids])
+        return ids, haversine_km(lat, lng, coords[:, 0], coords[:, 1])
+
+    def within_radius(self, lat, lng, radius_km, limit=None):
+        """Tourists within `radius_km`, nearest first, as [(id, distance_km)]"""
+        with self._lock:
+            ids, distances = self._distances(lat, lng, self._cells_in_box(lat, lng, radius_km))
+        inside = np.flatnonzero(distances <= radius_km)
+        order = inside[np.argsort(distances[inside], kind='stable')]
+        if limit is not None:
+            order = order[:limit]
+        return [(ids[i], float(distances[i])) for i in order]
+
+    def nearest(self, lat, lng, k=10, max_radius_km=None):
+        """
+        k nearest tourists as [(id, distance_km)]
+        The search radius starts at one cell and doubles until it holds k
+        tourists; everything outside it is farther, so the result is exact.
+        """
+        radius = self.cell_deg * KM_PER_DEG_LAT
+        with self._lock:
+            while True:
+                if max_radius_km is not None:
+                    radius = min(radius, max_radius_km)
+                ids, distances = self._distances(lat, lng, self._cells_in_box(lat, lng, radius))
+                found = int(np.count_nonzero(distances <= radius))
+                if found >= k or len(ids) == len(self._points) or radius == max_radius_km:
+                    break
+                radius *= 2
+
+        inside = np.flatnonzero(distances <= (radius if max_radius_km is not None else np.inf))
+        order = inside[np.argsort(distances[inside], kind='stable')][:k]
+        return [(ids[i], float(distances[i])) for i in order]
+
+    def apply_document(self, doc_id, doc, features_fn=None):
+        """Index an active tourist document (or drop it if inactive / without a location)"""
+        tourist_id = doc.get('id', doc_id)
+        location = doc.get('location') or {}
+        lat, lng = location.get('lat'), location.get('lng')
+        if doc.get('status', 'active') != 'active' or lat is None or lng is None or (lat == 0 and lng == 0):
+            self.remove(tourist_id)
+            return
+        info = {'doc_id': doc_id, 'name': doc.get('name'), 'location': location}
+        if features_fn is not None:
+            info['features'] = features_fn(doc)
+        self.upsert(tourist_id, lat, lng, info)
+
+    def watch(self, db, features_fn=None, collection='tourists'):
+        """
+        Keep the index current with a Firestore snapshot listener
+        The first snapshot delivers every document as ADDED. Returns the watch
+        handle (call .unsubscribe() to stop).
+        """
+        doc_ids = {}  # Firestore doc id -> tourist id, for removals
+
+        def on_snapshot(col_snapshot, changes, read_time):
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    self.remove(doc_ids.pop(doc.id, doc.id))
+                    continue
+                data = doc.to_dict() or {}
+                doc_ids[doc.id] = data.get('id', doc.id)
+                self.apply_document(doc.id, data, features_fn)
+
+        return db.collection(collection).on_snapshot(on_snapshot)
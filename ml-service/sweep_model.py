@@ -0,0 +1,343 @@
+"""
+Parallel hyperparameter and multi-seed sweep for the LSTM risk model
+Preprocesses Firebase data once into a memory-mapped feature matrix that every
+worker process shares, splits the CPU cores evenly between workers, prunes
+trials that fall behind the median and writes a leaderboard with accuracy and
+inference-latency columns.
+
+Usage:
+    python sweep_model.py [--trials 12] [--seeds 3] [--workers 4] [--epochs 30]
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+SWEEP_DIR = 'models/sweep'
+FEATURES_PATH = os.path.join(SWEEP_DIR, 'features.npy')
+SPLIT_PATH = os.path.join(SWEEP_DIR, 'split.npz')
+
+# Search space for build_model / create_sequences
+SEARCH_SPACE = {
+    'sequence_length': [12, 24, 48],
+    'lstm_units': [(128, 64, 32), (64, 32, 16), (32, 16), (16,)],
+    'dropout': [0.1, 0.2, 0.3],
+}
+
+# Set once per worker process by _init_worker
+_worker_state = {}
+
+
+def prepare_dataset(credentials_path, max_sequence_length, test_size=0.2, validation_split=0.2):
+    """
+    Fetch and preprocess data once and store it for the worker pool
+
+    Every trial sees the same target rows in train/validation/test regardless of
+    its sequence length, so the leaderboard compares configurations fairly.
+    """
+    from lstm_predictor import TouristSafetyLSTM
+
+    predictor = TouristSafetyLSTM(firebase_credentials_path=credentials_path)
+    data_dict = predictor.fetch_training_data()
+    tourists_df, _ = predictor.preprocess_data(data_dict)
+    features_scaled = predictor.prepare_features(tourists_df).astype(np.float32)
+
+    if len(features_scaled) <= max_sequence_length + 2:
+        raise ValueError(
+            f"Not enough data points ({len(features_scaled)}) for sequence length {max_sequence_length}"
+        )
+
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    np.save(FEATURES_PATH, features_scaled)
+
+    # Split on target row index, starting after the longest window
+    targets = np.arange(max_sequence_length, len(features_scaled))
+    rng = np.random.default_rng(42)
+    rng.shuffle(targets)
+    n_test = max(1, int(len(targets) * test_size))
+    n_val = max(1, int((len(targets) - n_test) * validation_split))
+    np.savez(
+        SPLIT_PATH,
+        test=np.sort(targets[:n_test]),
+        val=np.sort(targets[n_test:n_test + n_val]),
+        train=np.sort(targets[n_test + n_val:])
+    )
+
+    print(f"Prepared {len(features_scaled)} rows -> {FEATURES_PATH}")
+    return features_scaled.shape
+
+
+def _init_worker(threads_per_worker, pruning_state, pruning_lock):
+    """Pin TensorFlow to its share of cores before any op runs"""
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _worker_state['features'] = np.load(FEATURES_PATH, mmap_mode='r')
+    _worker_state['split'] = dict(np.load(SPLIT_PATH))
+    _worker_state['pruning_state'] = pruning_state
+    _worker_state['pruning_lock'] = pruning_lock
+
+
+def _window_dataset(features, targets, sequence_length, batch_size, shuffle=False, seed=None):
+    """
+    Build (window, next risk) batches on the fly from the shared feature matrix
+    Each batch slices only its own rows out of the memory-mapped matrix, so no
+    trial copies the whole dataset into TensorFlow.
+    """
+    import tensorflow as tf
+
+    offsets = np.arange(-sequence_length, 0)
+    n_features = features.shape[1]
+
+    def gather(target_idx):
+        windows = features[target_idx[:, None] + offsets]
+        return windows.astype(np.float32), np.asarray(features[target_idx, -1], dtype=np.float32)
+
+    def gather_tf(target_idx):
+        windows, risk = tf.numpy_function(gather, [target_idx], (tf.float32, tf.float32))
+        windows.set_shape((None, sequence_length, n_features))
+        risk.set_shape((None,))
+        return windows, risk
+
+    ds = tf.data.Dataset.from_tensor_slices(targets.astype(np.int64))
+    if shuffle:
+        ds = ds.shuffle(len(targets), seed=seed, reshuffle_each_iteration=True)
+    return ds.batch(batch_size).map(gather_tf).prefetch(2)
+
+
+def _pruning_callback(trial_id, warmup_epochs, min_reports):
+    """Median pruner shared across worker processes"""
+    import tensorflow as tf
+
+    state = _worker_state['pruning_state']
+    lock = _worker_state['pruning_lock']
+
+    class MedianPruning(tf.keras.callbacks.Callback):
+        pruned_at = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            val_loss = float((logs or {}).get('val_loss', np.inf))
+            with lock:
+                reports = list(state.get(epoch, []))
+                state[epoch] = reports + [val_loss]
+            if epoch + 1 < warmup_epochs or len(reports) < min_reports:
+                return
+            if val_loss > float(np.median(reports)):
+                print(f"  Trial {trial_id} pruned at epoch {epoch + 1} (val_loss {val_loss:.4f})")
+                self.pruned_at = epoch + 1
+                self.model.stop_training = True
+
+    return MedianPruning()
+
+
+def measure_latency(model, sequence_length, n_features, runs=50):
+    """Single-request inference latency in milliseconds (p50, p95)"""
+    sample = np.random.rand(1, sequence_length, n_features).astype(np.float32)
+    model(sample, training=False)  # warm-up / trace
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model(sample, training=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 95))
+
+
+def run_trial(trial):
+    """Train and evaluate one configuration inside a worker process"""
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping
+    from lstm_predictor import TouristSafetyLSTM
+
+    features = _worker_state['features']
+    split = _worker_state['split']
+    seq_len = trial['sequence_length']
+    batch_size = trial['batch_size']
+
+    tf.keras.utils.set_random_seed(trial['seed'])
+
+    builder = TouristSafetyLSTM()
+    units = tuple(trial['lstm_units'])
+    model = builder.build_model(
+        input_shape=(seq_len, features.shape[1]),
+        lstm_units=units,
+        dropout=[trial['dropout']] * len(units)
+    )
+
+    train_ds = _window_dataset(features, split['train'], seq_len, batch_size, shuffle=True, seed=trial['seed'])
+    val_ds = _window_dataset(features, split['val'], seq_len, batch_size)
+    test_ds = _window_dataset(features, split['test'], seq_len, batch_size)
+
+    pruning = _pruning_callback(trial['trial_id'], trial['prune_warmup'], trial['prune_min_reports'])
+    early_stopping = EarlyStopping(monitor='val_loss', patience=trial['patience'], restore_best_weights=True)
+
+    start = time.perf_counter()
+    history = model.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=trial['epochs'],
+        callbacks=[early_stopping, pruning],
+        verbose=0
+    )
+    train_seconds = time.perf_counter() - start
+
+    y_test = np.asarray(features[split['test'], -1])
+    y_pred = model.predict(test_ds, verbose=0).reshape(-1)
+    errors = np.abs(y_pred - y_test)
+    latency_p50, latency_p95 = measure_latency(model, seq_len, features.shape[1])
+
+    return {
+        **trial,
+        'lstm_units': list(units),
+        'params': int(model.count_params()),
+        'epochs_run': len(history.history['loss']),
+        'pruned': pruning.pruned_at is not None,
+        'best_val_loss': float(np.min(history.history['val_loss'])),
+        'best_val_mae': float(np.min(history.history['val_mae'])),
+        'test_mae': float(errors.mean()),
+        'test_accuracy': float((errors <= 0.1).mean()),  # within 0.1 risk score
+        'latency_ms_p50': latency_p50,
+        'latency_ms_p95': latency_p95,
+        'train_seconds': train_seconds,
+    }
+
+
+def build_trials(n_trials, seeds, epochs, batch_size, patience, prune_warmup, prune_min_reports, sample_seed=0):
+    """Sample configurations from SEARCH_SPACE and expand them over seeds"""
+    grid = [
+        dict(zip(SEARCH_SPACE.keys(), values))
+        for values in itertools.product(*SEARCH_SPACE.values())
+    ]
+    if n_trials and n_trials < len(grid):
+        grid = random.Random(sample_seed).sample(grid, n_trials)
+
+    trials = []
+    for config_id, config in enumerate(grid):
+        for seed in range(seeds):
+            trials.append({
+                'trial_id': len(trials),
+                'config_id': config_id,
+                'seed': seed,
+                'epochs': epochs,
+                'batch_size': batch_size,
+                'patience': patience,
+                'prune_warmup': prune_warmup,
+                'prune_min_reports': prune_min_reports,
+                **config,
+            })
+    return trials
+
+
+def write_leaderboard(results, path_prefix=os.path.join(SWEEP_DIR, 'leaderboard')):
+    """Write per-trial results and a per-config (seed-averaged) leaderboard"""
+    import pandas as pd
+
+    trials_df = pd.DataFrame(results)
+    trials_df['lstm_units'] = trials_df['lstm_units'].apply(lambda u: '-'.join(map(str, u)))
+    trials_df.to_csv(f"{path_prefix}_trials.csv", index=False)
+
+    leaderboard = trials_df.groupby(
+        ['config_id', 'sequence_length', 'lstm_units', 'dropout', 'params'], as_index=False
+    ).agg(
+        seeds=('seed', 'count'),
+        pruned=('pruned', 'sum'),
+        test_mae=('test_mae', 'mean'),
+        test_mae_std=('test_mae', 'std'),
+        test_accuracy=('test_accuracy', 'mean'),
+        best_val_mae=('best_val_mae', 'mean'),
+        latency_ms_p50=('latency_ms_p50', 'median'),
+        latency_ms_p95=('latency_ms_p95', 'median'),
+        train_seconds=('train_seconds', 'mean'),
+    ).sort_values('test_mae')
+
+    leaderboard.to_csv(f"{path_prefix}.csv", index=False)
+    with open(f"{path_prefix}.json", 'w') as f:
+        json.dump(leaderboard.to_dict(orient='records'), f, indent=2, default=float)
+    return leaderboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel LSTM hyperparameter sweep')
+    parser.add_argument('--trials', type=int, default=12, help='configurations to sample (0 = full grid)')
+    parser.add_argument('--seeds', type=int, default=3, help='training seeds per configuration')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: cores / threads)')
+    parser.add_argument('--threads-per-worker', type=int, default=2)
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--prune-warmup', type=int, default=3, help='epochs before a trial can be pruned')
+    parser.add_argument('--prune-min-reports', type=int, default=3, help='peer reports needed before pruning')
+    parser.add_argument('--credentials', default='../backend/serviceAccountKey.json')
+    parser.add_argument('--reuse-data', action='store_true', help='reuse the previously prepared dataset')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔬 LSTM Tourist Safety Prediction - Hyperparameter Sweep")
+    print("=" * 60)
+
+    if not (args.reuse_data and os.path.exists(FEATURES_PATH) and os.path.exists(SPLIT_PATH)):
+        if not os.path.exists(args.credentials):
+            print(f"❌ Error: Firebase credentials not found at {args.credentials}")
+            sys.exit(1)
+        prepare_dataset(args.credentials, max(SEARCH_SPACE['sequence_length']))
+
+    cores = os.cpu_count() or 1
+    threads = max(1, min(args.threads_per_worker, cores))
+    workers = args.workers or max(1, cores // threads)
+
+    trials = build_trials(
+        args.trials, args.seeds, args.epochs, args.batch_size,
+        args.patience, args.prune_warmup, args.prune_min_reports
+    )
+    print(f"📊 {len(trials)} trials on {workers} workers x {threads} threads")
+
+    # Spawn so each worker configures TensorFlow threading from a clean state
+    ctx = mp.get_context('spawn')
+    manager = ctx.Manager()
+    pruning_state = manager.dict()
+    pruning_lock = manager.Lock()
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(threads, pruning_state, pruning_lock)
+    ) as pool:
+        futures = {pool.submit(run_trial, trial): trial for trial in trials}
+        for future in as_completed(futures):
+            trial = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ Trial {trial['trial_id']} failed: {e}")
+                continue
+            results.append(result)
+            status = 'pruned' if result['pruned'] else 'done'
+            print(f"  [{len(results)}/{len(trials)}] trial {result['trial_id']} {status}: "
+                  f"test MAE {result['test_mae']:.4f}, p50 {result['latency_ms_p50']:.2f} ms")
+
+    if not results:
+        print("❌ No trials completed")
+        sys.exit(1)
+
+    leaderboard = write_leaderboard(results)
+    print()
+    print("🏆 Leaderboard (top 5 by test MAE):")
+    print(leaderboard.head(5).to_string(index=False))
+    print(f"\nSaved to {SWEEP_DIR}/leaderboard.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Synthetic Meghalaya tourist data
+Python port of the generators in backend/seedDatabase.js: tourists, alerts and
+geofence zones around the same 15 Meghalaya locations, with the same document
+shape. Generation is seeded and chunked, so any chunk can be regenerated on its
+own and collections of millions of rows can be streamed without being held in
+memory (see fake_firestore.py).
+
+Usage:
+    python synthetic_data.py --tourists 10000 --alerts 5000 --zones 500 --out data/synthetic
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+MEGHALAYA_LOCATIONS = [
+    ('Shillong', 25.5788, 91.8933, 'East Khasi Hills'),
+    ('Cherrapunji', 25.2676, 91.7320, 'East Khasi Hills'),
+    ('Mawsynram', 25.2958, 91.5831, 'East Khasi Hills'),
+    ('Tura', 25.5138, 90.2036, 'West Garo Hills'),
+    ('Jowai', 25.4522, 92.1950, 'West Jaintia Hills'),
+    ('Nongpoh', 25.9022, 91.8789, 'Ri-Bhoi'),
+    ('Baghmara', 25.2500, 90.6333, 'South Garo Hills'),
+    ('Williamnagar', 25.4833, 90.1333, 'East Garo Hills'),
+    ('Nongstoin', 25.5167, 91.2667, 'West Khasi Hills'),
+    ('Dawki', 25.1167, 92.0167, 'West Jaintia Hills'),
+    ('Umiam', 25.6833, 91.9167, 'Ri-Bhoi'),
+    ('Elephant Falls', 25.5300, 91.8800, 'East Khasi Hills'),
+    ('Police Bazar', 25.5788, 91.8933, 'East Khasi Hills'),
+    ('Laitlum Canyon', 25.4500, 91.8000, 'East Khasi Hills'),
+    ('Living Root Bridge', 25.2500, 91.7000, 'East Khasi Hills'),
+]
+
+FIRST_NAMES = ['Rahul', 'Priya', 'Amit', 'Sneha', 'Raj', 'Anjali', 'Vikram', 'Pooja', 'Arjun', 'Kavya',
+               'John', 'Emma', 'Michael', 'Sophia', 'David', 'Olivia', 'Wei', 'Yuki', 'Hans', 'Marie',
+               'Carlos', 'Sofia', 'Ahmed', 'Fatima', 'Ravi', 'Lakshmi', 'Kiran', 'Meera', 'Vijay', 'Radha']
+LAST_NAMES = ['Kumar', 'Singh', 'Sharma', 'Patel', 'Gupta', 'Reddy', 'Nair', 'Das', 'Roy', 'Bose',
+              'Smith', 'Johnson', 'Williams', 'Brown', 'Garcia', 'Miller', 'Chen', 'Wang', 'Li', 'Müller',
+              'Schmidt', 'Devi', 'Rao', 'Iyer', 'Menon', 'Joshi', 'Mehta', 'Shah']
+NATIONALITIES = ['India', 'USA', 'UK', 'China', 'Japan', 'Germany', 'France', 'Australia', 'Canada',
+                 'Bangladesh', 'Nepal', 'Bhutan', 'Singapore', 'Thailand']
+HOTELS = ['Hotel Pine Borough', 'Ri Kynjai Resort', 'Hotel Polo Towers', 'The Heritage Club',
+          'Vivanta Meghalaya', 'Courtyard by Marriott', 'Hotel Pegasus Crown', 'Shillong Guest House']
+ALERT_TYPES = ['sos', 'medical', 'security', 'weather', 'accident', 'lost', 'theft']
+RISK_LEVELS = ['low', 'medium', 'high', 'critical']
+ALERT_STATUSES = ['pending', 'acknowledged', 'resolved']
+ZONE_TYPES = ['restricted', 'caution', 'safe']
+
+# Fixed default so repeated runs produce identical data
+REFERENCE_TIME = datetime(2025, 10, 18, 12, 0, 0)
+CHUNK_SIZE = 10000
+
+_COLLECTION_IDS = {'tourists': 1, 'alerts': 2, 'zones': 3}
+ID_PREFIXES = {'tourists': 'T', 'alerts': 'A', 'zones': 'Z'}
+
+
+def _rng(seed, collection, chunk):
+    return np.random.default_rng([seed, _COLLECTION_IDS[collection], chunk])
+
+
+def _iso(reference_time, seconds_before):
+    return (reference_time - timedelta(seconds=float(seconds_before))).isoformat()
+
+
+def tourist_chunk(chunk, count, seed=0, reference_time=REFERENCE_TIME, history_hours=720):
+    """
+    `count` tourist documents of chunk number `chunk` as (doc_id, dict)
+    lastSeen is spread over the `history_hours` before reference_time (the
+    backend seed uses the last hour; a wider window gives the time features of
+    training data some range).
+    """
+    rng = _rng(seed, 'tourists', chunk)
+    start = chunk * CHUNK_SIZE
+    place = rng.integers(len(MEGHALAYA_LOCATIONS), size=count)
+    offsets = (rng.random((count, 2)) - 0.5) * 0.05
+    first = rng.integers(len(FIRST_NAMES), size=count)
+    last = rng.integers(len(LAST_NAMES), size=count)
+    nationality = rng.integers(len(NATIONALITIES), size=count)
+    hotel = rng.integers(len(HOTELS), size=count)
+    active = rng.random(count) < 0.75
+    checkin_before = rng.uniform(history_hours * 3600, (history_hours + 14 * 24) * 3600, size=count)
+    seen_before = rng.uniform(0, history_hours * 3600, size=count)
+    accuracy = rng.integers(5, 51, size=count)
+    age = rng.integers(18, 76, size=count)
+    group = rng.integers(1, 9, size=count)
+    risk = rng.integers(0, 101, size=count)
+    flags = rng.random((count, 2))
+
+    docs = []
+    for i in range(count):
+        name, lat, lng, district = MEGHALAYA_LOCATIONS[place[i]]
+        tourist_id = f'T{start + i + 1:06d}'
+        docs.append((tourist_id, {
+            'id': tourist_id,
+            'name': f'{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}',
+            'nationality': NATIONALITIES[nationality[i]],
+            'age': int(age[i]),
+            'location': {
+                'lat': lat + float(offsets[i, 0]),
+                'lng': lng + float(offsets[i, 1]),
+                'accuracy': int(accuracy[i]),
+                'placeName': name,
+                'district': district
+            },
+            'status': 'active' if active[i] else 'inactive',
+            'checkInDate': _iso(reference_time, checkin_before[i]),
+            'lastSeen': _iso(reference_time, seen_before[i]),
+            'hotel': HOTELS[hotel[i]],
+            'inRestrictedZone': bool(flags[i, 0] < 0.05),
+            'sosActive': bool(flags[i, 1] < 0.02),
+            'riskScore': int(risk[i]),
+            'groupSize': int(group[i]),
+            'createdAt': _iso(reference_time, checkin_before[i])
+        }))
+    return docs
+
+
+def alert_chunk(chunk, count, seed=0, reference_time=REFERENCE_TIME, history_hours=720, n_tourists=1000):
+    """`count` alert documents of chunk number `chunk` as (doc_id, dict)"""
+    rng = _rng(seed, 'alerts', chunk)
+    start = chunk * CHUNK_SIZE
+    place = rng.integers(len(MEGHALAYA_LOCATIONS), size=count)
+    offsets = (rng.random((count, 2)) - 0.5) * 0.02
+    alert_type = rng.integers(len(ALERT_TYPES), size=count)
+    priority = rng.integers(len(RISK_LEVELS), size=count)
+    status = rng.integers(len(ALERT_STATUSES), size=count)
+    tourist = rng.integers(1, max(n_tourists, 1) + 1, size=count)
+    before = rng.uniform(0, history_hours * 3600, size=count)
+    response = rng.integers(5, 46, size=count)
+
+    docs = []
+    for i in range(count):
+        name, lat, lng, district = MEGHALAYA_LOCATIONS[place[i]]
+        kind = ALERT_TYPES[alert_type[i]]
+        state = ALERT_STATUSES[status[i]]
+        alert_id = f'A{start + i + 1:06d}'
+        timestamp = _iso(reference_time, before[i])
+        docs.append((alert_id, {
+            'id': alert_id,
+            'touristId': f'T{tourist[i]:06d}',
+            'type': kind,
+            'priority': RISK_LEVELS[priority[i]],
+            'status': state,
+            'location': {
+                'lat': lat + float(offsets[i, 0]),
+                'lng': lng + float(offsets[i, 1]),
+                'address': f'{name}, {district}, Meghalaya',
+                'district': district
+            },
+            'description': f'{kind.capitalize()} alert reported at {name}',
+            'timestamp': timestamp,
+            'responseTime': int(response[i]) if state != 'pending' else None,
+            'createdAt': timestamp
+        }))
+    return docs
+
+
+def zone_chunk(chunk, count, seed=0, reference_time=REFERENCE_TIME):
+    """`count` geofence zone documents of chunk number `chunk` as (doc_id, dict)"""
+    rng = _rng(seed, 'zones', chunk)
+    start = chunk * CHUNK_SIZE
+    place = rng.integers(len(MEGHALAYA_LOCATIONS), size=count)
+    zone_type = rng.integers(len(ZONE_TYPES), size=count)
+    radius = rng.integers(500, 5001, size=count)
+    active = rng.random(count) > 0.1
+
+    docs = []
+    for i in range(count):
+        name, lat, lng, district = MEGHALAYA_LOCATIONS[place[i]]
+        kind = ZONE_TYPES[zone_type[i]]
+        offset = radius[i] / 111320  # metres to degrees (approximate)
+        zone_id = f'Z{start + i + 1:06d}'
+        docs.append((zone_id, {
+            'id': zone_id,
+            'name': f'{kind.capitalize()} Zone {start + i + 1}',
+            'type': kind,
+            'center': {'lat': lat, 'lng': lng},
+            'radius': int(radius[i]),
+            'geometry': json.dumps({'type': 'Polygon', 'coordinates': [[
+                [lng - offset, lat - offset], [lng + offset, lat - offset], [lng + offset, lat + offset],
+                [lng - offset, lat + offset], [lng - offset, lat - offset]
+            ]]}),
+            'district': district,
+            'description': f'{kind.capitalize()} zone near {name}',
+            'active': bool(active[i]),
+            'createdAt': reference_time.isoformat()
+        }))
+    return docs
+
+
+class SyntheticDataset:
+    """Sizes and seed of one synthetic database; collections are generated on demand, chunk by chunk"""
+
+    def __init__(self, tourists=1000, alerts=500, zones=100, seed=0,
+                 reference_time=REFERENCE_TIME, history_hours=720):
+        self.sizes = {'tourists': tourists, 'alerts': alerts, 'zones': zones}
+        self.seed = seed
+        self.reference_time = reference_time
+        self.history_hours = history_hours
+
+    def _chunk(self, collection, chunk, count):
+        if collection == 'tourists':
+            return tourist_chunk(chunk, count, self.seed, self.reference_time, self.history_hours)
+        if collection == 'alerts':
+            return alert_chunk(chunk, count, self.seed, self.reference_time, self.history_hours,
+                               n_tourists=self.sizes['tourists'])
+        return zone_chunk(chunk, count, self.seed, self.reference_time)
+
+    def iter_documents(self, collection):
+        """(doc_id, dict) for every document of `collection`, generated CHUNK_SIZE at a time"""
+        total = self.sizes[collection]
+        for chunk in range((total + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            yield from self._chunk(collection, chunk, min(CHUNK_SIZE, total - chunk * CHUNK_SIZE))
+
+    def get_document(self, collection, doc_id):
+        """One document by id (regenerates only its chunk), or None"""
+        prefix = ID_PREFIXES[collection]
+        if not doc_id.startswith(prefix) or not doc_id[len(prefix):].isdigit():
+            return None
+        index = int(doc_id[len(prefix):]) - 1
+        total = self.sizes[collection]
+        if not 0 <= index < total:
+            return None
+        chunk = index // CHUNK_SIZE
+        docs = self._chunk(collection, chunk, min(CHUNK_SIZE, total - chunk * CHUNK_SIZE))
+        found_id, doc = docs[index - chunk * CHUNK_SIZE]
+        return doc if found_id == doc_id else None
+
+    def write_ndjson(self, out_dir):
+        """One <collection>.ndjson file per collection; returns the paths"""
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for collection in self.sizes:
+            path = os.path.join(out_dir, f'{collection}.ndjson')
+            with open(path, 'w') as f:
+                for _, doc in self.iter_documents(collection):
+                    f.write(json.dumps(doc) + '\n')
+            paths.append(path)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic Meghalaya tourist data')
+    parser.add_argument('--tourists', type=int, default=1000)
+    parser.add_argument('--alerts', type=int, default=500)
+    parser.add_argument('--zones', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history-hours', type=int, default=720, help='window lastSeen/alert times are spread over')
+    parser.add_argument('--out', default='data/synthetic')
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(args.tourists, args.alerts, args.zones, seed=args.seed,
+                               history_hours=args.history_hours)
+    print(f"🧪 Generating {args.tourists} tourists, {args.alerts} alerts, {args.zones} zones (seed {args.seed})...")
+    for path in dataset.write_ndjson(args.out):
+        print(f"   ✅ {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,50 @@ Standalone script to train LSTM model
 Run this to train the model before starting the API server
 """
 
-from lstm_predictor import TouristSafetyLSTM
+from lstm_predictor import TouristSafetyLSTM, DEFAULT_HORIZON
+import argparse
+import json
 import sys
 import os
 
+def parse_args():
+    """Parse command line options (epochs and batch size stay positional)"""
+    parser = argparse.ArgumentParser(description='Train the LSTM tourist safety model')
+    parser.add_argument('epochs', nargs='?', default=None, help='training epochs (default: 50, 10 with --incremental)')
+    parser.add_argument('batch_size', nargs='?', default='32', help='batch size (default: 32)')
+    parser.add_argument('--horizon', type=int, nargs='?', const=DEFAULT_HORIZON, default=1,
+                        help=f'train the multi-horizon head predicting H hourly steps (default H: {DEFAULT_HORIZON})')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run from models/checkpoints (its data and settings)')
+    parser.add_argument('--checkpoint-every', type=int, default=1,
+                        help='epochs between full training checkpoints')
+    parser.add_argument('--row-budget', type=int, default=None,
+                        help='train on a stratified sample of at most this many tourist rows')
+    parser.add_argument('--dedup-deg', type=float, default=None,
+                        help='merge consecutive pings of a tourist closer than this (degrees, e.g. 0.0005)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='record peak RSS and top allocators per stage in models/memory_profile.json')
+    parser.add_argument('--incremental', action='store_true',
+                        help='fine-tune the current model on recent data instead of training from scratch')
+    parser.add_argument('--recent-hours', type=float, default=24,
+                        help='with --incremental, window of new data to fine-tune on')
+    parser.add_argument('--replay-ratio', type=float, default=1.0,
+                        help='with --incremental, older sequences replayed per recent sequence')
+    parser.add_argument('--quantize', action='store_true',
+                        help='write an int8 TFLite model after training (see quantize_model.py)')
+    parser.add_argument('--prune', type=float, default=0.0,
+                        help='with --quantize, fraction of kernel weights to zero by magnitude')
+    parser.add_argument('--mae-tolerance', type=float, default=0.01,
+                        help='with --quantize, max MAE increase over the float model')
+    parser.add_argument('--no-profiles', action='store_true',
+                        help='skip precomputing location risk profiles (see risk_profiles.py)')
+    parser.add_argument('--profile-grid-step', type=float, default=0.25,
+                        help='grid cell size in degrees for risk profiles (0 = known locations only)')
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    
     print("=" * 60)
     print("🧠 LSTM Tourist Safety Prediction - Model Training")
     print("=" * 60)
@@ -35,33 +74,54 @@ def main():
         sys.exit(1)
     
     # Get training parameters
-    epochs = 50
+    epochs = 10 if args.incremental else 50
     batch_size = 32
     
-    if len(sys.argv) > 1:
+    if args.epochs is not None:
         try:
-            epochs = int(sys.argv[1])
+            epochs = int(args.epochs)
         except ValueError:
-            print("⚠️  Invalid epochs value, using default: 50")
+            print(f"⚠️  Invalid epochs value, using default: {epochs}")
     
-    if len(sys.argv) > 2:
-        try:
-            batch_size = int(sys.argv[2])
-        except ValueError:
-            print("⚠️  Invalid batch_size value, using default: 32")
+    try:
+        batch_size = int(args.batch_size)
+    except ValueError:
+        print("⚠️  Invalid batch_size value, using default: 32")
+    
+    if args.resume:
+        from checkpointing import checkpoint_state
+        state = checkpoint_state()
+        if state is None:
+            print("❌ No checkpoint to resume from. Start a new training run.")
+            sys.exit(1)
+        epochs = state['config']['epochs']
+        batch_size = state['config']['batch_size']
+        args.horizon = state['config']['horizon']
+        print(f"♻️  Resuming after epoch {state['epoch']}/{epochs} (checkpoint saved {state['saved']})")
+        print()
     
     print(f"📊 Training Configuration:")
     print(f"   Epochs: {epochs}")
     print(f"   Batch Size: {batch_size}")
     print(f"   Sequence Length: 24 hours")
+    print(f"   Horizon: {args.horizon} step(s)")
+    if args.row_budget or args.dedup_deg:
+        print(f"   Row Budget: {args.row_budget or 'all'} (dedup: {args.dedup_deg or 'off'})")
     print(f"   Validation Split: 20%")
     print()
     
+    if args.incremental:
+        run_incremental(predictor, args, epochs, batch_size)
+        return
+    
     # Train model
     try:
         print("🚀 Starting model training...")
         print("-" * 60)
-        history = predictor.train(epochs=epochs, batch_size=batch_size)
+        history = predictor.train(epochs=epochs, batch_size=batch_size, horizon=args.horizon,
+                                  resume=args.resume, checkpoint_every=args.checkpoint_every,
+                                  row_budget=args.row_budget, dedup_deg=args.dedup_deg,
+                                  profile_memory=args.profile_memory)
         print("-" * 60)
         print()
         
@@ -71,6 +131,27 @@ def main():
         print("✅ Model saved successfully!")
         print()
         
+        if args.profile_memory:
+            print_memory_profile(predictor.finish_memory_profile())
+        
+        if not args.no_profiles:
+            print("🗺️  Precomputing location risk profiles...")
+            from risk_profiles import build_profiles
+            build_profiles(predictor, grid_step=args.profile_grid_step)
+            print()
+        
+        if args.quantize:
+            print("🗜️  Quantizing model (int8 dynamic range)...")
+            from quantize_model import optimize
+            X_test, y_test = predictor.test_data
+            report = optimize(predictor.model, X_test, y_test,
+                              sparsity=args.prune, tolerance=args.mae_tolerance)
+            print(f"   Size: {report['float']['size_bytes'] / 1024:.0f} KB -> "
+                  f"{report['quantized']['size_bytes'] / 1024:.0f} KB")
+            print(f"   Throughput: {report['float']['throughput_seq_per_s']:.0f} -> "
+                  f"{report['quantized']['throughput_seq_per_s']:.0f} sequences/s")
+            print()
+        
         # Display final metrics
         print("=" * 60)
         print("📈 Training Complete!")
@@ -90,5 +171,60 @@ def main():
         traceback.print_exc()
         sys.exit(1)
 
+def print_memory_profile(path):
+    """Per-stage memory table from a MemoryProfiler report"""
+    with open(path) as f:
+        report = json.load(f)
+    print("🧠 Memory profile (MB):")
+    print(f"   {'stage':16s} {'rss peak':>9s} {'rss end':>9s} {'traced peak':>12s}  top allocator")
+    for stage in report['stages']:
+        top = stage.get('top_allocations') or [{}]
+        print(f"   {stage['stage']:16s} {stage.get('rss_peak_mb') or '-':>9} {stage.get('rss_end_mb') or '-':>9} "
+              f"{stage.get('traced_peak_mb') or '-':>12}  {top[0].get('site', '')} {top[0].get('size_diff_mb', '')}")
+    print(f"   Report written to {path}")
+    print()
+
+def run_incremental(predictor, args, epochs, batch_size):
+    """Fine-tune the saved model and promote it only if validation MAE holds"""
+    if not os.path.exists('models/lstm_model.h5'):
+        print("❌ No trained model to fine-tune. Run a full training first.")
+        sys.exit(1)
+    
+    try:
+        print(f"🔁 Fine-tuning on the last {args.recent_hours:g} hours "
+              f"(replay ratio {args.replay_ratio:g})...")
+        print("-" * 60)
+        report = predictor.train_incremental(
+            recent_hours=args.recent_hours,
+            replay_ratio=args.replay_ratio,
+            epochs=epochs,
+            batch_size=batch_size
+        )
+        print("-" * 60)
+        print()
+        
+        if not report['promoted']:
+            reason = report.get('reason', 'validation MAE regressed')
+            print(f"⚠️  Current model kept: {reason}")
+            if 'tuned_val_mae' in report:
+                print(f"   Validation MAE: {report['baseline_val_mae']:.4f} -> {report['tuned_val_mae']:.4f}")
+            return
+        
+        print(f"✅ Fine-tuned model promoted "
+              f"(validation MAE {report['baseline_val_mae']:.4f} -> {report['tuned_val_mae']:.4f})")
+        
+        if not args.no_profiles:
+            print("🗺️  Precomputing location risk profiles...")
+            from risk_profiles import build_profiles
+            build_profiles(predictor, grid_step=args.profile_grid_step)
+        print()
+        print("🎯 Restart the API server to serve the updated model.")
+        
+    except Exception as e:
+        print(f"❌ Incremental training failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,222 @@
+"""
+Train region-sharded models
+Fetches the data once, partitions tourists by the geohash prefix of their
+location and trains one model per partition with at least --min-rows rows, in
+parallel worker processes. Each shard is written as a fused model under
+models/shards/<prefix>/ and listed in models/shards/manifest.json, which the
+API's ShardRouter (sharding.py) picks up without a restart.
+
+Retrain only some regions (the others keep their current models):
+    python train_shards.py --only wh93 wh97
+
+Usage:
+    python train_shards.py [--precision 4] [--min-rows 200] [--workers 4] [--epochs 30]
+    python train_shards.py --synthetic 20000      # offline, on synthetic data
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from sharding import SHARDS_DIR, DEFAULT_PRECISION, shard_paths, shard_size_bytes, read_manifest, write_manifest
+from spatial_index import geohash_encode, geohash_bounds
+
+# Alerts this close to a shard's edge still count towards its risk scores
+# (preprocess_data matches alerts within 0.01 degrees)
+ALERT_MARGIN_DEG = 0.01
+
+
+def _location(value):
+    if isinstance(value, dict):
+        return value.get('lat', 0), value.get('lng', 0)
+    return 0, 0
+
+
+def partition(tourists, precision):
+    """Shard key of every tourist row"""
+    return pd.Series(
+        [geohash_encode(lat, lng, precision) for lat, lng in map(_location, tourists['location'])],
+        index=tourists.index
+    )
+
+
+def alerts_for(alerts, key):
+    """Alerts inside a shard's cell, plus a margin"""
+    if alerts.empty or 'location' not in alerts.columns:
+        return alerts
+    lat_min, lat_max, lng_min, lng_max = geohash_bounds(key)
+    points = alerts['location'].map(_location)
+    inside = points.map(lambda p: (lat_min - ALERT_MARGIN_DEG <= p[0] <= lat_max + ALERT_MARGIN_DEG and
+                                   lng_min - ALERT_MARGIN_DEG <= p[1] <= lng_max + ALERT_MARGIN_DEG))
+    nearby = alerts[inside]
+    # No nearby alerts gives the same risk scores as all alerts; an empty frame would drop the columns
+    return nearby if not nearby.empty else alerts
+
+
+def _init_worker(threads_per_worker):
+    """Pin TensorFlow to its share of cores before any op runs"""
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def train_shard(task):
+    """Train and export one shard inside a worker process"""
+    from tensorflow.keras.callbacks import EarlyStopping
+    from sklearn.model_selection import train_test_split
+    from lstm_predictor import TouristSafetyLSTM
+
+    start = time.time()
+    predictor = TouristSafetyLSTM(db=None)
+    tourists_df, _ = predictor.preprocess_data({
+        'tourists': task['tourists'],
+        'alerts': task['alerts'],
+        'zones': pd.DataFrame()
+    })
+    X, y = predictor.create_sequences(tourists_df)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    predictor.model = predictor.build_model(input_shape=(X.shape[1], X.shape[2]))
+    predictor.model.fit(
+        X_train, y_train,
+        epochs=task['epochs'],
+        batch_size=task['batch_size'],
+        validation_split=0.2,
+        callbacks=[EarlyStopping(monitor='val_loss', patience=task['patience'], restore_best_weights=True)],
+        verbose=0
+    )
+    _, test_mae, _ = predictor.model.evaluate(X_test, y_test, verbose=0)
+
+    model_path, meta_path = shard_paths(task['shards_dir'], task['key'])
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    predictor.export_fused_model(model_path, meta_path)
+
+    return {
+        'key': task['key'],
+        'rows': len(task['tourists']),
+        'sequences': len(X),
+        'test_mae': float(test_mae),
+        'train_seconds': round(time.time() - start, 1),
+        'size_bytes': shard_size_bytes(task['shards_dir'], task['key']),
+        'trained_at': datetime.now().isoformat()
+    }
+
+
+def make_predictor(args):
+    from lstm_predictor import TouristSafetyLSTM
+
+    if args.synthetic:
+        from synthetic_data import SyntheticDataset
+        from fake_firestore import FakeFirestore
+        dataset = SyntheticDataset(tourists=args.synthetic, alerts=args.synthetic // 2,
+                                   zones=min(500, max(1, args.synthetic // 10)))
+        return TouristSafetyLSTM(db=FakeFirestore.from_dataset(dataset))
+    if not os.path.exists(args.credentials):
+        print(f"❌ Error: Firebase credentials not found at {args.credentials}")
+        sys.exit(1)
+    return TouristSafetyLSTM(firebase_credentials_path=args.credentials)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train one LSTM model per geohash region')
+    parser.add_argument('--precision', type=int, default=DEFAULT_PRECISION, help='geohash characters per shard')
+    parser.add_argument('--min-rows', type=int, default=200, help='smaller regions use the global model')
+    parser.add_argument('--only', nargs='+', help='retrain these shard keys, keep the rest')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: cores / threads)')
+    parser.add_argument('--threads-per-worker', type=int, default=2)
+    parser.add_argument('--epochs', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--patience', type=int, default=5)
+    parser.add_argument('--row-budget', type=int, help='stratified sample of the tourist rows (see sampling.py)')
+    parser.add_argument('--dedup-deg', type=float, help='merge consecutive near-identical pings')
+    parser.add_argument('--credentials', default='../backend/serviceAccountKey.json')
+    parser.add_argument('--synthetic', type=int, help='train on this many synthetic tourists instead of Firebase')
+    parser.add_argument('--shards-dir', default=SHARDS_DIR)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🗺️  LSTM Tourist Safety Prediction - Sharded Training")
+    print("=" * 60)
+
+    manifest = read_manifest(args.shards_dir)
+    if args.only and manifest is not None and manifest['precision'] != args.precision:
+        print(f"❌ Existing shards use precision {manifest['precision']}; retrain all shards to change it")
+        sys.exit(1)
+    if manifest is None or manifest['precision'] != args.precision:
+        manifest = {'precision': args.precision, 'shards': {}}
+
+    predictor = make_predictor(args)
+    data_dict = predictor.fetch_training_data(row_budget=args.row_budget, dedup_deg=args.dedup_deg)
+    tourists, alerts = data_dict['tourists'], data_dict['alerts']
+    keys = partition(tourists, args.precision)
+    counts = keys.value_counts()
+
+    selected = [key for key, rows in counts.items() if rows >= args.min_rows]
+    if args.only:
+        selected = [key for key in selected if key in args.only]
+        for key in set(args.only) - set(selected):
+            print(f"⚠️  {key}: fewer than {args.min_rows} rows ({counts.get(key, 0)}), skipped")
+    if not selected:
+        print(f"❌ No region has {args.min_rows} rows or more")
+        sys.exit(1)
+    print(f"📊 Training {len(selected)} shards ({len(counts)} regions at precision {args.precision}, "
+          f"{int(counts[counts < args.min_rows].sum())} rows in regions served by the global model)")
+
+    tasks = [
+        {
+            'key': key,
+            'tourists': tourists[keys == key].reset_index(drop=True),
+            'alerts': alerts_for(alerts, key),
+            'epochs': args.epochs,
+            'batch_size': args.batch_size,
+            'patience': args.patience,
+            'shards_dir': args.shards_dir
+        }
+        for key in selected
+    ]
+
+    cores = os.cpu_count() or 1
+    threads = max(1, min(args.threads_per_worker, cores))
+    workers = min(len(tasks), args.workers or max(1, cores // threads))
+    print(f"🚀 Training on {workers} workers x {threads} threads")
+
+    # Spawn so each worker configures TensorFlow threading from a clean state
+    ctx = mp.get_context('spawn')
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = {pool.submit(train_shard, task): task['key'] for task in tasks}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ Shard {key} failed: {e}")
+                failed += 1
+                continue
+            manifest['shards'][key] = {k: v for k, v in result.items() if k != 'key'}
+            # Written per shard, so a running server starts routing to it right away
+            write_manifest(manifest, args.shards_dir)
+            print(f"  ✅ {key}: {result['rows']} rows, test MAE {result['test_mae']:.4f}, "
+                  f"{result['train_seconds']}s")
+
+    if not args.only:
+        # Regions that no longer have enough rows go back to the global model
+        manifest['shards'] = {key: entry for key, entry in manifest['shards'].items() if key in selected}
+        write_manifest(manifest, args.shards_dir)
+    print(f"\n📄 {len(manifest['shards'])} shards listed in {os.path.join(args.shards_dir, 'manifest.json')}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()